@@ -0,0 +1,86 @@
+"""
+Benchmark of writing step results with `bulk_upsert` against pandas `to_sql`.
+
+Run with `python -m src.benchmarks.bulk_upsert_benchmark`. Rows shaped like numeric_features are written
+to a new database with the pipeline schema, `to_sql` can only append, the upsert is also timed on a rerun.
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from src.db.bulk_upsert import bulk_upsert
+from src.db.connection import close_connections, get_connection
+from src.db.sqlite_creation import create_sqlite_db
+from src.utils.links import offer_id_from_link
+from src.utils.setting_logger import Logger
+
+logger = Logger(__name__).get_logger()
+
+
+def make_results(n_rows: int, survey_id: str = 'benchmark') -> pd.DataFrame:
+    """
+    Creates random results of a step.
+
+    Args:
+        n_rows (int): Number of rows.
+        survey_id (str): ID of the survey of the rows.
+
+    Returns:
+        pd.DataFrame: Rows with numeric_features columns and offer keys.
+    """
+    rng = np.random.default_rng(0)
+    links = [f'https://www.otodom.pl/pl/oferta/offer-ID{i}' for i in range(n_rows)]
+    return pd.DataFrame({'survey_id': survey_id, 'link': links,
+                         'offer_id': [offer_id_from_link(link) for link in links], 'survey_key': 1,
+                         'price': rng.uniform(3e5, 2e6, n_rows), 'sq_m_price': rng.uniform(8e3, 3e4, n_rows),
+                         'area': rng.uniform(20, 150, n_rows), 'rent': rng.uniform(300, 1500, n_rows),
+                         'n_rooms': rng.integers(1, 6, n_rows), 'floor': rng.integers(0, 20, n_rows),
+                         'max_floor': rng.integers(1, 30, n_rows), 'age_num': rng.integers(0, 120, n_rows),
+                         'days_till_available': rng.uniform(0, 365, n_rows)})
+
+
+def benchmark(n_rows: int, chunk_size: int) -> Dict[str, float]:
+    """
+    Writes the same rows with every method to a new database and logs rows written per second.
+
+    Args:
+        n_rows (int): Number of rows.
+        chunk_size (int): Rows written by a single executemany of the upsert.
+
+    Returns:
+        Dict[str, float]: Rows per second of every method.
+    """
+    df = make_results(n_rows)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for method in ['to_sql', 'upsert_insert', 'upsert_rerun']:
+            db = str(Path(tmp_dir) / f'{method}.db')
+            create_sqlite_db(db)
+            conn = get_connection(db)
+            if method == 'upsert_rerun':
+                bulk_upsert(conn, 'numeric_features', df, chunk_size=chunk_size)
+            start = time.perf_counter()
+            if method == 'to_sql':
+                with conn:
+                    df.to_sql('numeric_features', conn, if_exists='append', index=False)
+            else:
+                report = bulk_upsert(conn, 'numeric_features', df, chunk_size=chunk_size)
+                logger.info(f"{method}: {report}")
+            elapsed = time.perf_counter() - start
+            results[method] = n_rows / elapsed
+            logger.info(f"{method}: {n_rows} rows in {elapsed:.2f} s, {results[method]:.0f} rows/s")
+        close_connections()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare bulk upsert with pandas to_sql")
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    args = parser.parse_args()
+    benchmark(args.rows, args.chunk_size)
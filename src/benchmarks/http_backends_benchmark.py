@@ -0,0 +1,113 @@
+"""
+Benchmark of the async HTTP backends against a local test server serving an example offer page.
+
+Run with `python -m src.benchmarks.http_backends_benchmark`. The local server speaks HTTP/1.1 only,
+to measure HTTP/2 multiplexing pass an https url of a server supporting it with `--url`.
+"""
+import argparse
+import asyncio
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from aiohttp import web
+
+from src.pipeline.scraping.http_backends import get_http_backend
+from src.utils.setting_logger import Logger
+
+logger = Logger(__name__).get_logger()
+
+EXAMPLE_HTML = Path(__file__).parents[2] / "tests/test_scraping/example_htmls/example_html_1.txt"
+
+
+async def start_test_server(port: int) -> web.AppRunner:
+    """
+    Starts a local server returning the example offer page, connections of clients are counted.
+
+    Args:
+        port (int): Port of the server.
+
+    Returns:
+        web.AppRunner: Runner of the server, used to stop it.
+    """
+    html = EXAMPLE_HTML.read_text(encoding='utf-8')
+
+    async def offer(request: web.Request) -> web.Response:
+        request.app['peers'].add(request.transport.get_extra_info('peername'))
+        return web.Response(text=html, content_type='text/html')
+
+    app = web.Application()
+    app['peers'] = set()
+    app.router.add_get('/{name}', offer)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, 'localhost', port).start()
+    return runner
+
+
+async def run_backend(name: str, url: str, n_requests: int, concurrency: int) -> float:
+    """
+    Fetches the url n_requests times with at most concurrency requests in flight.
+
+    Args:
+        name (str): Name of the backend.
+        url (str): Url to fetch, formatted with the number of the request.
+        n_requests (int): Number of requests.
+        concurrency (int): Maximum number of requests in flight.
+
+    Returns:
+        float: Time of all the requests in seconds.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with get_http_backend(name, max_connections=concurrency) as client:
+        async def get(i: int) -> int:
+            async with semaphore:
+                response = await client.get(url.format(i))
+                return len(response.text)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[get(i) for i in range(n_requests)])
+        return time.perf_counter() - start
+
+
+async def benchmark(n_requests: int, concurrency: int, url: Optional[str], port: int) -> Dict[str, float]:
+    """
+    Runs the benchmark for both backends and logs requests per second and number of connections used.
+
+    Args:
+        n_requests (int): Number of requests per backend.
+        concurrency (int): Maximum number of requests in flight.
+        url (Optional[str]): Url to benchmark, the local test server is used if None.
+        port (int): Port of the local test server.
+
+    Returns:
+        Dict[str, float]: Requests per second of every backend.
+    """
+    runner = None
+    if url is None:
+        runner = await start_test_server(port)
+        url = f"http://localhost:{port}/offer-{{}}"
+    results = {}
+    try:
+        for name in ['aiohttp', 'httpx']:
+            if runner is not None:
+                runner.app['peers'].clear()
+            elapsed = await run_backend(name, url, n_requests, concurrency)
+            results[name] = n_requests / elapsed
+            connections = f", {len(runner.app['peers'])} connections" if runner is not None else ""
+            logger.info(f"{name}: {n_requests} requests in {elapsed:.2f} s, {results[name]:.1f} req/s{connections}")
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare async HTTP backends")
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--url', default=None, help="url with {} placeholder for the request number")
+    parser.add_argument('--port', type=int, default=8799)
+    args = parser.parse_args()
+    asyncio.run(benchmark(args.requests, args.concurrency, args.url, args.port))
@@ -0,0 +1,133 @@
+"""
+Idempotent bulk writes of pipeline step results.
+
+Rows are written with `executemany` in chunks within one transaction. Rows conflicting with rows already
+in the table, e.g. when a step is run again on a survey, update them or are skipped instead of failing the batch.
+"""
+import sqlite3
+from dataclasses import dataclass
+from typing import Any, List, Sequence, Tuple
+
+import pandas as pd
+
+from src.db.offer_keys import OFFER_KEY_COLUMNS
+from src.utils.setting_logger import Logger
+
+logger = Logger(__name__).get_logger()
+
+ON_CONFLICT_ACTIONS = ('update', 'nothing')
+
+
+@dataclass
+class UpsertReport:
+    """
+    Numbers of rows written by a bulk upsert.
+
+    Attributes:
+        n_inserted (int): Rows inserted as new rows.
+        n_updated (int): Rows that updated an existing row.
+        n_ignored (int): Rows skipped because of a conflict.
+    """
+    n_inserted: int = 0
+    n_updated: int = 0
+    n_ignored: int = 0
+
+
+def build_upsert(table: str, columns: Sequence[str], conflict_columns: Sequence[str],
+                 on_conflict: str = 'update') -> str:
+    """
+    Returns INSERT statement resolving conflicts on the unique columns.
+
+    Args:
+        table (str): Name of the table.
+        columns (Sequence[str]): Columns of the inserted rows.
+        conflict_columns (Sequence[str]): Columns of a unique constraint of the table.
+        on_conflict (str): 'update' - conflicting rows are overwritten, 'nothing' - conflicting rows are skipped.
+
+    Returns:
+        str: SQL statement with a positional parameter for every column.
+
+    Raises:
+        ValueError: If on_conflict is not a supported action.
+    """
+    if on_conflict not in ON_CONFLICT_ACTIONS:
+        raise ValueError(f"Unknown conflict action {on_conflict}, use one of {ON_CONFLICT_ACTIONS}")
+    statement = (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))}) "
+                 f"ON CONFLICT ({', '.join(conflict_columns)}) DO ")
+    updated_columns = [column for column in columns if column not in conflict_columns]
+    if on_conflict == 'nothing' or not updated_columns:
+        return statement + "NOTHING"
+    return statement + "UPDATE SET " + ', '.join(f"{column} = excluded.{column}" for column in updated_columns)
+
+
+def get_rows(df: pd.DataFrame) -> List[Tuple[Any, ...]]:
+    """
+    Converts a DataFrame to rows of values accepted by sqlite3, missing values are None and dates are strings.
+    Columns are converted one by one, numpy scalars become Python scalars in `tolist`.
+
+    Args:
+        df (pd.DataFrame): Rows to write.
+
+    Returns:
+        List[Tuple[Any, ...]]: Values of the rows.
+    """
+    columns = []
+    for _, column in df.items():
+        if pd.api.types.is_datetime64_any_dtype(column):
+            column = column.astype(str).where(column.notna(), None)
+        elif column.hasnans:
+            column = column.astype(object).where(column.notna(), None)
+        columns.append(column.tolist())
+    return list(zip(*columns))
+
+
+def upsert_rows(conn: sqlite3.Connection, table: str, df: pd.DataFrame,
+                conflict_columns: Sequence[str] = OFFER_KEY_COLUMNS, on_conflict: str = 'update',
+                chunk_size: int = 1000) -> UpsertReport:
+    """
+    Writes rows of the DataFrame to the table in the current transaction of the connection.
+    New rows get rowids above the largest rowid before the write, which tells inserted rows from updated ones.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        table (str): Name of the table, it has to have a unique constraint on conflict_columns.
+        df (pd.DataFrame): Rows to write, columns are named as columns of the table.
+        conflict_columns (Sequence[str]): Columns of a unique constraint of the table.
+        on_conflict (str): 'update' - conflicting rows are overwritten, 'nothing' - conflicting rows are skipped.
+        chunk_size (int): Number of rows passed to a single executemany.
+
+    Returns:
+        UpsertReport: Numbers of inserted, updated and skipped rows.
+    """
+    if df.empty:
+        return UpsertReport()
+    statement = build_upsert(table, list(df.columns), conflict_columns, on_conflict)
+    rows = get_rows(df)
+    max_rowid = conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()[0]
+    changes_before = conn.total_changes
+    for start in range(0, len(rows), chunk_size):
+        conn.executemany(statement, rows[start:start + chunk_size])
+    n_changed = conn.total_changes - changes_before
+    n_inserted = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE rowid > ?", (max_rowid,)).fetchone()[0]
+    return UpsertReport(n_inserted=n_inserted, n_updated=n_changed - n_inserted, n_ignored=len(rows) - n_changed)
+
+
+def bulk_upsert(conn: sqlite3.Connection, table: str, df: pd.DataFrame,
+                conflict_columns: Sequence[str] = OFFER_KEY_COLUMNS, on_conflict: str = 'update',
+                chunk_size: int = 1000) -> UpsertReport:
+    """
+    Writes rows of the DataFrame to the table in one transaction, committed when all chunks are written.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        table (str): Name of the table, it has to have a unique constraint on conflict_columns.
+        df (pd.DataFrame): Rows to write, columns are named as columns of the table.
+        conflict_columns (Sequence[str]): Columns of a unique constraint of the table.
+        on_conflict (str): 'update' - conflicting rows are overwritten, 'nothing' - conflicting rows are skipped.
+        chunk_size (int): Number of rows passed to a single executemany.
+
+    Returns:
+        UpsertReport: Numbers of inserted, updated and skipped rows.
+    """
+    with conn:
+        return upsert_rows(conn, table, df, conflict_columns, on_conflict, chunk_size)
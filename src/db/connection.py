@@ -0,0 +1,117 @@
+"""
+Shared SQLite connections of the pipeline.
+
+Steps reuse one connection per database file in every thread of a process instead of opening a new one
+for every load and upload. Connections are configured with `sqlite_pragmas` from the config, with WAL journaling
+readers don't block the writer. A connection is opened again when the process forks or the database file
+is replaced, e.g. a test database recreated at the same path.
+"""
+import atexit
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.utils.get_config import config
+from src.utils.setting_logger import Logger
+
+logger = Logger(__name__).get_logger()
+
+_local = threading.local()
+_opened: List[Tuple[int, sqlite3.Connection]] = []
+_opened_lock = threading.Lock()
+
+
+def apply_pragmas(conn: sqlite3.Connection, pragmas: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Sets pragmas on the connection.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        pragmas (Optional[Dict[str, Any]]): Pragma names and values, `sqlite_pragmas` from the config if None.
+    """
+    pragmas = config.get('sqlite_pragmas') if pragmas is None else pragmas
+    for name, value in (pragmas or {}).items():
+        conn.execute(f"PRAGMA {name}={value}")
+
+
+def connect(db: str, **kwargs: Any) -> sqlite3.Connection:
+    """
+    Opens a new connection with the configured pragmas, for connections that can't be shared,
+    e.g. in autocommit mode.
+
+    Args:
+        db (str): Path to the database file.
+        **kwargs: Arguments of sqlite3.connect.
+
+    Returns:
+        sqlite3.Connection: New connection.
+    """
+    conn = sqlite3.connect(db, **kwargs)
+    apply_pragmas(conn)
+    return conn
+
+
+def _file_id(path: str) -> Optional[int]:
+    """Returns inode of the database file, None if it doesn't exist."""
+    try:
+        return os.stat(path).st_ino
+    except OSError:
+        return None
+
+
+def _is_open(conn: sqlite3.Connection) -> bool:
+    """Returns True if the connection was not closed."""
+    try:
+        conn.total_changes
+        return True
+    except sqlite3.ProgrammingError:
+        return False
+
+
+def get_connection(db: str) -> sqlite3.Connection:
+    """
+    Returns the connection of the current thread to the database, opening it on first use.
+    Used as a context manager it commits, or rolls back, a transaction like a new connection would.
+
+    Args:
+        db (str): Path to the database file.
+
+    Returns:
+        sqlite3.Connection: Shared connection.
+    """
+    connections = _local.__dict__.setdefault('connections', {})
+    path = db if db == ':memory:' else os.path.realpath(db)
+    pid = os.getpid()
+    cached = connections.get(path)
+    if cached is not None:
+        conn_pid, file_id, conn = cached
+        if conn_pid == pid and file_id == _file_id(path) and _is_open(conn):
+            return conn
+        if conn_pid == pid:
+            conn.close()
+            with _opened_lock:
+                if (pid, conn) in _opened:
+                    _opened.remove((pid, conn))
+    # connections are used only by the thread that opened them, other threads only close them at exit
+    conn = connect(db, timeout=config.get('sqlite_timeout', 5), check_same_thread=False)
+    connections[path] = (pid, _file_id(path), conn)
+    with _opened_lock:
+        _opened.append((pid, conn))
+    return conn
+
+
+def close_connections() -> None:
+    """
+    Closes all connections opened by the process, the next `get_connection` opens new ones.
+    Connections inherited from the parent of a forked process are left to the parent.
+    """
+    pid = os.getpid()
+    with _opened_lock:
+        for conn_pid, conn in _opened:
+            if conn_pid == pid:
+                conn.close()
+        _opened.clear()
+
+
+atexit.register(close_connections)
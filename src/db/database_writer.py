@@ -0,0 +1,289 @@
+"""
+Single writer of the database shared by concurrently running steps.
+
+SQLite allows one writer at a time, producers writing on their own wait for each other's locks.
+With the writer, producers only queue batches of rows and a single thread writes them. Batches queued
+while a transaction is written are coalesced into the next one, so under load there are few large transactions.
+A full queue makes producers wait, which keeps memory bounded when the disk can't keep up.
+"""
+import atexit
+import os
+import queue
+import statistics
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+
+from src.db.bulk_upsert import UpsertReport, upsert_rows
+from src.db.connection import get_connection
+from src.db.offer_keys import OFFER_KEY_COLUMNS
+from src.utils.exceptions import DatabaseWriterException
+from src.utils.get_config import config
+from src.utils.setting_logger import Logger
+
+logger = Logger(__name__).get_logger()
+
+
+@dataclass
+class UpsertBatch:
+    """
+    Rows to upsert to a table.
+
+    Attributes:
+        table (str): Name of the table.
+        df (pd.DataFrame): Rows to write.
+        on_conflict (str): 'update' or 'nothing', see `bulk_upsert`.
+        conflict_columns (Tuple[str, ...]): Columns of a unique constraint of the table.
+    """
+    table: str
+    df: pd.DataFrame
+    on_conflict: str = 'update'
+    conflict_columns: Tuple[str, ...] = OFFER_KEY_COLUMNS
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def key(self) -> Tuple[Any, ...]:
+        """Returns key of batches that can be written with one statement."""
+        return 'upsert', self.table, tuple(self.df.columns), self.on_conflict, self.conflict_columns
+
+
+@dataclass
+class StatementBatch:
+    """
+    Parameters of a statement executed for every row.
+
+    Attributes:
+        statement (str): SQL statement.
+        params (List[Any]): Parameters of every execution.
+    """
+    statement: str
+    params: List[Any]
+
+    def __len__(self) -> int:
+        return len(self.params)
+
+    def key(self) -> Tuple[Any, ...]:
+        """Returns key of batches that can be written with one statement."""
+        return 'statement', self.statement
+
+
+Batch = Union[UpsertBatch, StatementBatch]
+
+
+class DatabaseWriter:
+    """
+    Thread writing batches queued by producers in large transactions.
+
+    Attributes:
+        db (str): Path of the database.
+        max_transaction_rows (int): Queued batches are coalesced until a transaction has this many rows.
+        chunk_size (int): Number of rows written by a single executemany.
+        queue (queue.Queue): Batches waiting to be written, producers wait when it's full.
+        commit_latencies (Deque[float]): Durations of the recent transactions in seconds.
+        n_transactions (int): Number of committed transactions.
+        n_batches (int): Number of written batches.
+        report (UpsertReport): Numbers of rows inserted, updated and ignored by upserts.
+        error (Optional[BaseException]): Error of a failed transaction, raised to producers.
+
+    Methods:
+        write(table, df, on_conflict, conflict_columns): Queues rows to upsert to a table.
+        execute_many(statement, params): Queues a statement executed for every parameter set.
+        flush(): Waits until all queued batches are written.
+        close(): Writes queued batches and stops the thread.
+        stats(): Returns counts of written rows and commit latency percentiles.
+    """
+    def __init__(self, db: str, max_queue_batches: int = 64, max_transaction_rows: int = 50000,
+                 chunk_size: int = 1000, latency_window: int = 1000):
+        self.db = db
+        self.max_transaction_rows = max_transaction_rows
+        self.chunk_size = chunk_size
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue_batches)
+        self.commit_latencies: Deque[float] = deque(maxlen=latency_window)
+        self.n_transactions = 0
+        self.n_batches = 0
+        self.report = UpsertReport()
+        self.error: Optional[BaseException] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def write(self, table: str, df: pd.DataFrame, on_conflict: str = 'update',
+              conflict_columns: Sequence[str] = OFFER_KEY_COLUMNS) -> None:
+        """
+        Queues rows to upsert to a table, the DataFrame must not be modified afterwards.
+
+        Args:
+            table (str): Name of the table.
+            df (pd.DataFrame): Rows to write.
+            on_conflict (str): 'update' or 'nothing', see `bulk_upsert`.
+            conflict_columns (Sequence[str]): Columns of a unique constraint of the table.
+        """
+        self._put(UpsertBatch(table, df, on_conflict, tuple(conflict_columns)))
+
+    def execute_many(self, statement: str, params: Sequence[Any]) -> None:
+        """
+        Queues a statement executed for every parameter set.
+
+        Args:
+            statement (str): SQL statement.
+            params (Sequence[Any]): Parameters of every execution.
+        """
+        self._put(StatementBatch(statement, list(params)))
+
+    def flush(self) -> None:
+        """
+        Waits until all queued batches are written.
+
+        Raises:
+            DatabaseWriterException: If writing of a batch failed.
+        """
+        if self._thread is not None:
+            self.queue.join()
+        self._raise_error()
+
+    def close(self) -> None:
+        """Writes queued batches and stops the thread."""
+        if self._thread is None:
+            return
+        self.queue.join()
+        self.queue.put(None)
+        self._thread.join()
+        self._thread = None
+        logger.info(f"Database writer closed, {self.stats()}")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns counts of written rows and commit latencies of the recent transactions.
+
+        Returns:
+            Dict[str, Any]: Numbers of transactions, batches and rows, median, 95th percentile
+                and maximum of commit latency in milliseconds.
+        """
+        latencies = sorted(self.commit_latencies)
+        stats = {'n_transactions': self.n_transactions, 'n_batches': self.n_batches,
+                 'n_inserted': self.report.n_inserted, 'n_updated': self.report.n_updated,
+                 'n_ignored': self.report.n_ignored}
+        if latencies:
+            stats.update({'commit_ms_p50': round(1000 * statistics.median(latencies), 2),
+                          'commit_ms_p95': round(1000 * latencies[int(0.95 * (len(latencies) - 1))], 2),
+                          'commit_ms_max': round(1000 * latencies[-1], 2)})
+        return stats
+
+    def _put(self, batch: Batch) -> None:
+        """Queues a batch, waits if the queue is full. The thread is started with the first batch."""
+        self._raise_error()
+        if len(batch) == 0:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='database-writer', daemon=True)
+                self._thread.start()
+        self.queue.put(batch)
+
+    def _raise_error(self) -> None:
+        """Raises error of a failed transaction to the producer."""
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise DatabaseWriterException(f"Writing to {self.db} failed: {error}") from error
+
+    def _run(self) -> None:
+        """Writes queued batches until the stop sentinel is received."""
+        stop = False
+        while not stop:
+            batches = [self.queue.get()]
+            if batches[0] is None:
+                self.queue.task_done()
+                return
+            n_rows = len(batches[0])
+            while n_rows < self.max_transaction_rows:
+                try:
+                    batch = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if batch is None:
+                    stop = True
+                    self.queue.task_done()
+                    break
+                batches.append(batch)
+                n_rows += len(batch)
+            try:
+                self._commit(batches)
+            except Exception as e:
+                logger.error(f"Database writer failed to write {len(batches)} batches: {e}")
+                self.error = e
+            finally:
+                for _ in batches:
+                    self.queue.task_done()
+
+    def _commit(self, batches: List[Batch]) -> None:
+        """
+        Writes batches in one transaction in queue order, consecutive batches of the same table and columns
+        are written together. Batches are never reordered, e.g. a delete stays between the inserts around it.
+        """
+        groups: List[List[Batch]] = []
+        for batch in batches:
+            if groups and groups[-1][0].key() == batch.key():
+                groups[-1].append(batch)
+            else:
+                groups.append([batch])
+        conn = get_connection(self.db)
+        start = time.perf_counter()
+        with conn:
+            for group in groups:
+                first = group[0]
+                if isinstance(first, UpsertBatch):
+                    df = pd.concat([batch.df for batch in group], ignore_index=True) if len(group) > 1 else first.df
+                    report = upsert_rows(conn, first.table, df, first.conflict_columns, first.on_conflict,
+                                         self.chunk_size)
+                    self.report.n_inserted += report.n_inserted
+                    self.report.n_updated += report.n_updated
+                    self.report.n_ignored += report.n_ignored
+                else:
+                    conn.executemany(first.statement, [params for batch in group for params in batch.params])
+        self.commit_latencies.append(time.perf_counter() - start)
+        self.n_transactions += 1
+        self.n_batches += len(batches)
+
+
+_writers: Dict[str, Tuple[int, DatabaseWriter]] = {}
+_writers_lock = threading.Lock()
+
+
+def get_database_writer(db: str) -> DatabaseWriter:
+    """
+    Returns the writer of the database shared by all steps of the process, configured with `database_writer`.
+
+    Args:
+        db (str): Path of the database.
+
+    Returns:
+        DatabaseWriter: Shared writer.
+    """
+    path = os.path.realpath(db)
+    pid = os.getpid()
+    with _writers_lock:
+        cached = _writers.get(path)
+        if cached is None or cached[0] != pid:
+            params = config.database_writer
+            writer = DatabaseWriter(db, max_queue_batches=params.max_queue_batches,
+                                    max_transaction_rows=params.max_transaction_rows,
+                                    chunk_size=config.db_write_chunk_size)
+            _writers[path] = (pid, writer)
+        return _writers[path][1]
+
+
+def close_database_writers() -> None:
+    """Writes queued batches of all writers of the process and stops them."""
+    pid = os.getpid()
+    with _writers_lock:
+        writers = [writer for writer_pid, writer in _writers.values() if writer_pid == pid]
+        _writers.clear()
+    for writer in writers:
+        writer.close()
+
+
+atexit.register(close_database_writers)
@@ -0,0 +1,133 @@
+"""
+Integer join keys of pipeline tables, `offer_id` parsed from the offer link and `survey_key` of the survey.
+
+The keys are the unique key and the conflict target of the upserts of the tables. Rows are written with the keys
+by the pipeline, `fill_offer_keys` fills rows inserted without them and `migrate_offer_keys` migrates databases
+created before the keys existed, or with the former UNIQUE(survey_id, link) key.
+"""
+import sqlite3
+from typing import List, Optional
+
+from src.db.sql_code import offer_key_tab_creations, survey_keys_insert, survey_keys_select, survey_keys_tab_creation
+from src.utils.links import offer_id_from_link
+from src.utils.setting_logger import Logger
+
+logger = Logger(__name__).get_logger()
+
+# unique key of the tables of src.db.sql_code.offer_key_tables, conflict target of their upserts
+OFFER_KEY_COLUMNS = ('survey_key', 'offer_id')
+
+
+def register_offer_id_function(conn: sqlite3.Connection) -> None:
+    """
+    Registers `offer_id(link)` SQL function on the connection.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+    """
+    conn.create_function('offer_id', 1, offer_id_from_link, deterministic=True)
+
+
+def get_survey_key(conn: sqlite3.Connection, survey_id: str) -> int:
+    """
+    Returns integer key of the survey, the key (and the survey_keys table) is created on first use.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        survey_id (str): ID of the survey.
+
+    Returns:
+        int: Key of the survey.
+    """
+    conn.execute(survey_keys_tab_creation)
+    conn.execute(survey_keys_insert, (survey_id,))
+    return conn.execute(survey_keys_select, (survey_id,)).fetchone()[0]
+
+
+def fill_offer_keys(conn: sqlite3.Connection, table: str, survey_id: Optional[str] = None) -> None:
+    """
+    Fills offer_id and survey_key of rows inserted without them. Rows whose keys would duplicate keys
+    of another row of the survey, e.g. two forms of the same link, are left without keys.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        table (str): Table with survey_id, link, offer_id and survey_key columns.
+        survey_id (Optional[str]): Only rows of this survey are filled, all rows if None.
+    """
+    register_offer_id_function(conn)
+    survey_filter = "AND survey_id = :survey_id" if survey_id is not None else ""
+    params = {'survey_id': survey_id}
+    conn.execute(f"INSERT OR IGNORE INTO survey_keys (survey_id) SELECT DISTINCT survey_id FROM {table} "
+                 f"WHERE (offer_id IS NULL OR survey_key IS NULL) AND survey_id IS NOT NULL {survey_filter}", params)
+    conn.execute(f"""
+        UPDATE OR IGNORE {table} SET offer_id = offer_id(link),
+            survey_key = (SELECT k.survey_key FROM survey_keys k WHERE k.survey_id = {table}.survey_id)
+        WHERE (offer_id IS NULL OR survey_key IS NULL) AND link IS NOT NULL {survey_filter}
+        """, params)
+
+
+def has_offer_key_constraint(conn: sqlite3.Connection, table: str) -> bool:
+    """
+    Checks if the table has a unique constraint on the offer keys.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        table (str): Name of the table.
+
+    Returns:
+        bool: True if (survey_key, offer_id) is unique in the table.
+    """
+    for _, index, is_unique, _, _ in conn.execute(f"PRAGMA index_list({table})").fetchall():
+        columns = tuple(row[2] for row in conn.execute(f"PRAGMA index_info({index})"))
+        if is_unique and columns == OFFER_KEY_COLUMNS:
+            return True
+    return False
+
+
+def rebuild_table(conn: sqlite3.Connection, table: str, columns: List[str]) -> None:
+    """
+    Recreates the table with its current creation statement and copies the rows, SQLite can't change
+    unique constraints of an existing table. Rows with duplicated offer keys are dropped, the first one is kept.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        table (str): Name of the table, one of offer_key_tables.
+        columns (List[str]): Columns of the existing table.
+    """
+    conn.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+    conn.execute(offer_key_tab_creations[table])
+    new_columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    copied = ', '.join(column for column in columns if column in new_columns)
+    n_rows = conn.execute(f"SELECT COUNT(*) FROM {table}_old").fetchone()[0]
+    conn.execute(f"INSERT OR IGNORE INTO {table} ({copied}) SELECT {copied} FROM {table}_old ORDER BY rowid")
+    n_copied = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    conn.execute(f"DROP TABLE {table}_old")
+    logger.info(f"Rebuilt {table} with UNIQUE{OFFER_KEY_COLUMNS}, {n_rows - n_copied} duplicated offers dropped")
+
+
+def migrate_offer_keys(conn: sqlite3.Connection) -> None:
+    """
+    Adds offer_id and survey_key columns to tables missing them and fills the keys. Tables created with
+    the former UNIQUE(survey_id, link) key are rebuilt with the offer keys unique. Rows of a survey are
+    looked up by the (survey_id, link) survey index.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+    """
+    conn.execute(survey_keys_tab_creation)
+    for table in offer_key_tab_creations:
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+        if not columns:
+            continue
+        missing = [column for column in OFFER_KEY_COLUMNS if column not in columns]
+        for column in missing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER")
+        if missing:
+            logger.info(f"Added {missing} to {table}, filling offer keys")
+        rebuild = not has_offer_key_constraint(conn, table)
+        if missing or rebuild:
+            fill_offer_keys(conn, table)
+        if rebuild:
+            rebuild_table(conn, table, columns + missing)
+        conn.execute(f"DROP INDEX IF EXISTS {table}_offer_key_idx")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_survey_idx ON {table} (survey_id, link)")
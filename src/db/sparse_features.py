@@ -0,0 +1,99 @@
+"""
+Long format of one-hot and label features.
+
+Features of `sparse_feature_tables` are mostly zeros, in the long format only non-zero values are stored
+in `sparse_features` as (survey_key, offer_id, feature_id, value). Names of the features are kept in
+`feature_dictionary`, new categories get a new id instead of being dropped for a missing column.
+"""
+import json
+import sqlite3
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from src.db.sql_code import (feature_dictionary_insert, feature_dictionary_select, sparse_features_delete,
+                             sparse_features_insert, sparse_features_select)
+from src.utils.setting_logger import Logger
+
+logger = Logger(__name__).get_logger()
+
+KEY_COLUMNS = ['survey_id', 'link', 'offer_id', 'survey_key']
+
+
+def get_feature_ids(conn: sqlite3.Connection, feature_table: str, feature_names: Sequence[str]) -> Dict[str, int]:
+    """
+    Returns ids of the features of a table, features missing in the dictionary are added.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        feature_table (str): Name of the wide table the features belong to.
+        feature_names (Sequence[str]): Names of the features.
+
+    Returns:
+        Dict[str, int]: Ids of all features of the table by name.
+    """
+    conn.executemany(feature_dictionary_insert, [(feature_table, name) for name in feature_names])
+    return dict(conn.execute(feature_dictionary_select, (feature_table,)).fetchall())
+
+
+def get_sparse_statements(df: pd.DataFrame, feature_table: str, survey_key: int,
+                          feature_ids: Dict[str, int]) -> List[Tuple[str, List[Any]]]:
+    """
+    Returns statements replacing features of a table of the offers in df with their non-zero values.
+
+    Args:
+        df (pd.DataFrame): Wide features with offer_id column.
+        feature_table (str): Name of the wide table the features belong to.
+        survey_key (int): Key of the survey of the offers.
+        feature_ids (Dict[str, int]): Ids of the features by name.
+
+    Returns:
+        List[Tuple[str, List[Any]]]: Statements and parameters of their executions, in order.
+    """
+    features = [column for column in df.columns if column in feature_ids]
+    offer_ids = df['offer_id'].to_numpy(dtype=np.int64)
+    values = df[features].to_numpy(dtype=float)
+    rows, cols = np.nonzero(np.nan_to_num(values))
+    column_ids = np.array([feature_ids[feature] for feature in features], dtype=np.int64)
+    entries = [(survey_key, int(offer_id), int(feature_id), float(value)) for offer_id, feature_id, value
+               in zip(offer_ids[rows], column_ids[cols], values[rows, cols])]
+    delete = {'survey_key': survey_key, 'offer_ids': json.dumps(offer_ids.tolist()), 'feature_table': feature_table}
+    return [(sparse_features_delete, [delete]), (sparse_features_insert, entries)]
+
+
+def read_sparse_features(conn: sqlite3.Connection, keys: pd.DataFrame,
+                         features: Dict[str, List[str]]) -> Tuple[sparse.csr_matrix, List[str]]:
+    """
+    Reads requested features of offers as a sparse matrix, features missing in the dictionary are all zeros.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        keys (pd.DataFrame): survey_key and offer_id of the offers, in order of the rows of the matrix.
+        features (Dict[str, List[str]]): Names of the requested features by the wide table they belong to.
+
+    Returns:
+        Tuple[sparse.csr_matrix, List[str]]: Matrix of the features and names of its columns.
+    """
+    requested = [(feature_table, name) for feature_table, names in features.items() for name in names]
+    columns = [name for _, name in requested]
+    ids = {feature_table: dict(conn.execute(feature_dictionary_select, (feature_table,)).fetchall())
+           for feature_table in features}
+    column_by_id = {}
+    for column, (feature_table, name) in enumerate(requested):
+        if name in ids[feature_table]:
+            column_by_id[ids[feature_table][name]] = column
+    for feature_table, names in features.items():
+        missing = [name for name in names if name not in ids[feature_table]]
+        if missing:
+            logger.warning(f"Features {missing} of {feature_table} not found in feature_dictionary")
+    long = pd.read_sql_query(sparse_features_select, conn,
+                             params={'survey_keys': json.dumps(keys['survey_key'].unique().tolist()),
+                                     'feature_ids': json.dumps(list(column_by_id))})
+    row_index = pd.MultiIndex.from_frame(keys[['survey_key', 'offer_id']])
+    rows = row_index.get_indexer(pd.MultiIndex.from_frame(long[['survey_key', 'offer_id']]))
+    found = rows >= 0
+    cols = long['feature_id'].map(column_by_id).to_numpy()
+    return sparse.csr_matrix((long['value'].to_numpy()[found], (rows[found], cols[found])),
+                             shape=(len(keys), len(columns))), columns
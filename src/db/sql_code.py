@@ -22,16 +22,23 @@ CREATE TABLE IF NOT EXISTS survey_links
 (
     survey_id TEXT,
     link TEXT,
-    UNIQUE(survey_id, link)
+    offer_id INTEGER,
+    survey_key INTEGER,
+    UNIQUE(survey_key, offer_id)
 )
 
 """
 
+survey_links_insert = """INSERT OR IGNORE INTO survey_links (survey_id, link, offer_id, survey_key)
+                 VALUES (?, ?, ?, ?);"""
+
 scraped_offers_tab_creation = """
 CREATE TABLE IF NOT EXISTS scraped_offers
 (
     survey_id TEXT,
     link TEXT,
+    offer_id INTEGER,
+    survey_key INTEGER,
     title TEXT,
     price TEXT,
     adress TEXT,
@@ -59,7 +66,7 @@ CREATE TABLE IF NOT EXISTS scraped_offers
     additional_info TEXT,
     building_material TEXT,
     description TEXT,
-    UNIQUE(survey_id, link)
+    UNIQUE(survey_key, offer_id)
 )
 """
 
@@ -68,6 +75,8 @@ CREATE TABLE IF NOT EXISTS numeric_features
 (
     survey_id TEXT,
     link TEXT,
+    offer_id INTEGER,
+    survey_key INTEGER,
     price REAL,
     sq_m_price REAL,
     area REAL,
@@ -77,7 +86,7 @@ CREATE TABLE IF NOT EXISTS numeric_features
     max_floor INTEGER,
     age_num INTEGER,
     days_till_available REAL,
-    UNIQUE(survey_id, link)
+    UNIQUE(survey_key, offer_id)
 )
 """
 
@@ -86,6 +95,8 @@ CREATE TABLE IF NOT EXISTS categorical_features
 (
     survey_id TEXT,
     link TEXT,
+    offer_id INTEGER,
+    survey_key INTEGER,
     ownership_type_MISSING REAL,
     ownership_type_pelna_wlasnosc REAL,
     ownership_type_spoldzielcze_wl_prawo_do_lokalu REAL,
@@ -143,7 +154,7 @@ CREATE TABLE IF NOT EXISTS categorical_features
     building_material_silikat REAL,
     building_material_wielka_plyta REAL,
     building_material_zelbet REAL,
-    UNIQUE(survey_id, link)
+    UNIQUE(survey_key, offer_id)
 )
 """
 
@@ -152,6 +163,8 @@ CREATE TABLE IF NOT EXISTS label_features
 (
     survey_id TEXT,
     link TEXT,
+    offer_id INTEGER,
+    survey_key INTEGER,
 
     balcony_NO REAL,
     balcony_balkon REAL,
@@ -189,7 +202,7 @@ CREATE TABLE IF NOT EXISTS label_features
     additional_info_oddzielna_kuchnia REAL,
     additional_info_piwnica REAL,
     additional_info_pom_uzytkowe REAL,
-    UNIQUE(survey_id, link)
+    UNIQUE(survey_key, offer_id)
 )
 """
 
@@ -198,10 +211,12 @@ CREATE TABLE IF NOT EXISTS geocoded_adr
 (
     survey_id TEXT,
     link TEXT,
+    offer_id INTEGER,
+    survey_key INTEGER,
     address TEXT,
     latitude REAL,
     longitude REAL,
-    UNIQUE(survey_id, link)
+    UNIQUE(survey_key, offer_id)
 )
 """
 
@@ -210,6 +225,8 @@ CREATE TABLE IF NOT EXISTS geo_features
 (
     survey_id TEXT,
     link TEXT,
+    offer_id INTEGER,
+    survey_key INTEGER,
     address TEXT,
     latitude REAL,
     longitude REAL,
@@ -220,7 +237,7 @@ CREATE TABLE IF NOT EXISTS geo_features
     center_dist REAL,
     closest_metro TEXT,
     metro_dist REAL,
-    UNIQUE(survey_id, link)
+    UNIQUE(survey_key, offer_id)
 )
 """
 
@@ -229,6 +246,8 @@ CREATE TABLE IF NOT EXISTS geo_dummy_features
 (
     survey_id TEXT,
     link TEXT,
+    offer_id INTEGER,
+    survey_key INTEGER,
     di_MISSING REAL,
     di_bemowo REAL,
     di_bialoleka REAL,
@@ -286,7 +305,312 @@ CREATE TABLE IF NOT EXISTS geo_dummy_features
     mt_wilanowska REAL,
     mt_wilenski REAL,
     mt_zacisze REAL,
+    UNIQUE(survey_key, offer_id)
+)
+
+"""
+
+http_cache_tab_creation = """
+CREATE TABLE IF NOT EXISTS http_cache
+(
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    record TEXT,
+    updated_at TIMESTAMP,
+    survey_id TEXT
+)
+
+"""
+
+# survey_id is the survey the page was downloaded and archived in
+http_cache_upsert = """INSERT OR REPLACE INTO http_cache (url, etag, last_modified, record, updated_at, survey_id)
+                 VALUES (?, ?, ?, ?, ?, ?);"""
+
+failed_links_tab_creation = """
+CREATE TABLE IF NOT EXISTS failed_links
+(
+    survey_id TEXT,
+    link TEXT,
+    status_code INT,
+    error TEXT,
+    attempts INT,
+    failed_at TIMESTAMP,
     UNIQUE(survey_id, link)
 )
 
 """
+
+failed_links_insert = """INSERT OR REPLACE INTO failed_links (survey_id, link, status_code, error, attempts, failed_at)
+                 VALUES (?, ?, ?, ?, ?, ?);"""
+
+link_queue_tab_creation = """
+CREATE TABLE IF NOT EXISTS link_queue
+(
+    survey_id TEXT,
+    link TEXT,
+    offer_id INTEGER,
+    survey_key INTEGER,
+    status TEXT,
+    worker_id TEXT,
+    lease_expires REAL,
+    attempts INT DEFAULT 0,
+    UNIQUE(survey_key, offer_id)
+)
+
+"""
+
+link_queue_idx_creation = "CREATE INDEX IF NOT EXISTS link_queue_status_idx ON link_queue (survey_id, status)"
+
+# links of the survey that are not in scraped_offers yet, same as the query of BaseScraper
+link_queue_populate = """
+INSERT OR IGNORE INTO link_queue (survey_id, link, offer_id, survey_key, status)
+SELECT l.survey_id, l.link, l.offer_id, l.survey_key, 'pending' FROM survey_links l
+WHERE l.survey_id = :survey_id
+  AND NOT EXISTS (SELECT 1 FROM scraped_offers s
+                  WHERE s.survey_key = l.survey_key AND s.offer_id = l.offer_id)
+"""
+
+# done links that were not saved, e.g. failed ones, are put back in the queue
+link_queue_requeue = """
+UPDATE link_queue SET status = 'pending', worker_id = NULL, lease_expires = NULL
+WHERE survey_id = :survey_id AND status = 'done'
+  AND NOT EXISTS (SELECT 1 FROM scraped_offers s
+                  WHERE s.survey_key = link_queue.survey_key AND s.offer_id = link_queue.offer_id)
+"""
+
+link_queue_claimable = """
+SELECT rowid, link, EXISTS (SELECT 1 FROM scraped_offers s
+                            WHERE s.survey_key = q.survey_key AND s.offer_id = q.offer_id) scraped
+FROM link_queue q
+WHERE survey_id = :survey_id
+  AND (status = 'pending' OR (status = 'leased' AND lease_expires < :now))
+ORDER BY rowid
+LIMIT :batch_size
+"""
+
+listing_cards_tab_creation = """
+CREATE TABLE IF NOT EXISTS listing_cards
+(
+    survey_id TEXT,
+    link TEXT,
+    price REAL,
+    area REAL,
+    n_rooms INT,
+    location TEXT,
+    card_hash TEXT,
+    UNIQUE(survey_id, link)
+)
+
+"""
+
+listing_cards_idx_creation = "CREATE INDEX IF NOT EXISTS listing_cards_link_idx ON listing_cards (link)"
+
+listing_cards_insert = """INSERT OR REPLACE INTO listing_cards (survey_id, link, price, area, n_rooms, location, card_hash)
+                 VALUES (?, ?, ?, ?, ?, ?, ?);"""
+
+# card hash of every link from its most recent survey before the given one
+listing_cards_last_known = """
+SELECT link, card_hash FROM listing_cards
+WHERE rowid IN (SELECT MAX(rowid) FROM listing_cards WHERE survey_id != :survey_id GROUP BY link)
+"""
+
+# every offer link seen in surveys, keyed by the normalized link (see src/utils/links.py)
+seen_links_tab_creation = """
+CREATE TABLE IF NOT EXISTS seen_links
+(
+    link TEXT PRIMARY KEY,
+    first_seen DATE,
+    last_seen DATE,
+    n_surveys INT DEFAULT 0,
+    last_survey_id TEXT,
+    scraped INT DEFAULT 0
+)
+
+"""
+
+# link collected in a survey, surveys are counted once per link
+seen_links_collected_upsert = """
+INSERT INTO seen_links (link, first_seen, last_seen, n_surveys, last_survey_id)
+VALUES (:link, :seen_at, :seen_at, 1, :survey_id)
+ON CONFLICT (link) DO UPDATE SET
+    last_seen = excluded.last_seen,
+    n_surveys = n_surveys + (last_survey_id IS NOT excluded.last_survey_id),
+    last_survey_id = excluded.last_survey_id
+"""
+
+seen_links_scraped_upsert = """
+INSERT INTO seen_links (link, first_seen, last_seen, scraped)
+VALUES (:link, :seen_at, :seen_at, 1)
+ON CONFLICT (link) DO UPDATE SET scraped = 1
+"""
+
+# scraped links among the given ones, :links is a JSON array of normalized links
+seen_links_scraped_among = """
+SELECT link FROM seen_links
+WHERE link IN (SELECT value FROM json_each(:links)) AND scraped = 1
+"""
+
+# fills seen_links from scraped_offers of databases created before the table existed
+seen_links_backfill = """
+INSERT INTO seen_links (link, first_seen, last_seen, n_surveys, scraped)
+SELECT ltrim(replace(s.link, 'https://www.otodom.pl/', ''), '/'), MIN(v.survey_date), MAX(v.survey_date),
+       COUNT(DISTINCT s.survey_id), 1
+FROM scraped_offers s LEFT JOIN surveys v ON v.survey_id = s.survey_id
+WHERE s.link IS NOT NULL
+GROUP BY 1
+ON CONFLICT (link) DO UPDATE SET scraped = 1
+"""
+
+# integer key of every survey, survey_id strings are replaced by it in join keys
+survey_keys_tab_creation = """
+CREATE TABLE IF NOT EXISTS survey_keys
+(
+    survey_key INTEGER PRIMARY KEY,
+    survey_id TEXT UNIQUE
+)
+
+"""
+
+survey_keys_insert = "INSERT OR IGNORE INTO survey_keys (survey_id) VALUES (?)"
+
+survey_keys_select = "SELECT survey_key FROM survey_keys WHERE survey_id = ?"
+
+# tables keyed by UNIQUE(survey_key, offer_id) and their creation statements, see src/db/offer_keys.py
+offer_key_tab_creations = {'survey_links': survey_links_tab_creation, 'scraped_offers': scraped_offers_tab_creation,
+                           'numeric_features': numeric_feature_tab_creation,
+                           'categorical_features': categorical_feature_tab_creation,
+                           'label_features': label_feature_tab_creation, 'geocoded_adr': geocoded_adr_tab_creation,
+                           'geo_features': geo_feature_tab_creation, 'geo_dummy_features': geo_dummy_tab_creation,
+                           'link_queue': link_queue_tab_creation}
+offer_key_tables = list(offer_key_tab_creations)
+
+# current liveness of every scraped listing, removed_at is set when the listing is first found removed
+listing_status_tab_creation = """
+CREATE TABLE IF NOT EXISTS listing_status
+(
+    link TEXT PRIMARY KEY,
+    offer_id INTEGER,
+    status TEXT,
+    status_code INT,
+    checked_at TIMESTAMP,
+    removed_at TIMESTAMP,
+    survey_id TEXT
+)
+
+"""
+
+listing_status_upsert = """
+INSERT INTO listing_status (link, offer_id, status, status_code, checked_at, removed_at, survey_id)
+VALUES (:link, :offer_id, :status, :status_code, :checked_at,
+        CASE WHEN :status = 'removed' THEN :checked_at END, :survey_id)
+ON CONFLICT (link) DO UPDATE SET
+    status = excluded.status,
+    status_code = excluded.status_code,
+    checked_at = excluded.checked_at,
+    survey_id = excluded.survey_id,
+    removed_at = CASE excluded.status WHEN 'active' THEN NULL
+                                      WHEN 'removed' THEN COALESCE(listing_status.removed_at, excluded.removed_at)
+                                      ELSE listing_status.removed_at END
+"""
+
+# scraped listings not known to be removed
+# links collected in the current survey are online, only listings of previous surveys are checked
+listing_status_active_links = """
+SELECT s.link FROM seen_links s
+LEFT JOIN listing_status ls ON ls.link = s.link
+WHERE s.scraped = 1 AND (ls.status IS NULL OR ls.status != 'removed')
+  AND s.last_survey_id IS NOT :survey_id
+"""
+
+# hot queries of the pipeline, filters and joins use columns covered by indexes (survey_id prefix of the
+# (survey_id, link) survey indexes and the UNIQUE(survey_key, offer_id) offer keys), see tests of query plans
+
+# links of the survey not scraped yet, an anti-join on the offer key index of scraped_offers
+pending_links_select = """
+SELECT l.survey_id, l.link FROM survey_links l
+WHERE l.survey_id = :survey_id
+  AND NOT EXISTS (SELECT 1 FROM scraped_offers s WHERE s.survey_key = l.survey_key AND s.offer_id = l.offer_id)
+"""
+
+survey_links_count = "SELECT COUNT(*) FROM survey_links WHERE survey_id = :survey_id"
+
+survey_links_select = "SELECT survey_id, link FROM survey_links WHERE survey_id = :survey_id"
+
+geocoded_adr_select = "SELECT * FROM geocoded_adr WHERE survey_id = :survey_id"
+
+geo_features_dummy_select = """
+SELECT survey_id, link, warsaw_district, closest_metro FROM geo_features WHERE survey_id = :survey_id
+"""
+
+# formatted with the selected columns, joins of wide one-hot and label features tables (empty if they are
+# read from sparse_features) and a placeholder for every survey id
+dataset_select = """
+SELECT {columns}
+FROM surveys s
+JOIN survey_keys k ON k.survey_id = s.survey_id
+JOIN numeric_features n ON n.survey_key = k.survey_key
+JOIN geo_features g ON g.survey_key = n.survey_key AND g.offer_id = n.offer_id
+{wide_feature_joins}
+WHERE s.survey_id IN ({survey_ids})
+  AND s.survey_type IN ('full', 'incremental')
+  AND n.sq_m_price NOT NULL
+  AND n.area > 10
+  AND n.area < 1000
+  AND n.sq_m_price > 100
+  AND g.in_warsaw = True
+"""
+
+dataset_wide_feature_joins = """
+LEFT JOIN categorical_features cf ON cf.survey_key = n.survey_key AND cf.offer_id = n.offer_id
+LEFT JOIN label_features l ON l.survey_key = n.survey_key AND l.offer_id = n.offer_id
+LEFT JOIN geo_dummy_features gd ON gd.survey_key = n.survey_key AND gd.offer_id = n.offer_id
+"""
+
+# long format of one-hot and label features, only non-zero values of features of sparse_feature_tables are stored
+sparse_feature_tables = ['categorical_features', 'label_features', 'geo_dummy_features']
+
+feature_dictionary_tab_creation = """
+CREATE TABLE IF NOT EXISTS feature_dictionary
+(
+    feature_id INTEGER PRIMARY KEY,
+    feature_table TEXT,
+    feature_name TEXT,
+    UNIQUE(feature_table, feature_name)
+)
+"""
+
+feature_dictionary_insert = "INSERT OR IGNORE INTO feature_dictionary (feature_table, feature_name) VALUES (?, ?)"
+
+feature_dictionary_select = "SELECT feature_name, feature_id FROM feature_dictionary WHERE feature_table = ?"
+
+sparse_features_tab_creation = """
+CREATE TABLE IF NOT EXISTS sparse_features
+(
+    survey_key INTEGER,
+    offer_id INTEGER,
+    feature_id INTEGER,
+    value REAL,
+    PRIMARY KEY (survey_key, offer_id, feature_id)
+) WITHOUT ROWID
+"""
+
+# removes features of a table of the offers before they are written again, :offer_ids is a JSON array
+sparse_features_delete = """
+DELETE FROM sparse_features
+WHERE survey_key = :survey_key
+  AND offer_id IN (SELECT value FROM json_each(:offer_ids))
+  AND feature_id IN (SELECT feature_id FROM feature_dictionary WHERE feature_table = :feature_table)
+"""
+
+sparse_features_insert = """
+INSERT OR REPLACE INTO sparse_features (survey_key, offer_id, feature_id, value) VALUES (?, ?, ?, ?)
+"""
+
+# non-zero values of the requested features of surveys, :survey_keys and :feature_ids are JSON arrays
+sparse_features_select = """
+SELECT f.survey_key, f.offer_id, f.feature_id, f.value
+FROM sparse_features f
+WHERE f.survey_key IN (SELECT value FROM json_each(:survey_keys))
+  AND f.feature_id IN (SELECT value FROM json_each(:feature_ids))
+"""
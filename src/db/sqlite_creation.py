@@ -1,10 +1,15 @@
-import sqlite3
+from src.db.connection import get_connection
 from src.utils.setting_logger import Logger
+from src.db.offer_keys import migrate_offer_keys
 from src.db.sql_code import (survey_tab_creation, survey_links_tab_creation,
                              scraped_offers_tab_creation, numeric_feature_tab_creation,
                              categorical_feature_tab_creation, label_feature_tab_creation,
                              geocoded_adr_tab_creation, geo_feature_tab_creation,
-                             geo_dummy_tab_creation)
+                             geo_dummy_tab_creation, http_cache_tab_creation,
+                             failed_links_tab_creation, link_queue_tab_creation, link_queue_idx_creation,
+                             listing_cards_tab_creation, listing_cards_idx_creation,
+                             seen_links_tab_creation, seen_links_backfill, listing_status_tab_creation,
+                             feature_dictionary_tab_creation, sparse_features_tab_creation)
 
 logger = Logger(__name__).get_logger()
 
@@ -21,7 +26,7 @@ def create_sqlite_db(db: str) -> None:
     """
     logger.info("Creating SQLite database if doesn't exist")
 
-    with sqlite3.connect(db) as conn:
+    with get_connection(db) as conn:
         cur = conn.cursor()
         # create table if exists
         cur.execute(survey_tab_creation)
@@ -37,5 +42,23 @@ def create_sqlite_db(db: str) -> None:
         cur.execute(geo_feature_tab_creation)
         cur.execute(geo_dummy_tab_creation)
 
+        cur.execute(http_cache_tab_creation)
+        if 'survey_id' not in {row[1] for row in cur.execute("PRAGMA table_info(http_cache)")}:
+            cur.execute("ALTER TABLE http_cache ADD COLUMN survey_id TEXT")
+        cur.execute(failed_links_tab_creation)
+        cur.execute(link_queue_tab_creation)
+        cur.execute(listing_cards_tab_creation)
+        cur.execute(listing_cards_idx_creation)
+        cur.execute(seen_links_tab_creation)
+        if cur.execute("SELECT NOT EXISTS (SELECT 1 FROM seen_links)").fetchone()[0]:
+            cur.execute(seen_links_backfill)
+        cur.execute(listing_status_tab_creation)
+        cur.execute(feature_dictionary_tab_creation)
+        cur.execute(sparse_features_tab_creation)
+
+        migrate_offer_keys(conn)
+        # after the migration, a rebuilt link_queue loses its indexes
+        cur.execute(link_queue_idx_creation)
+
         conn.commit()
     logger.info("Database created successfully")
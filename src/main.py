@@ -17,6 +17,9 @@ from src.utils.funcs import check_if_shp_exists
 import src.paths as paths
 
 from src.pipeline.scraping.async_scraping import AsyncScraper
+from src.pipeline.scraping.replay_scraping import ReplayScraper
+from src.pipeline.scraping.scrapy_scraping import ScrapyScraper
+from src.pipeline.scraping.liveness_checking import ListingLivenessChecker
 import time
 
 logger = Logger(__name__).get_logger()
@@ -39,8 +42,16 @@ create_sqlite_db(db)
 if config.new_survey:
     survey_creator = SurveyCreator(db, config.survey_type, config.location, max_page_num=config.max_page_num)
     survey_creator.create_survey_in_table()
-    survey_creator.collect_links_list()
-    survey_creator.clean_and_save_links_to_db()
+    # scrapy spider collects links itself while scraping offers
+    if config.module_scraping and config.scraping_mode == 'scrapy':
+        pass
+    elif config.partitioned_links_collection.enabled:
+        survey_creator.partitioned_links_to_db()
+    elif config.stream_links_collection:
+        survey_creator.stream_links_to_db()
+    else:
+        survey_creator.collect_links_list()
+        survey_creator.clean_and_save_links_to_db()
 
     survey_id = survey_creator.survey_id
 else:
@@ -49,9 +60,15 @@ else:
     logger.info(f"Resuming survey: {survey_id}")
 
 if config.module_scraping:
-    if config.use_async_scraping:
+    if config.scraping_mode == 'async':
         logger.info(f"Using async scraper")
         scraper = AsyncScraper(db=db, survey_id=survey_id)
+    elif config.scraping_mode == 'scrapy':
+        logger.info(f"Using scrapy spider")
+        scraper = ScrapyScraper(db=db, survey_id=survey_id)
+    elif config.scraping_mode == 'replay':
+        logger.info(f"Replaying survey from html archive")
+        scraper = ReplayScraper(db=db, survey_id=survey_id)
     else:
         logger.info(f"Using regular scraper")
         scraper = Scraper(db=db, survey_id=survey_id)
@@ -61,6 +78,10 @@ if config.module_scraping:
     scraping_time = t2-t1
     logger.info(f"Scraping executed in {scraping_time}")
 
+if config.module_check_liveness:
+    liveness_checker = ListingLivenessChecker(db=db, survey_id=survey_id)
+    liveness_checker.execute_step()
+
 if config.module_data_cleaning:
     cleaners = [NumericDataCleaner, CategoricalDataCleaner, LabelDataCleaner]
 
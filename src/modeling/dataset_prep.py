@@ -1,11 +1,21 @@
-import sqlite3
+from src.db.connection import get_connection
 import pandas as pd
+from scipy import sparse
+from src.db.sparse_features import read_sparse_features
+from src.db.sql_code import dataset_select, dataset_wide_feature_joins
 from src.utils.get_config import config
 from src.utils.get_config import feature_set_definitions
 from sklearn.model_selection import train_test_split
 
 
-def prepare_dataset(feature_set, surveys_to_use):
+def get_sparse_feature_names(feature_set):
+    # one-hot and label features by the wide table they belong to
+    return {'categorical_features': list(feature_set_definitions[feature_set].cat_cols_to_use),
+            'label_features': list(feature_set_definitions[feature_set].lab_cols_to_use),
+            'geo_dummy_features': list(feature_set_definitions[feature_set].geo_dum_cols_to_use)}
+
+
+def get_dataset_query(feature_set, n_surveys, sparse_storage=False):
     num_cols_to_use = [f'n.{col}' for col in feature_set_definitions[feature_set].num_cols_to_use]
     geo_cols_to_use = [f'g.{col}' for col in feature_set_definitions[feature_set].geo_cols_to_use]
     cat_cols_to_use = [f'cf.{col}' for col in feature_set_definitions[feature_set].cat_cols_to_use]
@@ -14,32 +24,49 @@ def prepare_dataset(feature_set, surveys_to_use):
 
     base_cols = ['s.survey_id', 'n.link', 'n.sq_m_price']
 
-    all_cols = base_cols + num_cols_to_use + geo_cols_to_use + cat_cols_to_use + lab_cols_to_use + geo_dum_cols_to_use
-    all_cols_formatted = str(all_cols).replace('[', '').replace(']', '').replace("'", '')
-    #
-    query = f"""
-    select {all_cols_formatted}
-    from numeric_features n
-    left join categorical_features cf on n.link = cf.link and n.survey_id = cf.survey_id
-    left join label_features l on n.link = l.link and n.survey_id = l.survey_id
-    left join geo_features g on n.link = g.link and n.survey_id = g.survey_id
-    left join geo_dummy_features gd on n.link = gd.link and n.survey_id = gd.survey_id
-    left join surveys s on n.survey_id = s.survey_id
-    where s.survey_id in {str(surveys_to_use)} and
-    s.survey_type in ('full', 'incremental') and
-    n.sq_m_price not null and
-    n.area > 10 and
-    n.area < 1000 and
-    n.sq_m_price > 100 and
-    g.in_warsaw = True
-    """
-
-    with sqlite3.connect(config.sqlite_db) as conn:
-        df = pd.read_sql_query(query, conn)
-    df = df.set_index(['survey_id', 'link'])
+    if sparse_storage:
+        # one-hot and label features are read from sparse_features and joined on the offer keys
+        all_cols = base_cols + num_cols_to_use + geo_cols_to_use + ['n.survey_key', 'n.offer_id']
+        joins = ''
+    else:
+        all_cols = base_cols + num_cols_to_use + geo_cols_to_use + cat_cols_to_use + lab_cols_to_use + geo_dum_cols_to_use
+        joins = dataset_wide_feature_joins
+    return dataset_select.format(columns=', '.join(all_cols), wide_feature_joins=joins,
+                                 survey_ids=', '.join(['?'] * n_surveys))
+
+
+def load_dataset(feature_set, surveys_to_use):
+    # returns dense columns and, with sparse feature storage, the sparse matrix of one-hot and label features
+    query = get_dataset_query(feature_set, len(surveys_to_use), config.sparse_feature_storage)
+
+    with get_connection(config.sqlite_db) as conn:
+        df = pd.read_sql_query(query, conn, params=list(surveys_to_use))
+        if not config.sparse_feature_storage:
+            return df.set_index(['survey_id', 'link']), None, []
+        matrix, columns = read_sparse_features(conn, df[['survey_key', 'offer_id']],
+                                               get_sparse_feature_names(feature_set))
+    df = df.drop(columns=['survey_key', 'offer_id']).set_index(['survey_id', 'link'])
+    return df, matrix, columns
+
+
+def prepare_dataset(feature_set, surveys_to_use):
+    df, matrix, columns = load_dataset(feature_set, surveys_to_use)
+    if matrix is not None:
+        # pivot of the long format back to wide, offers without a value of a feature have 0
+        df = pd.concat([df, pd.DataFrame(matrix.toarray(), columns=columns, index=df.index)], axis=1)
     return df
 
 
+def prepare_sparse_dataset(feature_set, surveys_to_use):
+    # dense columns and a scipy sparse matrix of one-hot and label features, rows in the same order
+    df, matrix, columns = load_dataset(feature_set, surveys_to_use)
+    if matrix is None:
+        columns = [col for cols in get_sparse_feature_names(feature_set).values() for col in cols]
+        matrix = sparse.csr_matrix(df[columns].fillna(0).to_numpy(dtype=float))
+        df = df.drop(columns=columns)
+    return df, matrix, columns
+
+
 def prepare_x_y(df):
     ## X y
     y = df['sq_m_price']
@@ -1,6 +1,7 @@
 import pandas as pd
 from src.utils.setting_logger import Logger
 from src.utils.get_config import config
+from src.db.sql_code import geo_features_dummy_select
 from src.pipeline.pipeline_step_abc import PipelineStepABC
 from src.utils.data_cleaning_funcs import normalize_categoricals
 from typing import Tuple
@@ -26,8 +27,7 @@ class GeoDummyCoder(PipelineStepABC):
     def __init__(self, db: str, survey_id: str):
         super().__init__(db, survey_id)
         self.output_table = 'geo_dummy_features'
-        self.query = f"""select survey_id, link, warsaw_district, closest_metro 
-        from geo_features where survey_id='{self.survey_id}'"""
+        self.query = geo_features_dummy_select
 
     def load_previous_step_data(self):
         """
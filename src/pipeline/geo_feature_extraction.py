@@ -5,6 +5,7 @@ from shapely.geometry import Point
 from typing import Any
 from src.utils.setting_logger import Logger
 from src.utils.get_config import config
+from src.db.sql_code import geocoded_adr_select
 from src.pipeline.pipeline_step_abc import PipelineStepABC
 from src.paths import metro_locations_path, jed_ewidencyjne_path, gminy_path, powiaty_path
 
@@ -47,7 +48,7 @@ class GeoFeatureExtractor(PipelineStepABC):
         self.warsaw_center = Point(21.006209576726654, 52.230931183433256)
         self.warsaw_center = convert_point_to_crs(self.warsaw_center,
                                                   new_crs=self.warszawa_dzielnice.crs, base_crs='EPSG:4326')
-        self.query = f"select * from geocoded_adr where survey_id = '{self.survey_id}'"
+        self.query = geocoded_adr_select
         self.output_table = 'geo_features'
 
     def load_previous_step_data(self):
@@ -1,8 +1,15 @@
 from abc import ABC, abstractmethod
 from src.utils.setting_logger import Logger
 import pandas as pd
-import sqlite3
-from typing import Optional
+from src.db.connection import get_connection
+from typing import Any, Dict, Optional
+from src.db.bulk_upsert import bulk_upsert
+from src.db.database_writer import DatabaseWriter, get_database_writer
+from src.db.offer_keys import get_survey_key
+from src.db.sparse_features import KEY_COLUMNS, get_feature_ids, get_sparse_statements
+from src.db.sql_code import sparse_feature_tables
+from src.utils.get_config import config
+from src.utils.links import offer_id_from_link
 
 logger = Logger(__name__).get_logger()
 
@@ -21,13 +28,21 @@ class PipelineStepABC(ABC):
         df (Optional[pd.DataFrame]): DataFrame holding input data.
         df_out (Optional[pd.DataFrame]): DataFrame holding output data.
         query (str): SQL query for loading data.
+        query_params (Dict[str, Any]): Parameters of the query, by default the survey_id.
+        on_conflict (str): 'update' - results of a rerun overwrite saved rows, 'nothing' - saved rows are kept.
+        write_chunk_size (int): Number of rows written by a single executemany.
+        writer (Optional[DatabaseWriter]): Writer thread of the database, None if results are written by the step.
+        survey_key (Optional[int]): Integer key of the survey, read on the first upload.
 
     Methods:
         execute_step(): Executes the pipeline step.
         process(): Abstract method for processing data.
         load_previous_step_data(): Loads data from the previous step.
         validate_output_columns(): Validates and adjusts output DataFrame columns.
+        add_offer_keys(): Adds integer keys of the offers to the output DataFrame.
         upload_results_to_db(): Uploads the results to the database.
+        upload_sparse_features(): Uploads one-hot and label features in the long format.
+        wait_for_writes(): Waits until results queued for the writer are written.
         save_results(file_name): Saves the DataFrame to a CSV file.
     """
     def __init__(self, db: str, survey_id: str):
@@ -37,12 +52,18 @@ class PipelineStepABC(ABC):
         self.db: str = db
         self.survey_id: str = survey_id
         self.query = f"select * from scraped_offers where survey_id='{self.survey_id}'"
+        self.query_params: Dict[str, Any] = {'survey_id': self.survey_id}
+        self.on_conflict: str = 'update'
+        self.write_chunk_size: int = config.db_write_chunk_size
+        self.writer: Optional[DatabaseWriter] = get_database_writer(db) if config.database_writer.enabled else None
+        self.survey_key: Optional[int] = None
 
     def execute_step(self):
         """Executes the pipeline step by loading, processing, and uploading data."""
         self.load_previous_step_data()
         self.process()
         self.upload_results_to_db()
+        self.wait_for_writes()
 
     @abstractmethod
     def process(self):
@@ -51,18 +72,23 @@ class PipelineStepABC(ABC):
 
     def load_previous_step_data(self):
         """Loads data from a database based on the specified query into a DataFrame."""
-        with sqlite3.connect(self.db) as conn:
-            self.df = pd.read_sql_query(self.query, conn)
+        with get_connection(self.db) as conn:
+            self.df = pd.read_sql_query(self.query, conn, params=self.query_params)
         logger.info(f"Number of records loaded: {str(len(self.df))}")
 
     def validate_output_columns(self):
-        """Validates and adjusts the output DataFrame's columns to match the database schema."""
+        """
+        Validates and adjusts the output DataFrame's columns to match the database schema.
+        Integer keys offer_id and survey_key are added for tables keyed by them.
+        """
         if 'survey_id' not in self.df_out.columns:
             self.df_out['survey_id'] = self.survey_id
             logger.info(self.survey_id)
 
-        with sqlite3.connect(self.db) as conn:
+        with get_connection(self.db) as conn:
             col_names_db = pd.read_sql_query(f'PRAGMA table_info({self.output_table})', conn)['name']
+        if {'offer_id', 'survey_key'}.issubset(set(col_names_db)) and 'link' in self.df_out.columns:
+            self.add_offer_keys()
         cols_not_in_db = list(set(self.df_out.columns).difference(set(col_names_db)))
 
         if cols_not_in_db:
@@ -71,14 +97,63 @@ class PipelineStepABC(ABC):
         else:
             logger.info("All columns in the table present in database")
 
+    def add_offer_keys(self):
+        """Adds integer keys offer_id, parsed from the link, and survey_key of the survey to the output DataFrame."""
+        self.df_out['offer_id'] = self.df_out['link'].map(
+            lambda link: offer_id_from_link(link) if isinstance(link, str) else None)
+        if self.survey_key is None:
+            with get_connection(self.db) as conn:
+                self.survey_key = get_survey_key(conn, self.survey_id)
+        self.df_out['survey_key'] = self.survey_key
+
     def upload_results_to_db(self):
-        """Validates output columns and uploads the results DataFrame to the specified database table."""
+        """
+        Validates output columns and upserts the results DataFrame to the specified database table,
+        rows with offer keys already in the table are resolved according to `on_conflict`.
+        With the database writer enabled the results are only queued, see `wait_for_writes`.
+        With `sparse_feature_storage` one-hot and label features are saved in the long format instead.
+        """
+        if config.sparse_feature_storage and self.output_table in sparse_feature_tables:
+            self.upload_sparse_features()
+            return
         self.validate_output_columns()
         logger.info(f"Uploading results to database, table: {self.output_table}")
         logger.info(f"Number of records to upload: {str(len(self.df_out))}")
-        with sqlite3.connect(self.db) as conn:
-            self.df_out.to_sql(self.output_table, conn, if_exists='append', index=False)
-        logger.info(f"Results uploaded successfully")
+        if self.writer is not None:
+            self.writer.write(self.output_table, self.df_out, on_conflict=self.on_conflict)
+            return
+        report = bulk_upsert(get_connection(self.db), self.output_table, self.df_out, on_conflict=self.on_conflict,
+                             chunk_size=self.write_chunk_size)
+        logger.info(f"Results uploaded successfully, {report.n_inserted} inserted, {report.n_updated} updated, "
+                    f"{report.n_ignored} ignored")
+
+    def upload_sparse_features(self):
+        """
+        Saves non-zero values of the output features to sparse_features, replacing previous values of the offers.
+        Features missing in feature_dictionary, e.g. new categories, are added to it.
+        """
+        if 'survey_id' not in self.df_out.columns:
+            self.df_out['survey_id'] = self.survey_id
+        self.add_offer_keys()
+        features = [column for column in self.df_out.columns if column not in KEY_COLUMNS]
+        with get_connection(self.db) as conn:
+            feature_ids = get_feature_ids(conn, self.output_table, features)
+        statements = get_sparse_statements(self.df_out, self.output_table, self.survey_key, feature_ids)
+        if self.writer is not None:
+            for statement, params in statements:
+                self.writer.execute_many(statement, params)
+        else:
+            with get_connection(self.db) as conn:
+                for statement, params in statements:
+                    conn.executemany(statement, params)
+        logger.info(f"Uploaded {len(statements[-1][1])} non-zero values of {len(features)} features "
+                    f"of {self.output_table} to sparse_features")
+
+    def wait_for_writes(self):
+        """Waits until the results queued for the database writer are written, if the writer is enabled."""
+        if self.writer is not None:
+            self.writer.flush()
+            logger.info(f"Results written by the database writer, {self.writer.stats()}")
 
     def save_results(self, file_name: str) -> None:
         """
@@ -1,10 +1,17 @@
 import pandas as pd
 
-from src.pipeline.scraping.scraping_funcs import extract_info_from_response
+from src.pipeline.scraping.scraping_funcs import (extract_info_from_response, extract_info_with_path,
+                                                  extraction_path_counts)
+from src.pipeline.scraping.rate_limiting import AdaptiveRateLimiter
+from src.pipeline.scraping.result_buffer import ResultBuffer
+from src.pipeline.scraping.validator_cache import ValidatorCache
+from src.pipeline.scraping.http_backends import HttpBackendABC, get_http_backend
+from src.pipeline.scraping.hedging import LatencyTracker, get_with_hedging
+from src.utils.exceptions import UserInterruptException
 from src.utils.setting_logger import Logger
 from src.utils.get_config import config
-from typing import List, Dict, Optional, Any
-import aiohttp
+from typing import List, Dict, Optional, Any, Callable
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import asyncio
 
 from src.pipeline.scraping.base_scraper import BaseScraper
@@ -17,92 +24,288 @@ class AsyncScraper(BaseScraper):
     Asynchronous scraper for extracting information from real estate offer links.
 
     This class extends BaseScraper to asynchronously process a list of URLs by scraping
-    information from each URL and compiling the results into a DataFrame.
+    information from each URL. Results are uploaded to the database in batches as they complete,
+    so an interrupted run can be resumed with the links that were not saved yet.
 
-    Note: it can return 403 http errors if too many links are provided
+    Number of requests in flight is limited by `async_fetch_concurrency` and the rate of requests
+    per host is controlled by an adaptive token bucket configured in `async_rate_limit`.
+    HTML parsing is CPU bound, so it is done in a pool of `async_parse_workers` processes
+    to not block the event loop. Requests are bounded by `http_timeouts`, the run by `scraping_time_budget`,
+    and with `hedged_requests` enabled requests slower than usual are duplicated.
+
+    Attributes:
+        fetch_concurrency (int): Maximum number of requests in flight.
+        rate_limit_params (Box): Parameters of the adaptive rate limiter.
+        flush_batch_size (int): Number of scraped offers uploaded to the database at once.
+        parse_workers (int): Number of processes parsing HTML, if 0 HTML is parsed in the event loop.
+        latency_tracker (Optional[LatencyTracker]): Latencies of requests used for hedging, None if disabled.
 
     Methods:
-        process(): Asynchronously scrapes data from links and stores results in a DataFrame.
+        process(): Asynchronously scrapes data from links and uploads results in batches.
         execute_step(): Orchestrates the loading, processing, and uploading of scraped data.
     """
+    def __init__(self, db: str, survey_id: str):
+        super().__init__(db, survey_id)
+        self.fetch_concurrency = config.async_fetch_concurrency
+        self.rate_limit_params = config.async_rate_limit
+        self.flush_batch_size = config.async_flush_batch_size
+        self.parse_workers = config.async_parse_workers
+        self.latency_tracker: Optional[LatencyTracker] = None
+        if config.hedged_requests.enabled:
+            self.latency_tracker = LatencyTracker.from_config(config.hedged_requests)
 
     def process(self):
         """
         Asynchronously processes the list of links by scraping information from each link.
-        Compiles the scraped data into a DataFrame.
+        Scraped offers are uploaded to the database every `flush_batch_size` results.
         """
-        results = asyncio.run(main(self.links))
-        self.df_out = pd.DataFrame(results)
+        rate_limiter = AdaptiveRateLimiter.from_config(self.rate_limit_params)
+        result_buffer = ResultBuffer(self.upload_batch, self.flush_batch_size)
+        parse_executor = ProcessPoolExecutor(max_workers=self.parse_workers) if self.parse_workers else None
+        try:
+            asyncio.run(main(self.links, max_concurrency=self.fetch_concurrency, rate_limiter=rate_limiter,
+                             on_result=result_buffer.add, parse_executor=parse_executor,
+                             max_parse_queue=2 * self.parse_workers,
+                             on_fetched=self.archive_html if self.archive is not None else None,
+                             on_not_modified=self.archive_not_modified if self.archive is not None else None,
+                             validator_cache=self.validator_cache, time_budget=self.remaining_budget(),
+                             latency_tracker=self.latency_tracker))
+        except KeyboardInterrupt:
+            logger.info("User interrupted the process. Exiting...")
+            raise UserInterruptException
+        finally:
+            if parse_executor is not None:
+                parse_executor.shutdown(cancel_futures=True)
+            result_buffer.flush()
+            logger.info(f"Scraping finished, {result_buffer.n_flushed} offers saved, "
+                        f"rate limiter backed off {rate_limiter.n_backoffs} times, "
+                        f"extraction paths used: {dict(extraction_path_counts)}")
+            if self.validator_cache is not None:
+                logger.info(f"Validator cache hits: {self.validator_cache.hits}, misses: {self.validator_cache.misses}")
+            if self.latency_tracker is not None:
+                logger.info(f"Hedged requests: {self.latency_tracker.n_hedged}, "
+                            f"won by the hedge: {self.latency_tracker.n_hedge_wins}")
 
     def execute_step(self):
         """
-        Executes the scraping step by loading links, processing them asynchronously, and uploading results.
+        Executes the scraping step by loading links and processing them asynchronously,
+        results are uploaded during processing. If `use_work_queue` is set, links are claimed in batches
+        from the work queue shared with other workers.
         """
+        self.start_time_budget()
+        if config.use_work_queue:
+            self.drain_work_queue()
+            return
         self.load_previous_step_data()
         self.process()
-        self.upload_results_to_db()
+        self.wait_for_writes()
 
 
-async def scrape_real_estate_offer(session: aiohttp.ClientSession, url: str) -> Optional[Dict[str, Any]]:
+async def scrape_real_estate_offer(client: HttpBackendABC, url: str,
+                                   semaphore: Optional[asyncio.Semaphore] = None,
+                                   rate_limiter: Optional[AdaptiveRateLimiter] = None,
+                                   parse_executor: Optional[ProcessPoolExecutor] = None,
+                                   parse_semaphore: Optional[asyncio.Semaphore] = None,
+                                   on_fetched: Optional[Callable[[str, str], None]] = None,
+                                   validator_cache: Optional[ValidatorCache] = None,
+                                   latency_tracker: Optional[LatencyTracker] = None,
+                                   on_not_modified: Optional[Callable[[str], bool]] = None) -> Optional[Dict[str, Any]]:
     """
     Asynchronously scrapes a real estate offer from the given URL.
 
+    Fetch slot is released only after a parse slot is acquired, so slow parsing throttles fetching
+    and the number of fetched pages kept in memory stays bounded.
+
     Args:
-        session (aiohttp.ClientSession): The HTTP session to use for the request.
+        client (HttpBackendABC): The HTTP client to use for the request.
         url (str): The URL of the real estate offer to scrape.
+        semaphore (Optional[asyncio.Semaphore]): Semaphore limiting the number of requests in flight.
+        rate_limiter (Optional[AdaptiveRateLimiter]): Rate limiter of requests per host.
+        parse_executor (Optional[ProcessPoolExecutor]): Pool of processes parsing HTML,
+            if None HTML is parsed in the event loop.
+        parse_semaphore (Optional[asyncio.Semaphore]): Semaphore limiting the number of pages waiting for parsing.
+        on_fetched (Optional[Callable[[str, str], None]]): Function called with the url and HTML of the fetched
+            page, run in a thread to not block the event loop.
+        validator_cache (Optional[ValidatorCache]): Cache of validators, if provided the request is conditional
+            and the cached record is returned if the page was not modified.
+        latency_tracker (Optional[LatencyTracker]): Latencies of requests, if provided slow requests are hedged.
+        on_not_modified (Optional[Callable[[str], bool]]): Function called with the url of a page answered with
+            304 Not Modified, run in a thread. If it returns False the page is downloaded again unconditionally.
 
     Returns:
         Optional[Dict[str, Any]]: A dictionary containing extracted information, or None if failed.
     """
-    html = await fetch(session, url)
-    if html is None:
-        return None
-        logger.info('html is none')
-    result = extract_info_from_response(html, url)
-    return result
+    if semaphore is None:
+        html = await fetch_offer(client, url, rate_limiter, validator_cache, latency_tracker, on_not_modified)
+        if parse_semaphore is not None:
+            await parse_semaphore.acquire()
+    else:
+        async with semaphore:
+            html = await fetch_offer(client, url, rate_limiter, validator_cache, latency_tracker, on_not_modified)
+            if parse_semaphore is not None:
+                await parse_semaphore.acquire()
+    try:
+        if html is None:
+            if validator_cache is not None:
+                return validator_cache.not_modified(url)
+            logger.info('html is none')
+            return None
+        loop = asyncio.get_running_loop()
+        if on_fetched is not None:
+            await loop.run_in_executor(None, on_fetched, url, html)
+        if parse_executor is None:
+            result = extract_info_from_response(html, url)
+        else:
+            result, path = await loop.run_in_executor(parse_executor, extract_info_with_path, html, url)
+            extraction_path_counts[path] += 1
+        if validator_cache is not None:
+            validator_cache.store(url, result)
+        return result
+    finally:
+        if parse_semaphore is not None:
+            parse_semaphore.release()
+
+
+async def fetch_offer(client: HttpBackendABC, url: str, rate_limiter: Optional[AdaptiveRateLimiter] = None,
+                      validator_cache: Optional[ValidatorCache] = None,
+                      latency_tracker: Optional[LatencyTracker] = None,
+                      on_not_modified: Optional[Callable[[str], bool]] = None) -> Optional[str]:
+    """
+    Fetches the HTML content of an offer, a page answered with 304 Not Modified is downloaded again
+    without validators if `on_not_modified` returns False, e.g. when it has no archived copy.
+
+    Args:
+        client (HttpBackendABC): The HTTP client to use for the request.
+        url (str): The URL to fetch.
+        rate_limiter (Optional[AdaptiveRateLimiter]): Rate limiter of requests per host.
+        validator_cache (Optional[ValidatorCache]): Cache of validators used for conditional requests.
+        latency_tracker (Optional[LatencyTracker]): Latencies of requests, if provided slow requests are hedged.
+        on_not_modified (Optional[Callable[[str], bool]]): Function called with the url of a not modified page.
+
+    Returns:
+        Optional[str]: The HTML content of the page, None if the page was not modified and the cached record is used.
+    """
+    html = await fetch(client, url, rate_limiter, validator_cache, latency_tracker)
+    if html is None and on_not_modified is not None:
+        if not await asyncio.get_running_loop().run_in_executor(None, on_not_modified, url):
+            html = await fetch(client, url, rate_limiter, None, latency_tracker)
+    return html
 
 
-async def fetch(session: aiohttp.ClientSession, url: str) -> str:
+async def fetch(client: HttpBackendABC, url: str, rate_limiter: Optional[AdaptiveRateLimiter] = None,
+                validator_cache: Optional[ValidatorCache] = None,
+                latency_tracker: Optional[LatencyTracker] = None) -> Optional[str]:
     """
-    Asynchronously fetches the HTML content of a given URL using aiohttp.
+    Asynchronously fetches the HTML content of a given URL.
 
     Args:
-        session (aiohttp.ClientSession): The HTTP session to use for the request.
+        client (HttpBackendABC): The HTTP client to use for the request.
         url (str): The URL to fetch.
+        rate_limiter (Optional[AdaptiveRateLimiter]): Rate limiter that is waited for before the request
+            and informed about the status of the response.
+        validator_cache (Optional[ValidatorCache]): Cache of validators, if provided the request is conditional
+            and validators of the response are remembered.
+        latency_tracker (Optional[LatencyTracker]): Latencies of requests, if provided a duplicate request is sent
+            when the response is slower than usual.
 
     Returns:
-        str: The HTML content of the page.
+        Optional[str]: The HTML content of the page, None if the page was not modified since it was cached.
 
     Raises:
         ValueError: If the request to the URL fails.
     """
-    async with session.get(url) as response:
-        if response.status == 200:
-            return await response.text()
-        else:
-            raise ValueError(f"Failed to fetch {url}: HTTP status {response.status}")
+    if rate_limiter is not None:
+        await rate_limiter.acquire(url)
+    headers = validator_cache.conditional_headers(url) if validator_cache is not None else None
+    if latency_tracker is None:
+        response = await client.get(url, headers=headers)
+    else:
+        response = await get_with_hedging(client, url, headers, latency_tracker, rate_limiter)
+    if rate_limiter is not None:
+        rate_limiter.report(url, response.status, response.headers.get('Retry-After'))
+    if response.status == 304 and validator_cache is not None:
+        return None
+    if response.status == 200:
+        if validator_cache is not None:
+            validator_cache.modified(url, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return response.text
+    else:
+        raise ValueError(f"Failed to fetch {url}: HTTP status {response.status}")
 
 
-async def main(urls: List[str]) -> List[Dict[str, Any]]:
+async def main(urls: List[str], max_concurrency: Optional[int] = None,
+               rate_limiter: Optional[AdaptiveRateLimiter] = None,
+               on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+               parse_executor: Optional[ProcessPoolExecutor] = None,
+               max_parse_queue: Optional[int] = None,
+               on_fetched: Optional[Callable[[str, str], None]] = None,
+               validator_cache: Optional[ValidatorCache] = None,
+               time_budget: Optional[float] = None,
+               latency_tracker: Optional[LatencyTracker] = None,
+               on_not_modified: Optional[Callable[[str], bool]] = None) -> List[Dict[str, Any]]:
     """
     Asynchronously scrapes real estate offers from a list of URLs.
 
     Args:
         urls (List[str]): A list of URLs to scrape.
+        max_concurrency (Optional[int]): Maximum number of requests in flight, unlimited if None.
+        rate_limiter (Optional[AdaptiveRateLimiter]): Rate limiter of requests per host.
+        on_result (Optional[Callable[[Dict[str, Any]], None]]): Function called with every result as soon as
+            it completes, in a separate thread, so that saving results doesn't block fetches in the event loop.
+            If provided, results are not collected in the returned list.
+        parse_executor (Optional[ProcessPoolExecutor]): Pool of processes parsing HTML,
+            if None HTML is parsed in the event loop.
+        max_parse_queue (Optional[int]): Maximum number of fetched pages waiting for parsing, unlimited if None.
+        on_fetched (Optional[Callable[[str, str], None]]): Function called with the url and HTML of every
+            fetched page, e.g. to archive it.
+        validator_cache (Optional[ValidatorCache]): Cache of validators used for conditional requests.
+        time_budget (Optional[float]): Time in seconds after which unfinished links are cancelled,
+            they stay unsaved and are scraped in the next run. Unlimited if None.
+        latency_tracker (Optional[LatencyTracker]): Latencies of requests, if provided slow requests are hedged.
+        on_not_modified (Optional[Callable[[str], bool]]): Function called with the url of every page answered with
+            304 Not Modified, if it returns False the page is downloaded again, e.g. to archive it.
 
     Returns:
         List[Dict[str, Any]]: A list of dictionaries containing extracted information from each URL.
     """
     results = []
-    async with aiohttp.ClientSession(headers=config.headers) as session:
-        tasks = [asyncio.create_task(scrape_real_estate_offer(session, url)) for url in urls]
-
-        for task in asyncio.as_completed(tasks):
-            try:
-                result = await task
-                results.append(result)
-            except Exception as e:
-                print(f"Error during scraping: {e}")
+    semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+    parse_semaphore = asyncio.Semaphore(max_parse_queue) if max_parse_queue else None
+    async with get_http_backend(max_connections=max_concurrency) as client:
+        tasks = [asyncio.create_task(scrape_real_estate_offer(client, url, semaphore, rate_limiter,
+                                                              parse_executor, parse_semaphore, on_fetched,
+                                                              validator_cache, latency_tracker, on_not_modified))
+                 for url in urls]
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + time_budget if time_budget is not None else None
+        pending = set(tasks)
+        # results are handed over in a single thread, so that flushes of the buffer don't block the event loop
+        # and stay serial
+        result_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='results') if on_result else None
+        try:
+            while pending:
+                timeout = max(0.0, deadline - loop.time()) if deadline is not None else None
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.info(f"Time budget of {time_budget} s exceeded, {len(pending)} links left for the next run")
+                    for task in pending:
+                        task.cancel()
+                    await asyncio.gather(*pending, return_exceptions=True)
+                    break
+                for task in done:
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        logger.info(f"Error during scraping: {e}")
+                        continue
+                    if on_result is not None:
+                        await loop.run_in_executor(result_executor, on_result, result)
+                    else:
+                        results.append(result)
+        finally:
+            if result_executor is not None:
+                result_executor.shutdown(wait=True)
     return results
 
 
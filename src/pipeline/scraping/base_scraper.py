@@ -1,10 +1,19 @@
 import pandas as pd
-from typing import List
-import sqlite3
+from typing import List, Dict, Any, Optional, Set, Tuple
+from datetime import datetime
+import time
+from src.db.connection import get_connection
+from src.db.offer_keys import fill_offer_keys
+from src.db.sql_code import failed_links_insert, pending_links_select, seen_links_scraped_upsert, survey_links_count
 from src.utils.exceptions import AllLinksProcessedException, EmptySurveyException
 from src.utils.setting_logger import Logger
+from src.utils.get_config import config
+from src.utils.links import normalize_link, offer_url
 
 from src.pipeline.pipeline_step_abc import PipelineStepABC
+from src.pipeline.scraping.html_archive import HtmlArchive
+from src.pipeline.scraping.validator_cache import ValidatorCache
+from src.pipeline.scraping.work_queue import SqliteWorkQueue, get_worker_id
 
 logger = Logger(__name__).get_logger()
 
@@ -20,37 +29,57 @@ class BaseScraper(PipelineStepABC):
         links (List[str]): List of links to be processed.
         output_table (str): Name of the output table in the database.
         query (str): SQL query to retrieve relevant links for scraping.
+        archive (Optional[HtmlArchive]): Archive of fetched pages, None if archiving is disabled.
+        validator_cache (Optional[ValidatorCache]): Cache of HTTP validators and extracted records used for
+            conditional requests, None if disabled.
+        time_budget (Optional[float]): Time in seconds after which scraping stops, links left are scraped
+            in the next run. Unlimited if None.
 
     Methods:
         load_previous_step_data(): Loads data from the previous step, checks for validity, and prepares links.
         execute_step(): Placeholder for executing the scraping step.
         process(): Placeholder for the process implementation.
+        upload_batch(results): Uploads a batch of scraped offers to the database.
+        archive_html(link, html): Saves fetched page to the archive.
+        archive_not_modified(link): Archives the previous copy of a page answered with 304 Not Modified.
+        save_failed_links(failures): Saves links that exhausted their retries to the failed_links table.
+        drain_work_queue(): Processes links claimed in batches from the work queue shared with other workers.
+        start_time_budget(): Starts counting the time budget of the run.
+        remaining_budget(): Returns time left of the time budget.
     """
 
     def __init__(self, db: str, survey_id: str):
         super().__init__(db, survey_id)
         self.links = []
         self.output_table = "scraped_offers"
-        # this query returns links in the current survey, that have not yet been processed. If a given link is in the scraped_offers for this survey, it won't be returned
-        self.query = f"""
-        with temp_links as (select survey_id, link, 'https://www.otodom.pl/' || link link_new from survey_links)
-        select survey_id, link, link_new from temp_links
-        where (survey_id ='{self.survey_id}') and (link_new not in (select link from scraped_offers where survey_id ='{self.survey_id}'));
-        """
+        # an offer saved by another worker of the work queue in the meantime keeps the first result
+        self.on_conflict = 'nothing'
+        self.archive: Optional[HtmlArchive] = None
+        if config.archive_html:
+            self.archive = HtmlArchive(config.html_archive_dir, config.html_archive_compression_level)
+        self.validator_cache: Optional[ValidatorCache] = None
+        if config.use_validator_cache:
+            self.validator_cache = ValidatorCache(db, self.writer, survey_id)
+        self.time_budget: Optional[float] = config.scraping_time_budget
+        self._deadline: Optional[float] = None
+        # normalized links saved by upload_batch while a batch of the work queue is processed
+        self._saved_links: Optional[Set[str]] = None
+        # this query returns links in the current survey, that have not yet been processed. If a given offer is in the scraped_offers for this survey, it won't be returned
+        self.query = pending_links_select
 
     def load_previous_step_data(self):
         """
         Loads links from the database, performs validity checks, and prepares the list of links for processing.
         """
+        with get_connection(self.db) as conn:
+            fill_offer_keys(conn, 'survey_links', self.survey_id)
+            fill_offer_keys(conn, 'scraped_offers', self.survey_id)
         super().load_previous_step_data()
 
         # Validity checks
-        with sqlite3.connect(self.db) as conn:
-            of_cnt = pd.read_sql_query(f"select count(*) of_cnt from scraped_offers where survey_id = '{self.survey_id}'", conn)
-            l_cnt = pd.read_sql_query(f"select count(*) l_cnt from survey_links where survey_id = '{self.survey_id}'", conn)
-        of_cnt = of_cnt['of_cnt'].iloc[0]
-        l_cnt = l_cnt['l_cnt'].iloc[0]
-        left_to_process = l_cnt - of_cnt
+        with get_connection(self.db) as conn:
+            l_cnt = conn.execute(survey_links_count, self.query_params).fetchone()[0]
+        left_to_process = len(self.df)
         logger.info(f"{left_to_process}/{l_cnt} links left to process in survey {self.survey_id}")
         if l_cnt == 0:
             raise EmptySurveyException(f"Survey {self.survey_id} has no corresponding links in the links table")
@@ -59,7 +88,147 @@ class BaseScraper(PipelineStepABC):
 
         # Loading links to list
         self.links = self.df['link'].to_list()
-        self.links = [f'https://www.otodom.pl/{link}' for link in self.links]
+        self.links = [offer_url(link) for link in self.links]
+        if self.validator_cache is not None:
+            self.validator_cache.load(self.links)
+
+    def upload_batch(self, results: List[Dict[str, Any]]) -> None:
+        """
+        Uploads a batch of scraped offers to the database, together with validators of the fetched pages.
+        Links of the offers are marked as scraped in seen_links.
+
+        Args:
+            results (List[Dict[str, Any]]): Information extracted from the offers.
+        """
+        self.df_out = pd.DataFrame(results)
+        self.upload_results_to_db()
+        seen_at = datetime.now().strftime('%Y-%m-%d')
+        seen_links = [{'link': normalize_link(result['link']), 'seen_at': seen_at}
+                      for result in results if result.get('link')]
+        if self._saved_links is not None:
+            self._saved_links.update(seen_link['link'] for seen_link in seen_links)
+        if self.writer is not None:
+            self.writer.execute_many(seen_links_scraped_upsert, seen_links)
+        else:
+            with get_connection(self.db) as conn:
+                conn.executemany(seen_links_scraped_upsert, seen_links)
+        if self.validator_cache is not None:
+            self.validator_cache.flush()
+
+    def archive_html(self, link: str, html: str) -> None:
+        """
+        Saves fetched page to the archive, if archiving is enabled. Failures are logged and ignored,
+        so that archiving never stops scraping.
+
+        Args:
+            link (str): Link of the offer.
+            html (str): HTML content of the page.
+        """
+        if self.archive is None:
+            return
+        try:
+            self.archive.save(self.survey_id, link, html)
+        except OSError as e:
+            logger.warning(f"Failed to archive {link}: {e}")
+
+    def archive_not_modified(self, link: str) -> bool:
+        """
+        Archives a page the server answered with 304 Not Modified, by copying it from the survey
+        the cached validators were saved in. If no copy is available the page has to be downloaded again, otherwise replay of the survey would miss it.
+
+        Args:
+            link (str): Link of the offer.
+
+        Returns:
+            bool: True if the page is archived in the survey or archiving is disabled.
+        """
+        if self.archive is None:
+            return True
+        previous_survey_id = self.validator_cache.downloaded_in(link) if self.validator_cache is not None else None
+        if previous_survey_id is None:
+            return False
+        try:
+            return self.archive.copy_previous(self.survey_id, link, previous_survey_id)
+        except OSError as e:
+            logger.warning(f"Failed to archive not modified {link}: {e}")
+            return False
+
+    def save_failed_links(self, failures: List[Tuple[str, Optional[int], str, int]]) -> None:
+        """
+        Saves links that exhausted their retries to the failed_links table, so they can be inspected
+        or scraped again later.
+
+        Args:
+            failures (List[Tuple[str, Optional[int], str, int]]): Link, HTTP status code (None if no response
+                was received), error message and number of attempts of every failed link.
+        """
+        if not failures:
+            return
+        failed_at = datetime.now().isoformat()
+        rows = [(self.survey_id, link, status_code, error, attempts, failed_at)
+                for link, status_code, error, attempts in failures]
+        if self.writer is not None:
+            self.writer.execute_many(failed_links_insert, rows)
+        else:
+            with get_connection(self.db) as conn:
+                conn.executemany(failed_links_insert, rows)
+        logger.info(f"{len(failures)} links failed after all retries, saved to failed_links table")
+
+    def drain_work_queue(self):
+        """
+        Processes links of the survey claimed in batches from the work queue, until the queue is empty.
+
+        Many scraper processes, also on different hosts sharing the database, can drain the same survey at once.
+        Leases of claimed links are renewed while they are processed, links of a worker that stopped
+        are claimed by others after `work_queue.lease_seconds`. Only links of saved offers are marked done,
+        the rest stays leased by the worker, so it is not claimed again in the same run,
+        and goes back to the queue when draining ends.
+        """
+        queue = SqliteWorkQueue(self.db, lease_seconds=config.work_queue.lease_seconds)
+        worker_id = get_worker_id()
+        queue.populate(self.survey_id)
+        while True:
+            if self.remaining_budget() == 0:
+                logger.info(f"Time budget of {self.time_budget} s exceeded, leaving the rest of the queue")
+                break
+            claimed = queue.claim(self.survey_id, worker_id, config.work_queue.batch_size)
+            if not claimed:
+                break
+            self.links = [offer_url(link) for link in claimed]
+            if self.validator_cache is not None:
+                self.validator_cache.load(self.links)
+            self._saved_links = set()
+            try:
+                with queue.keep_alive(self.survey_id, worker_id):
+                    self.process()
+            except BaseException:
+                queue.release(self.survey_id, worker_id)
+                raise
+            self.wait_for_writes()
+            queue.mark_done(self.survey_id, [link for link in claimed if normalize_link(link) in self._saved_links])
+            if self.remaining_budget() == 0:
+                break
+        # links that failed, returned nothing or were not reached before the budget ran out go back to the queue
+        queue.release(self.survey_id, worker_id)
+        self._saved_links = None
+        logger.info(f"Work queue drained, {queue.remaining(self.survey_id)} links of survey {self.survey_id} "
+                    f"still processed by other workers")
+
+    def start_time_budget(self) -> None:
+        """Starts counting the time budget of the run, if `scraping_time_budget` is set."""
+        if self.time_budget is not None:
+            self._deadline = time.monotonic() + self.time_budget
+
+    def remaining_budget(self) -> Optional[float]:
+        """
+        Returns time left of the time budget.
+
+        Returns:
+            Optional[float]: Time in seconds, 0 if the budget is exceeded, None if there is no budget.
+        """
+        if self._deadline is None:
+            return None
+        return max(0.0, self._deadline - time.monotonic())
 
     def execute_step(self):
         pass
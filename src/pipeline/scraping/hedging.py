@@ -0,0 +1,130 @@
+"""
+Hedged requests, a duplicate of a request slower than usual is sent and the first response wins.
+
+A few hanging connections dominate the wall-clock time of a run, hedging after the p95 latency
+bounds the tail at the cost of about 5% more requests.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from box import Box
+
+from src.pipeline.scraping.http_backends import HttpBackendABC, HttpResponse
+from src.pipeline.scraping.rate_limiting import AdaptiveRateLimiter
+from src.utils.setting_logger import Logger
+
+logger = Logger(__name__).get_logger()
+
+
+class LatencyTracker:
+    """
+    Sliding window of latencies of successful requests, used to choose the delay of hedged requests.
+
+    Attributes:
+        quantile (float): Quantile of latencies after which a hedged request is sent.
+        min_samples (int): Number of latencies needed before hedging starts.
+        min_delay (float): Minimum delay of a hedged request in seconds.
+        latencies (Deque[float]): Latencies of the most recent requests in seconds.
+        n_hedged (int): Number of hedged requests sent.
+        n_hedge_wins (int): Number of hedged requests that responded first.
+
+    Methods:
+        from_config(params): Creates the tracker from config parameters.
+        record(latency): Adds latency of a successful request.
+        hedge_delay(): Returns time after which a hedged request should be sent.
+    """
+    def __init__(self, quantile: float = 0.95, min_samples: int = 20, min_delay: float = 0.5, window: int = 500):
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.n_hedged: int = 0
+        self.n_hedge_wins: int = 0
+
+    @classmethod
+    def from_config(cls, params: Box) -> "LatencyTracker":
+        """
+        Creates the tracker from config parameters.
+
+        Args:
+            params (Box): Parameters with keys quantile, min_samples, min_delay and window.
+
+        Returns:
+            LatencyTracker: Configured tracker.
+        """
+        return cls(quantile=params.quantile, min_samples=params.min_samples, min_delay=params.min_delay,
+                   window=params.window)
+
+    def record(self, latency: float) -> None:
+        """
+        Adds latency of a successful request.
+
+        Args:
+            latency (float): Latency in seconds.
+        """
+        self.latencies.append(latency)
+
+    def hedge_delay(self) -> Optional[float]:
+        """
+        Returns time after which a hedged request should be sent.
+
+        Returns:
+            Optional[float]: Delay in seconds, None if there are not enough latencies recorded yet.
+        """
+        if len(self.latencies) < self.min_samples:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(self.quantile * len(ordered)))
+        return max(self.min_delay, ordered[index])
+
+
+async def get_with_hedging(client: HttpBackendABC, url: str, headers: Optional[Dict[str, str]],
+                           latency_tracker: LatencyTracker,
+                           rate_limiter: Optional[AdaptiveRateLimiter] = None) -> HttpResponse:
+    """
+    Sends a GET request, if it doesn't respond within the hedge delay, a duplicate is sent
+    and the first successful response wins. The other request is cancelled.
+
+    Args:
+        client (HttpBackendABC): The HTTP client to use for the requests.
+        url (str): The URL to fetch.
+        headers (Optional[Dict[str, str]]): Headers of the request.
+        latency_tracker (LatencyTracker): Latencies of previous requests, updated with the winning one.
+        rate_limiter (Optional[AdaptiveRateLimiter]): Rate limiter waited for before the hedged request.
+
+    Returns:
+        HttpResponse: The first successful response.
+
+    Raises:
+        Exception: Exception of the last failed request, if both failed.
+    """
+    start = time.monotonic()
+    delay = latency_tracker.hedge_delay()
+    primary = asyncio.ensure_future(client.get(url, headers=headers))
+    tasks = {primary}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            if rate_limiter is not None:
+                await rate_limiter.acquire(url)
+            tasks.add(asyncio.ensure_future(client.get(url, headers=headers)))
+            latency_tracker.n_hedged += 1
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = task.exception()
+                    continue
+                if task is not primary:
+                    latency_tracker.n_hedge_wins += 1
+                latency_tracker.record(time.monotonic() - start)
+                return task.result()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
@@ -0,0 +1,124 @@
+"""
+Local archive of raw HTML of scraped offers, allows re-parsing a survey without downloading it again
+"""
+import gzip
+import hashlib
+import os
+import shutil
+from pathlib import Path
+from typing import Optional, Union
+
+from src.utils.setting_logger import Logger
+
+logger = Logger(__name__).get_logger()
+
+
+class HtmlArchive:
+    """
+    Gzip compressed store of fetched pages keyed by survey id and link.
+
+    Every page is saved in a separate file, named with the hash of the link and sharded into subdirectories
+    by the first two characters of the hash, so that no directory grows too large:
+    `<root>/<survey_id>/<hash[:2]>/<hash>.html.gz`.
+
+    Attributes:
+        root (Path): Directory of the archive.
+        compression_level (int): Gzip compression level, 1 (fastest) to 9 (smallest).
+
+    Methods:
+        get_path(survey_id, link): Returns the path of the archived page.
+        save(survey_id, link, html): Saves the page to the archive.
+        load(survey_id, link): Loads the page from the archive.
+        exists(survey_id, link): Checks if the page is archived.
+        copy_previous(survey_id, link, previous_survey_id): Copies the page archived in another survey.
+    """
+    def __init__(self, root: Union[str, Path], compression_level: int = 6):
+        self.root = Path(root)
+        self.compression_level = compression_level
+
+    def get_path(self, survey_id: str, link: str) -> Path:
+        """
+        Returns the path of the archived page.
+
+        Args:
+            survey_id (str): ID of the survey.
+            link (str): Link of the offer.
+
+        Returns:
+            Path: Path of the compressed page.
+        """
+        key = hashlib.sha1(link.encode('utf-8')).hexdigest()
+        return self.root / survey_id / key[:2] / f"{key}.html.gz"
+
+    def save(self, survey_id: str, link: str, html: str) -> None:
+        """
+        Saves the page to the archive, overwriting previous version. The file is replaced atomically,
+        so an interrupted write never leaves a corrupted page.
+
+        Args:
+            survey_id (str): ID of the survey.
+            link (str): Link of the offer.
+            html (str): HTML content of the page.
+        """
+        path = self.get_path(survey_id, link)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=self.compression_level) as file:
+            file.write(html)
+        os.replace(tmp_path, path)
+
+    def load(self, survey_id: str, link: str) -> Optional[str]:
+        """
+        Loads the page from the archive.
+
+        Args:
+            survey_id (str): ID of the survey.
+            link (str): Link of the offer.
+
+        Returns:
+            Optional[str]: HTML content of the page, or None if it is not archived.
+        """
+        path = self.get_path(survey_id, link)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def exists(self, survey_id: str, link: str) -> bool:
+        """
+        Checks if the page is archived.
+
+        Args:
+            survey_id (str): ID of the survey.
+            link (str): Link of the offer.
+
+        Returns:
+            bool: True if the page is in the archive.
+        """
+        return self.get_path(survey_id, link).is_file()
+
+    def copy_previous(self, survey_id: str, link: str, previous_survey_id: str) -> bool:
+        """
+        Copies the page archived in a previous survey to the survey. Used when the server answers
+        304 Not Modified, so that the page can still be replayed from the survey.
+
+        Args:
+            survey_id (str): ID of the survey.
+            link (str): Link of the offer.
+            previous_survey_id (str): ID of the survey the page was downloaded in.
+
+        Returns:
+            bool: True if the page is archived in the survey afterwards, False if the previous survey doesn't have it.
+        """
+        path = self.get_path(survey_id, link)
+        if survey_id == previous_survey_id:
+            return path.is_file()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            shutil.copyfile(self.get_path(previous_survey_id, link), tmp_path)
+        except FileNotFoundError:
+            return False
+        os.replace(tmp_path, path)
+        return True
@@ -0,0 +1,195 @@
+"""
+HTTP clients used for asynchronous fetching, selected with `http_backend` in the config.
+
+'aiohttp' speaks HTTP/1.1 and opens a connection per request in flight, 'httpx' negotiates HTTP/2
+with servers supporting it and multiplexes many requests over a few connections to the same host.
+"""
+import asyncio
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, Mapping, Optional
+
+import aiohttp
+import httpx
+
+from src.utils.get_config import config
+
+
+@dataclass
+class Timeouts:
+    """
+    Timeouts of a request in seconds, None disables the timeout.
+
+    Attributes:
+        connect (Optional[float]): Time to establish a connection.
+        read (Optional[float]): Time between two chunks of the response.
+        total (Optional[float]): Time of the whole request, including reading the body.
+    """
+    connect: Optional[float] = None
+    read: Optional[float] = None
+    total: Optional[float] = None
+
+    @classmethod
+    def from_config(cls, params: Mapping[str, Optional[float]]) -> "Timeouts":
+        """Creates timeouts from config parameters with keys connect, read and total."""
+        return cls(connect=params.get('connect'), read=params.get('read'), total=params.get('total'))
+
+
+@dataclass
+class HttpResponse:
+    """Response of the HTTP backend, body is read as text."""
+    status: int
+    headers: Mapping[str, str]
+    text: str
+
+
+class HttpBackendABC(ABC):
+    """
+    Abstract asynchronous HTTP client, used as an async context manager that owns the connection pool.
+
+    Attributes:
+        headers (Dict[str, str]): Headers sent with every request.
+        max_connections (Optional[int]): Maximum number of open connections, unlimited if None.
+        timeouts (Timeouts): Timeouts of every request, exceeding them raises asyncio.TimeoutError.
+
+    Methods:
+        get(url, headers): Sends a GET request.
+        get_status(url, method): Sends a request and returns status and headers without reading the body.
+    """
+    def __init__(self, headers: Optional[Dict[str, str]] = None, max_connections: Optional[int] = None,
+                 timeouts: Optional[Timeouts] = None):
+        self.headers = dict(headers or {})
+        self.max_connections = max_connections
+        self.timeouts = timeouts or Timeouts()
+
+    @abstractmethod
+    async def __aenter__(self) -> "HttpBackendABC":
+        pass
+
+    @abstractmethod
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        pass
+
+    @abstractmethod
+    async def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> HttpResponse:
+        """
+        Sends a GET request, redirects are followed.
+
+        Args:
+            url (str): The URL to fetch.
+            headers (Optional[Dict[str, str]]): Headers added to the default ones for this request.
+
+        Returns:
+            HttpResponse: Status, headers and body of the response.
+        """
+        pass
+
+    @abstractmethod
+    async def get_status(self, url: str, method: str = 'HEAD') -> HttpResponse:
+        """
+        Sends a request without following redirects, the connection is closed before the body is read.
+        GET requests are aborted after the headers, for servers not supporting HEAD.
+
+        Args:
+            url (str): The URL to check.
+            method (str): 'HEAD' or 'GET'.
+
+        Returns:
+            HttpResponse: Status and headers of the response, text is empty.
+        """
+        pass
+
+
+class AiohttpBackend(HttpBackendABC):
+    """HTTP/1.1 backend using aiohttp.ClientSession."""
+    def __init__(self, headers: Optional[Dict[str, str]] = None, max_connections: Optional[int] = None,
+                 timeouts: Optional[Timeouts] = None):
+        super().__init__(headers, max_connections, timeouts)
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> "AiohttpBackend":
+        connector = aiohttp.TCPConnector(limit=self.max_connections or 0)
+        timeout = aiohttp.ClientTimeout(total=self.timeouts.total, sock_connect=self.timeouts.connect,
+                                        sock_read=self.timeouts.read)
+        self.session = aiohttp.ClientSession(headers=self.headers, connector=connector, timeout=timeout)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.session.close()
+
+    async def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> HttpResponse:
+        async with self.session.get(url, headers=headers) as response:
+            return HttpResponse(response.status, response.headers, await response.text())
+
+    async def get_status(self, url: str, method: str = 'HEAD') -> HttpResponse:
+        async with self.session.request(method, url, allow_redirects=False) as response:
+            if method != 'HEAD':
+                response.close()
+            return HttpResponse(response.status, response.headers, '')
+
+
+class HttpxBackend(HttpBackendABC):
+    """
+    Backend using httpx.AsyncClient, with HTTP/2 requests to the same host share a connection.
+    httpx has no total timeout, it is enforced around every request.
+
+    Attributes:
+        http2 (bool): If HTTP/2 is negotiated with servers supporting it.
+    """
+    def __init__(self, headers: Optional[Dict[str, str]] = None, max_connections: Optional[int] = None,
+                 timeouts: Optional[Timeouts] = None, http2: bool = True):
+        super().__init__(headers, max_connections, timeouts)
+        self.http2 = http2
+        self.client: Optional[httpx.AsyncClient] = None
+
+    async def __aenter__(self) -> "HttpxBackend":
+        limits = httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+        timeout = httpx.Timeout(None, connect=self.timeouts.connect, read=self.timeouts.read)
+        self.client = httpx.AsyncClient(headers=self.headers, http2=self.http2, limits=limits,
+                                        follow_redirects=True, timeout=timeout)
+        await self.client.__aenter__()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.client.__aexit__(exc_type, exc, tb)
+
+    async def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> HttpResponse:
+        try:
+            response = await asyncio.wait_for(self.client.get(url, headers=headers), self.timeouts.total)
+        except httpx.TimeoutException as e:
+            raise asyncio.TimeoutError(f"Request to {url} timed out") from e
+        return HttpResponse(response.status_code, response.headers, response.text)
+
+    async def get_status(self, url: str, method: str = 'HEAD') -> HttpResponse:
+        request = self.client.build_request(method, url)
+        try:
+            response = await asyncio.wait_for(self.client.send(request, stream=True, follow_redirects=False),
+                                              self.timeouts.total)
+        except httpx.TimeoutException as e:
+            raise asyncio.TimeoutError(f"Request to {url} timed out") from e
+        await response.aclose()
+        return HttpResponse(response.status_code, response.headers, '')
+
+
+def get_http_backend(name: Optional[str] = None, max_connections: Optional[int] = None) -> HttpBackendABC:
+    """
+    Creates the HTTP backend sending headers and using timeouts from the config.
+
+    Args:
+        name (Optional[str]): 'aiohttp' or 'httpx', if None `http_backend` from the config is used.
+        max_connections (Optional[int]): Maximum number of open connections, unlimited if None.
+
+    Returns:
+        HttpBackendABC: Backend to be used as an async context manager.
+
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    name = name or config.http_backend
+    timeouts = Timeouts.from_config(config.http_timeouts)
+    if name == 'aiohttp':
+        return AiohttpBackend(config.headers, max_connections, timeouts)
+    elif name == 'httpx':
+        return HttpxBackend(config.headers, max_connections, timeouts, http2=config.http2)
+    else:
+        raise ValueError(f"Unknown HTTP backend: {name}")
@@ -0,0 +1,190 @@
+"""
+Checking if listings scraped in previous surveys are still online, without scraping them again.
+
+Every listing is checked with a HEAD request (or a GET aborted after the headers) that does not follow redirects,
+so the check costs a small part of the bandwidth of a full scrape and no HTML parsing.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from src.db.connection import get_connection
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from src.db.sql_code import listing_status_active_links, listing_status_upsert
+from src.pipeline.pipeline_step_abc import PipelineStepABC
+from src.pipeline.scraping.http_backends import HttpBackendABC, get_http_backend
+from src.pipeline.scraping.rate_limiting import AdaptiveRateLimiter
+from src.pipeline.scraping.result_buffer import ResultBuffer
+from src.utils.exceptions import UserInterruptException
+from src.utils.get_config import config
+from src.utils.links import normalize_link, offer_id_from_link, offer_url
+from src.utils.setting_logger import Logger
+
+logger = Logger(__name__).get_logger()
+
+REMOVED_STATUSES = (404, 410)
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+HEAD_NOT_ALLOWED_STATUSES = (405, 501)
+
+
+def classify_status(link: str, status: int, location: Optional[str] = None) -> str:
+    """
+    Classifies liveness of a listing by the status of its response.
+    Removed listings are answered with 404/410 or redirected away from the offer, e.g. to search results.
+
+    Args:
+        link (str): The checked offer link.
+        status (int): HTTP status of the response.
+        location (Optional[str]): Location header of a redirect.
+
+    Returns:
+        str: 'active', 'removed' or 'error'.
+    """
+    if 200 <= status < 300:
+        return 'active'
+    if status in REMOVED_STATUSES:
+        return 'removed'
+    if status in REDIRECT_STATUSES:
+        if location and offer_id_from_link(location) == offer_id_from_link(link):
+            return 'active'
+        return 'removed'
+    return 'error'
+
+
+async def check_link(client: HttpBackendABC, url: str, method: str = 'HEAD',
+                     rate_limiter: Optional[AdaptiveRateLimiter] = None) -> Dict[str, Any]:
+    """
+    Checks liveness of a single listing, a server not allowing HEAD requests is asked again with GET.
+
+    Args:
+        client (HttpBackendABC): HTTP client.
+        url (str): URL of the offer.
+        method (str): 'HEAD' or 'GET'.
+        rate_limiter (Optional[AdaptiveRateLimiter]): Rate limiter of requests, None if requests are not limited.
+
+    Returns:
+        Dict[str, Any]: Normalized link, offer id, liveness status, HTTP status code and time of the check.
+    """
+    status_code = None
+    try:
+        for attempt_method in [method, 'GET'] if method == 'HEAD' else [method]:
+            if rate_limiter is not None:
+                await rate_limiter.acquire(url)
+            response = await client.get_status(url, attempt_method)
+            if rate_limiter is not None:
+                rate_limiter.report(url, response.status, response.headers.get('Retry-After'))
+            status_code = response.status
+            if status_code not in HEAD_NOT_ALLOWED_STATUSES:
+                break
+        status = classify_status(url, status_code, response.headers.get('Location'))
+    except Exception as e:
+        logger.info(f"Error during liveness check of {url}: {e}")
+        status = 'error'
+    return {'link': normalize_link(url), 'offer_id': offer_id_from_link(url), 'status': status,
+            'status_code': status_code, 'checked_at': datetime.now().isoformat(sep=' ', timespec='seconds')}
+
+
+async def check_links(urls: List[str], on_result: Callable[[Dict[str, Any]], None], max_concurrency: int = 50,
+                      method: str = 'HEAD', rate_limiter: Optional[AdaptiveRateLimiter] = None) -> None:
+    """
+    Checks liveness of listings in a bounded pool of concurrent requests. `max_concurrency` workers take
+    the next listing as soon as their check completes, so the number of pending coroutines doesn't grow
+    with the number of listings and a slow request doesn't hold up the others.
+
+    Args:
+        urls (List[str]): URLs of offers.
+        on_result (Callable[[Dict[str, Any]], None]): Called with the result of every check as it completes,
+            in a separate thread, so that saving results doesn't block checks in the event loop.
+        max_concurrency (int): Maximum number of requests in flight.
+        method (str): 'HEAD' or 'GET'.
+        rate_limiter (Optional[AdaptiveRateLimiter]): Rate limiter of requests, None if requests are not limited.
+    """
+    pending_urls = iter(urls)
+    loop = asyncio.get_running_loop()
+    # a single thread keeps flushes of the results serial
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='results') as result_executor:
+        async with get_http_backend(max_connections=max_concurrency) as client:
+
+            async def worker() -> None:
+                # workers share the iterator, the event loop runs one of them at a time
+                for url in pending_urls:
+                    result = await check_link(client, url, method, rate_limiter)
+                    await loop.run_in_executor(result_executor, on_result, result)
+
+            await asyncio.gather(*(worker() for _ in range(min(max_concurrency, len(urls)))))
+
+
+class ListingLivenessChecker(PipelineStepABC):
+    """
+    Pipeline step checking if scraped listings not known to be removed are still online.
+    Results are upserted to the listing_status table, removed_at keeps the first time a listing was found removed.
+
+    Attributes:
+        concurrency (int): Maximum number of requests in flight.
+        method (str): 'HEAD' or 'GET', GET requests are aborted after the headers.
+        rate_limit_params (Optional[Box]): Parameters of the adaptive rate limiter, None if requests are not limited.
+        flush_batch_size (int): Number of results saved to the database at once.
+        links (List[str]): URLs of listings to check.
+        status_counts (Dict[str, int]): Number of listings by liveness status.
+
+    Methods:
+        load_previous_step_data(): Loads listings scraped in previous surveys not known to be removed.
+        process(): Checks liveness of listings and saves results in batches.
+        upload_batch(batch): Upserts a batch of results to listing_status.
+        upload_results_to_db(): Results are saved during processing, logs the summary.
+    """
+    def __init__(self, db: str, survey_id: str):
+        super().__init__(db, survey_id)
+        self.output_table = 'listing_status'
+        self.query = listing_status_active_links
+        self.concurrency = config.liveness_check.concurrency
+        self.method = config.liveness_check.method
+        self.rate_limit_params = config.liveness_check.rate_limit
+        self.flush_batch_size = config.liveness_check.flush_batch_size
+        self.links: List[str] = []
+        self.status_counts: Dict[str, int] = {}
+
+    def load_previous_step_data(self):
+        """
+        Loads normalized links of scraped listings that are not known to be removed,
+        listings collected in the current survey are skipped.
+        """
+        super().load_previous_step_data()
+        self.links = [offer_url(link) for link in self.df['link']]
+
+    def process(self):
+        """Checks liveness of all listings, results are saved every `flush_batch_size` checks."""
+        rate_limiter = (AdaptiveRateLimiter.from_config(self.rate_limit_params)
+                        if self.rate_limit_params is not None else None)
+        result_buffer = ResultBuffer(self.upload_batch, self.flush_batch_size)
+        try:
+            asyncio.run(check_links(self.links, result_buffer.add, max_concurrency=self.concurrency,
+                                    method=self.method, rate_limiter=rate_limiter))
+        except KeyboardInterrupt:
+            logger.info("User interrupted the process. Exiting...")
+            raise UserInterruptException
+        finally:
+            result_buffer.flush()
+
+    def upload_batch(self, batch: List[Dict[str, Any]]) -> None:
+        """
+        Upserts results of liveness checks to listing_status.
+
+        Args:
+            batch (List[Dict[str, Any]]): Results of checks.
+        """
+        for result in batch:
+            self.status_counts[result['status']] = self.status_counts.get(result['status'], 0) + 1
+        params = [{**result, 'survey_id': self.survey_id} for result in batch]
+        if self.writer is not None:
+            self.writer.execute_many(listing_status_upsert, params)
+            return
+        with get_connection(self.db) as conn:
+            conn.executemany(listing_status_upsert, params)
+
+    def upload_results_to_db(self):
+        """Results are upserted in batches during processing, only the summary is logged."""
+        self.df_out = pd.DataFrame(list(self.status_counts.items()), columns=['status', 'n_listings'])
+        logger.info(f"Liveness of {str(len(self.links))} listings checked: {self.status_counts}")
@@ -0,0 +1,149 @@
+"""
+Single pass extraction of real estate offer details with lxml.
+
+The page is parsed once and all the elements holding offer details are collected in a single walk
+over the tree, instead of running a separate XPath query over the whole document for every field.
+"""
+from typing import Any, Dict, List, Optional
+
+import lxml.html
+from lxml.etree import _Element, ParserError
+
+# aria-label of the offer attribute region -> key in the result dict
+ATTRIBUTE_LABELS = {
+    'Powierzchnia': 'area',
+    'Forma własności': 'ownership_type',
+    'Stan wykończenia': 'state',
+    'Piętro': 'floor',
+    'Czynsz': 'rent',
+    'Obsługa zdalna': 'remote',
+    'Balkon / ogród / taras': 'balcony',
+    'Ogrzewanie': 'heating',
+    'Miejsce parkingowe': 'parking',
+    'Rynek': 'market',
+    'Typ ogłoszeniodawcy': 'offerent_type',
+    'Dostępne od': 'available_from',
+    'Rok budowy': 'year_built',
+    'Rodzaj zabudowy': 'building_type',
+    'Okna': 'windows',
+    'Winda': 'elevator',
+    'Media': 'media',
+    'Zabezpieczenia': 'safety',
+    'Wyposażenie': 'equipment',
+    'Informacje dodatkowe': 'additional_info',
+    'Materiał budynku': 'building_material',
+}
+SQ_M_PRICE_LABEL = 'Cena za metr kwadratowy'
+N_ROOMS_LABEL = 'Liczba pokoi'
+N_ROOMS_VALUE_CLASS = 'css-1wi2w6s enb64yk5'
+DESCRIPTION_CLASS = 'css-1wekrze e1lbnp621'
+ADDRESS_LABEL = 'Adres'
+TITLE_DATA_CY = 'adPageAdTitle'
+PRICE_DATA_CY = 'adPageHeaderPrice'
+
+_NON_TEXT_TAGS = ('style', 'script')
+
+
+def extract_info_with_lxml(html: str, url: str) -> Dict[str, Any]:
+    """
+    Extracts information from the HTML response of a real estate listing parsing it only once.
+
+    Produces the same dictionary as the legacy Selector + BeautifulSoup extractor.
+
+    Args:
+        html (str): The HTML content of the webpage.
+        url (str): The URL of the webpage.
+
+    Returns:
+        Dict[str, Any]: A dictionary containing extracted information.
+
+    Raises:
+        ValueError: If the HTML content is not provided or is not a string.
+    """
+    if not html or not isinstance(html, str):
+        raise ValueError(f"No HTML content to parse for link: {url}")
+    try:
+        root = lxml.html.fromstring(html)
+    except ParserError:
+        # document without any elements, e.g. whitespace only
+        root = lxml.html.fromstring('<html></html>')
+
+    labelled_divs: Dict[str, List[_Element]] = {}
+    title = price = address = description_div = None
+    for el in root.iter('div', 'h1', 'strong', 'a'):
+        if el.tag == 'div':
+            label = el.get('aria-label')
+            if label is not None:
+                labelled_divs.setdefault(label, []).append(el)
+            if description_div is None and el.get('class') == DESCRIPTION_CLASS:
+                description_div = el
+        elif el.tag == 'h1' and title is None and el.get('data-cy') == TITLE_DATA_CY:
+            title = _first_text(el)
+        elif el.tag == 'strong' and price is None and el.get('data-cy') == PRICE_DATA_CY:
+            price = _first_text(el)
+        elif el.tag == 'a' and address is None and el.get('aria-label') == ADDRESS_LABEL:
+            address = _first_text(el)
+
+    result = {'link': url, 'title': title, 'price': price, 'adress': address,
+              'sq_m_price': _first_value(labelled_divs.get(SQ_M_PRICE_LABEL, []), _first_text)}
+    for label, key in ATTRIBUTE_LABELS.items():
+        result[key] = _first_value(labelled_divs.get(label, []), _region_value)
+    result['n_rooms'] = _n_rooms(labelled_divs.get(N_ROOMS_LABEL, []))
+    result['description'] = _all_text(description_div) if description_div is not None else None
+    return result
+
+
+def _first_value(elements: List[_Element], getter) -> Optional[str]:
+    """Returns the first not None value returned by getter for the elements, in document order."""
+    for el in elements:
+        value = getter(el)
+        if value is not None:
+            return value
+    return None
+
+
+def _first_text(el: _Element) -> Optional[str]:
+    """Returns the first text node that is a direct child of the element, same as `text()` XPath."""
+    if el.text is not None:
+        return el.text
+    for child in el:
+        if child.tail is not None:
+            return child.tail
+    return None
+
+
+def _region_value(el: _Element) -> Optional[str]:
+    """Returns the value of an attribute region, same as `div[2]/div[1]/text()` XPath."""
+    value_divs = [child for child in el if child.tag == 'div']
+    if len(value_divs) < 2:
+        return None
+    for child in value_divs[1]:
+        if child.tag == 'div':
+            return _first_text(child)
+    return None
+
+
+def _n_rooms(elements: List[_Element]) -> Optional[str]:
+    """Returns the number of rooms from the first region labelled with number of rooms."""
+    if not elements:
+        return None
+    for el in elements[0].iter('div'):
+        if el is not elements[0] and el.get('class') == N_ROOMS_VALUE_CLASS:
+            return ''.join(text.strip() for text in _iter_text(el))
+    return None
+
+
+def _all_text(el: _Element) -> str:
+    """Returns concatenated text of the element and its descendants, skipping styles and scripts."""
+    return ''.join(_iter_text(el))
+
+
+def _iter_text(el: _Element):
+    """Yields text nodes of the element in document order, skipping contents of styles and scripts."""
+    if el.tag not in _NON_TEXT_TAGS and isinstance(el.tag, str) and el.text:
+        yield el.text
+    for child in el:
+        if isinstance(child.tag, str):
+            yield from _iter_text(child)
+        if child.tail:
+            yield child.tail
@@ -0,0 +1,205 @@
+"""
+Extraction of real estate offer details from the structured JSON state embedded in the listing page.
+
+Otodom pages embed the whole advert in `__NEXT_DATA__` script, reading it with `json.loads` is much cheaper
+than querying the rendered HTML and numeric fields come already typed.
+"""
+import json
+from typing import Any, Dict, List, Optional
+
+import lxml.html
+from lxml.etree import ParserError
+
+NEXT_DATA_MARKER = '<script id="__NEXT_DATA__"'
+NO_INFORMATION = 'brak informacji'
+
+# key of the characteristic -> key in the result dict, values are taken as displayed on the page
+LOCALIZED_CHARACTERISTICS = {
+    'building_ownership': 'ownership_type',
+    'construction_status': 'state',
+    'heating': 'heating',
+    'market': 'market',
+    'build_year': 'year_built',
+    'building_type': 'building_type',
+    'windows_type': 'windows',
+    'building_material': 'building_material',
+}
+# key of the characteristic -> key in the result dict, values are converted to numbers
+NUMERIC_CHARACTERISTICS = {
+    'price': 'price',
+    'price_per_m': 'sq_m_price',
+    'm': 'area',
+    'rent': 'rent',
+}
+ADVERTISER_TYPES = {
+    'private': 'prywatny',
+    'agency': 'biuro nieruchomości',
+    'developer': 'deweloper',
+}
+YES_NO_VALUES = {'y': 'tak', 'n': 'nie'}
+# labels of feature groups -> key in the result dict
+FEATURE_GROUPS = {
+    'Media': 'media',
+    'Zabezpieczenia': 'safety',
+    'Wyposażenie': 'equipment',
+}
+EXTRAS_GROUP = 'Informacje dodatkowe'
+BALCONY_EXTRAS = ('balkon', 'ogródek', 'taras')
+PARKING_EXTRA = 'garaż/miejsce parkingowe'
+ELEVATOR_EXTRA = 'winda'
+
+
+def extract_info_from_payload(html: str, url: str) -> Optional[Dict[str, Any]]:
+    """
+    Extracts information about an active real estate listing from the JSON state embedded in the page.
+
+    Fills the same keys as the HTML extractors, numeric fields (price, sq_m_price, area, rent, n_rooms)
+    are returned as numbers.
+
+    Args:
+        html (str): The HTML content of the webpage.
+        url (str): The URL of the webpage.
+
+    Returns:
+        Optional[Dict[str, Any]]: A dictionary containing extracted information, or None if the page has
+            no payload or the advert in it is not active.
+
+    Raises:
+        ValueError: If the HTML content is not provided or is not a string.
+    """
+    if not html or not isinstance(html, str):
+        raise ValueError(f"No HTML content to parse for link: {url}")
+    ad = get_ad_from_payload(html)
+    if ad is None or ad.get('status') != 'active':
+        return None
+
+    characteristics = {item['key']: item for item in ad.get('characteristics') or []}
+    additional_info = {item['label']: item['values'] for item in ad.get('additionalInformation') or []}
+    features = {item['label']: item['values'] for item in ad.get('featuresByCategory') or []}
+    extras = features.get(EXTRAS_GROUP, [])
+
+    result = {'link': url, 'title': ad.get('title'), 'adress': _get_address(ad.get('location'))}
+    for key, result_key in NUMERIC_CHARACTERISTICS.items():
+        result[result_key] = _to_number(characteristics.get(key, {}).get('value'))
+    rooms = _to_number(characteristics.get('rooms_num', {}).get('value'))
+    result['n_rooms'] = int(rooms) if rooms is not None else None
+    for key, result_key in LOCALIZED_CHARACTERISTICS.items():
+        result[result_key] = characteristics.get(key, {}).get('localizedValue')
+
+    result['floor'] = _get_floor(characteristics)
+    result['remote'] = 'tak' if characteristics.get('remote_services', {}).get('value') == '1' else None
+    result['offerent_type'] = ADVERTISER_TYPES.get(ad.get('advertiserType'))
+    result['available_from'] = _get_available_from(additional_info)
+    result['elevator'] = _get_yes_no(additional_info.get('lift'))
+
+    result['balcony'] = _join([extra for extra in extras if extra in BALCONY_EXTRAS])
+    result['parking'] = PARKING_EXTRA if PARKING_EXTRA in extras else None
+    result['additional_info'] = _join([extra for extra in extras
+                                       if extra not in BALCONY_EXTRAS + (PARKING_EXTRA, ELEVATOR_EXTRA)])
+    for label, result_key in FEATURE_GROUPS.items():
+        result[result_key] = _join(features.get(label, []))
+
+    result['description'] = _html_to_text(ad.get('description'))
+    return result
+
+
+def load_next_data(html: str) -> Optional[Dict[str, Any]]:
+    """
+    Finds the `__NEXT_DATA__` script in the page without parsing the HTML and loads its JSON state.
+
+    Args:
+        html (str): The HTML content of the webpage.
+
+    Returns:
+        Optional[Dict[str, Any]]: The page state, or None if the page has no valid payload.
+    """
+    start = html.find(NEXT_DATA_MARKER)
+    if start == -1:
+        return None
+    start = html.find('>', start) + 1
+    end = html.find('</script>', start)
+    if start == 0 or end == -1:
+        return None
+    try:
+        payload = json.loads(html[start:end])
+    except json.JSONDecodeError:
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+def get_ad_from_payload(html: str) -> Optional[Dict[str, Any]]:
+    """
+    Returns the advert from the `__NEXT_DATA__` state of the page.
+
+    Args:
+        html (str): The HTML content of the webpage.
+
+    Returns:
+        Optional[Dict[str, Any]]: The advert, or None if the page has no valid payload.
+    """
+    payload = load_next_data(html)
+    if payload is None:
+        return None
+    ad = payload.get('props', {}).get('pageProps', {}).get('ad')
+    return ad if isinstance(ad, dict) else None
+
+
+def _to_number(value: Optional[str]) -> Optional[float]:
+    """Converts a numeric value from the payload to float."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _get_address(location: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Builds the address as displayed on the page: street followed by the most detailed location."""
+    if not location:
+        return None
+    parts = []
+    street = (location.get('address') or {}).get('street')
+    if street and street.get('name'):
+        parts.append(f"{street['name']} {street['number']}" if street.get('number') else street['name'])
+    locations = (location.get('reverseGeocoding') or {}).get('locations') or []
+    if locations:
+        parts.extend(locations[-1].get('fullNameItems') or [])
+    return ', '.join(parts) if parts else None
+
+
+def _get_floor(characteristics: Dict[str, Dict[str, Any]]) -> Optional[str]:
+    """Builds floor as displayed on the page, e.g. '3/5' or 'parter/4'."""
+    floor = characteristics.get('floor_no', {}).get('localizedValue')
+    floors_num = characteristics.get('building_floors_num', {}).get('localizedValue')
+    if floor is None:
+        return None
+    return f"{floor}/{floors_num}" if floors_num else floor
+
+
+def _get_available_from(additional_info: Dict[str, List[str]]) -> Optional[str]:
+    """Returns date from which the apartment is available."""
+    if 'free_from' not in additional_info:
+        return None
+    values = additional_info['free_from']
+    return values[0] if values else NO_INFORMATION
+
+
+def _get_yes_no(values: Optional[List[str]]) -> Optional[str]:
+    """Translates yes/no values of additional information, e.g. '::y' to 'tak'."""
+    if not values:
+        return None
+    return YES_NO_VALUES.get(values[0].split('::')[-1])
+
+
+def _join(values: List[str]) -> Optional[str]:
+    """Joins values of a feature group as displayed on the page."""
+    return ', '.join(values) if values else None
+
+
+def _html_to_text(description: Optional[str]) -> Optional[str]:
+    """Converts the HTML description from the payload to text."""
+    if not description:
+        return None
+    try:
+        return lxml.html.fromstring(description).text_content()
+    except ParserError:
+        return None
@@ -0,0 +1,158 @@
+"""
+Rate limiting for asynchronous scraping - per host token buckets that adapt to responses of the server
+"""
+import asyncio
+import time
+from typing import Dict, Iterable, Optional
+from urllib.parse import urlparse
+
+from box import Box
+
+from src.utils.setting_logger import Logger
+
+logger = Logger(__name__).get_logger()
+
+
+class TokenBucket:
+    """
+    Token bucket limiting the rate of requests sent to a single host.
+
+    Tokens are refilled continuously at `rate` tokens per second, up to `capacity`. Every request consumes
+    one token, if the bucket is empty the caller waits until the next token is available.
+
+    Attributes:
+        rate (float): Current refill rate in tokens (requests) per second.
+        capacity (float): Maximum number of tokens kept in the bucket (allowed burst).
+        tokens (float): Number of tokens currently available.
+        updated_at (float): Monotonic time of the last refill.
+        blocked_until (float): Monotonic time before which no tokens are handed out (cooldown after backoff).
+    """
+    def __init__(self, rate: float, capacity: float):
+        self.rate: float = rate
+        self.capacity: float = capacity
+        self.tokens: float = capacity
+        self.updated_at: float = time.monotonic()
+        self.blocked_until: float = 0.0
+        self._lock: asyncio.Lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        """Adds tokens accumulated since the last refill."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self) -> None:
+        """Waits until a token is available and consumes it. Waiting callers are served in FIFO order."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self.blocked_until - now
+                if wait <= 0 and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                if wait <= 0:
+                    wait = (1 - self.tokens) / self.rate
+                await asyncio.sleep(wait)
+
+
+class AdaptiveRateLimiter:
+    """
+    Per host rate limiter that backs off when the server pushes back and recovers on its own.
+
+    Rate is adjusted in AIMD fashion: it is multiplied by `backoff_factor` (and the host is paused for `cooldown`
+    seconds) on every 403, 429 or 5xx response and increased by `recovery_step` on every successful response,
+    so the limiter settles close to the highest rate tolerated by the site.
+
+    Attributes:
+        rate (float): Initial rate of requests per second for every host.
+        burst (float): Capacity of the token bucket of every host.
+        min_rate (float): Lower bound of the rate after backoffs.
+        max_rate (float): Upper bound of the rate after recoveries.
+        backoff_factor (float): Multiplier applied to the rate on backoff.
+        recovery_step (float): Value added to the rate on every successful response.
+        cooldown (float): Number of seconds without requests to a host after a backoff.
+        backoff_statuses (set): HTTP statuses (besides 5xx) that trigger a backoff.
+        buckets (Dict[str, TokenBucket]): Token buckets by host.
+        n_backoffs (int): Number of backoffs performed so far.
+
+    Methods:
+        from_config(params): Creates the limiter from `async_rate_limit` section of the config.
+        acquire(url): Waits until a request to the host of the url can be sent.
+        report(url, status, retry_after): Adjusts the rate of the host of the url based on the response status.
+    """
+    def __init__(self, rate: float = 2.0, burst: float = 4.0, min_rate: float = 0.2, max_rate: float = 8.0,
+                 backoff_factor: float = 0.5, recovery_step: float = 0.05, cooldown: float = 5.0,
+                 backoff_statuses: Iterable[int] = (403, 429)):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.backoff_factor = backoff_factor
+        self.recovery_step = recovery_step
+        self.cooldown = cooldown
+        self.backoff_statuses = set(backoff_statuses)
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.n_backoffs = 0
+
+    @classmethod
+    def from_config(cls, params: Box) -> 'AdaptiveRateLimiter':
+        """
+        Creates the limiter from the rate limiting section of the config.
+
+        Args:
+            params (Box): Rate limiting parameters, keys correspond to the arguments of the constructor.
+
+        Returns:
+            AdaptiveRateLimiter: Configured rate limiter.
+        """
+        return cls(**params)
+
+    def _get_bucket(self, url: str) -> TokenBucket:
+        """Returns the token bucket of the host of a given url, creating it on first use."""
+        host = urlparse(url).netloc
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(self.rate, self.burst)
+        return self.buckets[host]
+
+    async def acquire(self, url: str) -> None:
+        """
+        Waits until a request to the host of the url is allowed by its token bucket.
+
+        Args:
+            url (str): The URL that is going to be requested.
+        """
+        await self._get_bucket(url).acquire()
+
+    def report(self, url: str, status: int, retry_after: Optional[str] = None) -> None:
+        """
+        Adjusts the rate of the host based on the status of the response.
+
+        Args:
+            url (str): The URL that was requested.
+            status (int): HTTP status of the response.
+            retry_after (Optional[str]): Value of the Retry-After header, if it was sent by the server.
+        """
+        bucket = self._get_bucket(url)
+        if status in self.backoff_statuses or status >= 500:
+            self._backoff(bucket, status, _parse_retry_after(retry_after))
+        elif status < 400:
+            bucket.rate = min(bucket.rate + self.recovery_step, self.max_rate)
+
+    def _backoff(self, bucket: TokenBucket, status: int, retry_after: Optional[float]) -> None:
+        """Decreases the rate of the bucket, empties it and pauses the host."""
+        cooldown = max(self.cooldown, retry_after or 0.0)
+        bucket.rate = max(bucket.rate * self.backoff_factor, self.min_rate)
+        bucket.tokens = 0.0
+        bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + cooldown)
+        self.n_backoffs += 1
+        logger.warning(f"HTTP status {status}, backing off to {bucket.rate:.2f} requests/s for {cooldown}s")
+
+
+def _parse_retry_after(retry_after: Optional[str]) -> Optional[float]:
+    """Parses Retry-After header given in seconds, dates are ignored."""
+    if retry_after is None:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        return None
@@ -0,0 +1,113 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Any, Dict, Optional, Tuple
+
+from src.db.sql_code import survey_links_select
+from src.pipeline.pipeline_step_abc import PipelineStepABC
+from src.pipeline.scraping.base_scraper import BaseScraper
+from src.pipeline.scraping.html_archive import HtmlArchive
+from src.pipeline.scraping.result_buffer import ResultBuffer
+from src.pipeline.scraping.scraping_funcs import extract_info_with_path, extraction_path_counts
+from src.utils.exceptions import EmptySurveyException, NoLinksException
+from src.utils.get_config import config
+from src.utils.links import offer_url
+from src.utils.setting_logger import Logger
+
+logger = Logger(__name__).get_logger()
+
+
+class ReplayScraper(BaseScraper):
+    """
+    Scraper that rebuilds scraped offers of a survey from the HTML archive, without any network requests.
+
+    All the links of the survey are re-parsed in parallel, so extractor fixes and new fields can be applied
+    to past surveys. Saved results of the re-parsed offers are updated, results of links without an archived page
+    (e.g. pages scraped before archiving was enabled) are kept.
+
+    Attributes:
+        workers (int): Number of processes decompressing and parsing pages, if 0 pages are parsed in this process.
+        batch_size (int): Number of offers uploaded to the database at once.
+        n_missing (int): Number of links of the survey that were not found in the archive.
+
+    Methods:
+        load_previous_step_data(): Loads all the links of the survey.
+        process(): Re-parses archived pages and uploads results in batches.
+        execute_step(): Orchestrates loading and processing of links.
+    """
+    def __init__(self, db: str, survey_id: str):
+        super().__init__(db, survey_id)
+        self.archive = HtmlArchive(config.html_archive_dir, config.html_archive_compression_level)
+        self.workers = config.replay_workers
+        self.batch_size = config.replay_batch_size
+        self.n_missing = 0
+        self.on_conflict = 'update'
+        self.query = survey_links_select
+
+    def load_previous_step_data(self):
+        """
+        Loads all the links of the survey, including the ones that were already scraped.
+        """
+        PipelineStepABC.load_previous_step_data(self)
+        if len(self.df) == 0:
+            raise EmptySurveyException(f"Survey {self.survey_id} has no corresponding links in the links table")
+        self.links = [offer_url(link) for link in self.df['link'].to_list()]
+
+    def process(self):
+        """
+        Re-parses archived pages of all links and upserts the results, other results of the survey are kept.
+        Raises NoLinksException if the list of links is empty.
+        """
+        if not self.links:
+            raise NoLinksException("The list of links is empty, fill it before iterating")
+        logger.info(f"Replaying {len(self.links)} links of survey {self.survey_id} from {self.archive.root}")
+
+        result_buffer = ResultBuffer(self.upload_batch, self.batch_size)
+        args = (repeat(self.archive), repeat(self.survey_id), self.links)
+        if self.workers:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                self._collect(executor.map(replay_offer, *args, chunksize=16), result_buffer)
+        else:
+            self._collect(map(replay_offer, *args), result_buffer)
+        result_buffer.flush()
+        logger.info(f"Replay finished, {result_buffer.n_flushed} offers saved, {self.n_missing} links not archived, "
+                    f"extraction paths used: {dict(extraction_path_counts)}")
+
+    def _collect(self, results, result_buffer: ResultBuffer) -> None:
+        """Adds parsed offers to the buffer and counts links missing in the archive."""
+        for result, path in results:
+            if result is None:
+                self.n_missing += 1
+                continue
+            extraction_path_counts[path] += 1
+            result_buffer.add(result)
+
+    def execute_step(self):
+        """
+        Executes the replay step by loading links and re-parsing them, results are uploaded during processing.
+        """
+        self.load_previous_step_data()
+        self.process()
+        self.wait_for_writes()
+
+
+def replay_offer(archive: HtmlArchive, survey_id: str, link: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Loads archived page of an offer and extracts information from it.
+
+    Args:
+        archive (HtmlArchive): Archive of fetched pages.
+        survey_id (str): ID of the survey.
+        link (str): Link of the offer.
+
+    Returns:
+        Tuple[Optional[Dict[str, Any]], Optional[str]]: Extracted information and the extraction path used,
+            (None, None) if the page is not archived or can't be parsed.
+    """
+    html = archive.load(survey_id, link)
+    if html is None:
+        return None, None
+    try:
+        return extract_info_with_path(html, link)
+    except ValueError as e:
+        logger.info(f"Exception occurred: {str(e)}")
+        return None, None
@@ -0,0 +1,62 @@
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from src.utils.setting_logger import Logger
+
+logger = Logger(__name__).get_logger()
+
+
+class ResultBuffer:
+    """
+    Buffer of scraped results that are flushed to the database in batches as they arrive.
+
+    Keeps memory usage flat regardless of the size of the survey and makes sure that an interrupted
+    run loses at most one batch of results. Results can be added from multiple threads.
+
+    Attributes:
+        flush_fn (Callable[[List[Dict[str, Any]]], None]): Function that saves a batch of results.
+        batch_size (int): Number of results that triggers a flush.
+        results (List[Dict[str, Any]]): Results waiting to be flushed.
+        n_flushed (int): Number of results flushed so far.
+
+    Methods:
+        add(result): Adds a result to the buffer, flushes the buffer if it is full.
+        flush(): Saves all buffered results.
+    """
+    def __init__(self, flush_fn: Callable[[List[Dict[str, Any]]], None], batch_size: int = 100):
+        self.flush_fn = flush_fn
+        self.batch_size = batch_size
+        self.results: List[Dict[str, Any]] = []
+        self.n_flushed: int = 0
+        self._lock = threading.RLock()
+
+    def add(self, result: Optional[Dict[str, Any]]) -> None:
+        """
+        Adds a result to the buffer, empty results are skipped.
+
+        Args:
+            result (Optional[Dict[str, Any]]): Information extracted from a single offer.
+        """
+        if result is None:
+            return
+        with self._lock:
+            self.results.append(result)
+            if len(self.results) >= self.batch_size:
+                self.flush()
+
+    def flush(self) -> None:
+        """
+        Saves all buffered results using flush function and empties the buffer.
+        If the flush function fails, the results are kept in the buffer and saved with the next flush.
+        """
+        with self._lock:
+            if not self.results:
+                return
+            batch, self.results = self.results, []
+            try:
+                self.flush_fn(batch)
+            except Exception:
+                self.results = batch + self.results
+                raise
+            self.n_flushed += len(batch)
+            logger.info(f"Flushed {len(batch)} results, {self.n_flushed} in total")
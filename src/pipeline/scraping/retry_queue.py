@@ -0,0 +1,114 @@
+import heapq
+import random
+import time
+from itertools import count
+from typing import Callable, List, Optional, Tuple
+
+from box import Box
+
+from src.utils.setting_logger import Logger
+
+logger = Logger(__name__).get_logger()
+
+
+class RetryQueue:
+    """
+    Queue of links waiting to be retried, ordered by the time they become ready.
+
+    Delay grows exponentially with every failed attempt and is randomized with jitter, so that retries
+    of links failing at the same time don't hit the server at once. Links are never waited for by sleeping
+    in the worker, other links are processed until a retry becomes ready.
+
+    Attributes:
+        max_attempts (int): Number of attempts after which a link is given up.
+        base_delay (float): Delay in seconds after the first failed attempt.
+        max_delay (float): Maximum delay in seconds.
+        jitter (float): Delay is multiplied by a random factor from [1 - jitter, 1 + jitter].
+        clock (Callable[[], float]): Function returning current time in seconds.
+
+    Methods:
+        from_config(params): Creates the queue from config parameters.
+        get_delay(attempt): Returns the delay after a failed attempt.
+        push(link, attempt): Schedules a retry of a link that failed the attempt, if it has attempts left.
+        pop_ready(): Returns a link that is ready to be retried.
+        time_to_next(): Returns time in seconds until the next retry is ready.
+    """
+    def __init__(self, max_attempts: int = 5, base_delay: float = 2.0, max_delay: float = 60.0,
+                 jitter: float = 0.5, clock: Callable[[], float] = time.monotonic):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.clock = clock
+        self._heap: List[Tuple[float, int, str, int]] = []
+        self._counter = count()
+
+    @classmethod
+    def from_config(cls, params: Box) -> "RetryQueue":
+        """
+        Creates the queue from config parameters.
+
+        Args:
+            params (Box): Parameters with keys max_attempts, base_delay, max_delay and jitter.
+
+        Returns:
+            RetryQueue: Configured queue.
+        """
+        return cls(max_attempts=params.max_attempts, base_delay=params.base_delay,
+                   max_delay=params.max_delay, jitter=params.jitter)
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def get_delay(self, attempt: int) -> float:
+        """
+        Returns the delay after a failed attempt.
+
+        Args:
+            attempt (int): Number of the failed attempt, starting from 1.
+
+        Returns:
+            float: Delay in seconds.
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def push(self, link: str, attempt: int) -> bool:
+        """
+        Schedules a retry of a link that failed the attempt, if it has attempts left.
+
+        Args:
+            link (str): Link that failed.
+            attempt (int): Number of the failed attempt, starting from 1.
+
+        Returns:
+            bool: True if the retry was scheduled, False if the link exhausted its attempts.
+        """
+        if attempt >= self.max_attempts:
+            return False
+        ready_at = self.clock() + self.get_delay(attempt)
+        heapq.heappush(self._heap, (ready_at, next(self._counter), link, attempt + 1))
+        return True
+
+    def pop_ready(self) -> Optional[Tuple[str, int]]:
+        """
+        Returns a link that is ready to be retried.
+
+        Returns:
+            Optional[Tuple[str, int]]: The link and the number of its next attempt, None if no retry is ready.
+        """
+        if not self._heap or self._heap[0][0] > self.clock():
+            return None
+        _, _, link, attempt = heapq.heappop(self._heap)
+        return link, attempt
+
+    def time_to_next(self) -> Optional[float]:
+        """
+        Returns time until the next retry is ready.
+
+        Returns:
+            Optional[float]: Time in seconds, 0 if a retry is ready, None if the queue is empty.
+        """
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - self.clock())
@@ -1,97 +1,269 @@
 import requests
-import pandas as pd
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from src.utils.exceptions import NoLinksException, UserInterruptException
 from src.utils.setting_logger import Logger
 from src.utils.get_config import config
-from src.pipeline.scraping.scraping_funcs import extract_info_from_response
-from typing import List, Dict, Any
+from src.pipeline.scraping.scraping_funcs import extract_info_from_response, extraction_path_counts
+from typing import List, Dict, Any, Optional, Tuple
 
 from src.pipeline.scraping.base_scraper import BaseScraper
+from src.pipeline.scraping.result_buffer import ResultBuffer
+from src.pipeline.scraping.retry_queue import RetryQueue
+from src.pipeline.scraping.validator_cache import ValidatorCache
 
 logger = Logger(__name__).get_logger()
 
+# every thread keeps its own session, requests.Session is not guaranteed to be thread safe
+_thread_local = threading.local()
+
 
 class Scraper(BaseScraper):
     """
     Scraper class for extracting information from a list of web links.
 
-    It processes links one by one, which is slower but more reliable.
+    It processes links one by one, which is slower but more reliable. With `sync_scraping_threads`
+    above 1 links are processed by a pool of threads, a middle ground between one by one and async scraping.
+    Requests reuse keep-alive connections and are retried on connection errors and throttling responses.
 
     This class extends BaseScraper to process a list of links by extracting information
     from each link and storing the results.
 
+    Attributes:
+        threads (int): Number of threads scraping links.
+        flush_batch_size (int): Number of scraped offers uploaded to the database at once when using threads.
+
     Methods:
         execute_step(): Orchestrates the loading and processing of links.
         process(): Iterates over links, extracts information, and handles retries and exceptions.
+        process_threaded(): Scrapes links in a pool of threads and uploads results in batches.
+        handle_failed_attempt(link, attempt, error, retry_queue, failures): Schedules a retry of a failed link.
+        scrape_link(link): Fetches a link and extracts information from it.
     """
+    def __init__(self, db: str, survey_id: str):
+        super().__init__(db, survey_id)
+        self.threads = config.sync_scraping_threads
+        self.flush_batch_size = config.sync_flush_batch_size
 
     def execute_step(self):
         """
-        Executes the scraping step by loading links and processing them.
+        Executes the scraping step by loading links and processing them,
+        or by draining the work queue shared with other workers if `use_work_queue` is set.
         """
+        self.start_time_budget()
+        if config.use_work_queue:
+            self.drain_work_queue()
+            return
         self.load_previous_step_data()
         self.process()
+        self.wait_for_writes()
 
     def process(self):
         """
         Processes each link by extracting information and handling retries on failure.
+        Failed links are retried with exponential backoff while other links are processed,
+        links that exhausted their retries are saved to the failed_links table.
         Raises NoLinksException if the list of links is empty.
         """
         logger.info(f"Iterating links to extract information")
         if not self.links:
             raise NoLinksException("The list of links is empty, fill it before iterating")
+        if self.threads > 1:
+            self.process_threaded()
+            return
 
         res_ls = []
+        failures = []
+        retry_queue = RetryQueue.from_config(config.retry_queue)
         try:
-            while self.links:
-                link = self.links.pop()
-                logger.info(f"Analysing link: {link}")
+            while self.links or retry_queue:
+                if self.remaining_budget() == 0:
+                    logger.info(f"Time budget of {self.time_budget} s exceeded, "
+                                f"{len(self.links) + len(retry_queue)} links left for the next run")
+                    break
+                retry = retry_queue.pop_ready()
+                if retry is not None:
+                    link, attempt = retry
+                elif self.links:
+                    link, attempt = self.links.pop(), 1
+                else:
+                    # only retries that are not ready yet are left
+                    time.sleep(self._wait_time(retry_queue))
+                    continue
+                logger.info(f"Analysing link: {link}, attempt {attempt}")
                 try:
-                    html = fetch(link)
-                    extracted_info = extract_info_from_response(html, link)
-                    res_ls.append(extracted_info)
+                    extracted_info = self.scrape_link(link)
+                    if extracted_info is not None:
+                        res_ls.append(extracted_info)
                 except Exception as e:
-                    logger.info(f"Exception occurred: {str(e)}, retrying")
-                    for i in range(1, 11):
-                        logger.info(f"Pausing for {str(i)} seconds")
-                        time.sleep(i)
-                        try:
-                            html = fetch(link)
-                            extracted_info = extract_info_from_response(html, link)
-                            res_ls.append(extracted_info)
-                            break
-                        except:
-                            continue
-                        else:
-                            break
-                    if i == 10:
-                        logger.info(f"Maximum retries reached, breaking")
-                        break
+                    self.handle_failed_attempt(link, attempt, e, retry_queue, failures)
+        except KeyboardInterrupt:
+            logger.info("User interrupted the process. Exiting...")
+            raise UserInterruptException
+        finally:
+            logger.info(f"Extraction paths used: {dict(extraction_path_counts)}")
+            if self.validator_cache is not None:
+                logger.info(f"Validator cache hits: {self.validator_cache.hits}, misses: {self.validator_cache.misses}")
+            self.upload_batch(res_ls)
+            self.save_failed_links(failures)
+
+    def process_threaded(self):
+        """
+        Scrapes links in a pool of threads, results are uploaded to the database every `flush_batch_size` offers.
+        Failed links are resubmitted when their retry is ready, links that exhausted their retries are saved
+        to the failed_links table.
+        """
+        logger.info(f"Scraping {len(self.links)} links with {self.threads} threads")
+        result_buffer = ResultBuffer(self.upload_batch, self.flush_batch_size)
+        retry_queue = RetryQueue.from_config(config.retry_queue)
+        failures = []
+        executor = ThreadPoolExecutor(max_workers=self.threads)
+        try:
+            pending = {executor.submit(self.scrape_link, link): (link, 1) for link in self.links}
+            while pending or retry_queue:
+                if self.remaining_budget() == 0:
+                    logger.info(f"Time budget of {self.time_budget} s exceeded, "
+                                f"{len(pending) + len(retry_queue)} links left for the next run")
+                    break
+                retry = retry_queue.pop_ready()
+                while retry is not None:
+                    pending[executor.submit(self.scrape_link, retry[0])] = retry
+                    retry = retry_queue.pop_ready()
+                if not pending:
+                    time.sleep(self._wait_time(retry_queue))
+                    continue
+                done, _ = wait(pending, timeout=self._wait_time(retry_queue), return_when=FIRST_COMPLETED)
+                for future in done:
+                    link, attempt = pending.pop(future)
+                    try:
+                        result_buffer.add(future.result())
+                    except Exception as e:
+                        self.handle_failed_attempt(link, attempt, e, retry_queue, failures)
         except KeyboardInterrupt:
             logger.info("User interrupted the process. Exiting...")
             raise UserInterruptException
         finally:
-            self.df_out = pd.DataFrame(res_ls)
-            self.df_out['survey_id'] = self.survey_id
-            self.upload_results_to_db()
+            executor.shutdown(cancel_futures=True)
+            result_buffer.flush()
+            self.save_failed_links(failures)
+            logger.info(f"Scraping finished, {result_buffer.n_flushed} offers saved, {len(failures)} links failed, "
+                        f"extraction paths used: {dict(extraction_path_counts)}")
+            if self.validator_cache is not None:
+                logger.info(f"Validator cache hits: {self.validator_cache.hits}, misses: {self.validator_cache.misses}")
+
+    def _wait_time(self, retry_queue: RetryQueue) -> Optional[float]:
+        """Returns time until the next retry is ready or the time budget ends, whichever comes first."""
+        times = [t for t in (retry_queue.time_to_next(), self.remaining_budget()) if t is not None]
+        return min(times) if times else None
 
+    @staticmethod
+    def handle_failed_attempt(link: str, attempt: int, error: Exception, retry_queue: RetryQueue,
+                              failures: List[Tuple[str, Optional[int], str, int]]) -> None:
+        """
+        Schedules a retry of the link, or adds it to failures if it exhausted its retries.
+
+        Args:
+            link (str): Link that failed.
+            attempt (int): Number of the failed attempt, starting from 1.
+            error (Exception): Exception raised while scraping the link.
+            retry_queue (RetryQueue): Queue of links waiting to be retried.
+            failures (List[Tuple[str, Optional[int], str, int]]): Links that exhausted their retries.
+        """
+        if retry_queue.push(link, attempt):
+            logger.info(f"Exception occurred: {str(error)}, retry {attempt} of {link} scheduled")
+        else:
+            logger.info(f"Exception occurred: {str(error)}, maximum retries of {link} reached")
+            failures.append((link, get_status_code(error), str(error), attempt))
 
-def fetch(link: str) -> str:
+    def scrape_link(self, link: str) -> Optional[Dict[str, Any]]:
+        """
+        Fetches a link and extracts information from it. If the page was not modified since it was
+        scraped last time, the cached record is returned without downloading and parsing the page,
+        unless the page can't be archived without downloading it.
+
+        Args:
+            link (str): The URL of the offer.
+
+        Returns:
+            Optional[Dict[str, Any]]: Information extracted from the offer.
+        """
+        html = fetch(link, self.validator_cache)
+        if html is None:
+            if self.archive_not_modified(link):
+                return self.validator_cache.not_modified(link)
+            html = fetch(link)
+        self.archive_html(link, html)
+        extracted_info = extract_info_from_response(html, link)
+        if self.validator_cache is not None:
+            self.validator_cache.store(link, extracted_info)
+        return extracted_info
+
+
+def fetch(link: str, validator_cache: Optional[ValidatorCache] = None) -> Optional[str]:
     """
     Fetches the HTML content of a given link.
 
     Args:
         link (str): The URL to fetch.
+        validator_cache (Optional[ValidatorCache]): Cache of validators, if provided the request is conditional
+            and validators of the response are remembered.
 
     Returns:
-        str: The HTML content of the page.
+        Optional[str]: The HTML content of the page, None if the page was not modified since it was cached.
 
     Raises:
         requests.HTTPError: If the request to the URL fails.
     """
     logger.info(f"analyzing {link}")
-    response = requests.get(link, headers=config.headers)
+    headers = config.headers
+    if validator_cache is not None:
+        headers = {**config.headers, **validator_cache.conditional_headers(link)}
+    timeouts = config.http_timeouts
+    response = get_session().get(link, headers=headers, timeout=(timeouts.connect, timeouts.read))
+    if response.status_code == 304 and validator_cache is not None:
+        return None
     response.raise_for_status()
+    if validator_cache is not None:
+        validator_cache.modified(link, response.headers.get('ETag'), response.headers.get('Last-Modified'))
     return response.text
+
+
+def get_session() -> requests.Session:
+    """
+    Returns the session of the current thread, creating it on first use.
+
+    The session keeps connections alive between requests and retries requests on connection errors
+    and responses listed in `http_retries`, respecting their Retry-After header.
+
+    Returns:
+        requests.Session: Session of the current thread.
+    """
+    session = getattr(_thread_local, 'session', None)
+    if session is None:
+        retries = Retry(total=config.http_retries.total, backoff_factor=config.http_retries.backoff_factor,
+                        status_forcelist=list(config.http_retries.status_forcelist), allowed_methods=['GET'],
+                        raise_on_status=False)
+        adapter = HTTPAdapter(max_retries=retries, pool_connections=1, pool_maxsize=1)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        _thread_local.session = session
+    return session
+
+
+def get_status_code(error: Exception) -> Optional[int]:
+    """
+    Returns HTTP status code of the response that caused the error.
+
+    Args:
+        error (Exception): Exception raised while scraping a link.
+
+    Returns:
+        Optional[int]: Status code, None if no response was received.
+    """
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None)
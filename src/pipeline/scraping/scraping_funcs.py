@@ -1,9 +1,72 @@
 from scrapy import Selector
 from bs4 import BeautifulSoup
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
+from collections import Counter
 
+from src.utils.get_config import config
+from src.pipeline.scraping.lxml_extraction import extract_info_with_lxml
+from src.pipeline.scraping.payload_extraction import extract_info_from_payload
 
-def extract_info_from_response(html: str, url: str) -> Dict[str, Any]:
+# number of pages extracted by each path ('payload', 'lxml', 'selectors') in this process
+extraction_path_counts = Counter()
+
+
+def extract_info_from_response(html: str, url: str, engine: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Extracts information from the HTML response of a real estate listing.
+
+    Structured JSON payload of the page is used if available, otherwise HTML is parsed.
+    Path used for the page is counted in `extraction_path_counts`.
+
+    Args:
+        html (str): The HTML content of the webpage.
+        url (str): The URL of the webpage.
+        engine (Optional[str]): Extraction engine, 'lxml' (single parse) or 'selectors'
+            (Selector + BeautifulSoup). If None, `extraction_engine` from the config is used.
+
+    Returns:
+        Dict[str, Any]: A dictionary containing extracted information.
+
+    Raises:
+        ValueError: If the HTML content is not provided or is not a string, or the engine is unknown.
+    """
+    result, path = extract_info_with_path(html, url, engine)
+    extraction_path_counts[path] += 1
+    return result
+
+
+def extract_info_with_path(html: str, url: str, engine: Optional[str] = None) -> Tuple[Dict[str, Any], str]:
+    """
+    Extracts information from the HTML response of a real estate listing and returns the path that was used.
+
+    Meant for worker processes, which have to send the path back to be counted in the main process.
+
+    Args:
+        html (str): The HTML content of the webpage.
+        url (str): The URL of the webpage.
+        engine (Optional[str]): Extraction engine used when the page has no payload, 'lxml' or 'selectors'.
+            If None, `extraction_engine` from the config is used.
+
+    Returns:
+        Tuple[Dict[str, Any], str]: Extracted information and the path: 'payload', 'lxml' or 'selectors'.
+
+    Raises:
+        ValueError: If the HTML content is not provided or is not a string, or the engine is unknown.
+    """
+    if config.use_payload_extraction:
+        result = extract_info_from_payload(html, url)
+        if result is not None:
+            return result, 'payload'
+    engine = engine or config.extraction_engine
+    if engine == 'lxml':
+        return extract_info_with_lxml(html, url), engine
+    elif engine == 'selectors':
+        return extract_info_with_selectors(html, url), engine
+    else:
+        raise ValueError(f"Unknown extraction engine: {engine}")
+
+
+def extract_info_with_selectors(html: str, url: str) -> Dict[str, Any]:
     """
     Extracts information from the HTML response of a real estate listing.
 
@@ -0,0 +1,345 @@
+"""
+Scraping with a Scrapy spider, Twisted scheduler keeps a pool of persistent connections busy
+and AutoThrottle adapts concurrency to response times of the server.
+"""
+from src.db.connection import get_connection
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+import scrapy
+from scrapy.crawler import CrawlerProcess
+from scrapy.http import Response
+
+from src.db.offer_keys import get_survey_key
+from src.db.sql_code import (listing_cards_insert, listing_cards_last_known, seen_links_collected_upsert,
+                             survey_links_insert)
+from src.pipeline.scraping.base_scraper import BaseScraper
+from src.pipeline.scraping.result_buffer import ResultBuffer
+from src.pipeline.scraping.scraping_funcs import extract_info_from_response, extraction_path_counts
+from src.special_steps.async_links_collection import get_links_list_from_response
+from src.special_steps.listing_cards import get_cards_from_response
+from src.special_steps.survey_creation import get_search_page_urls
+from src.utils.exceptions import UserInterruptException
+from src.utils.get_config import config
+from src.utils.links import normalize_link, offer_id_from_link, offer_url
+from src.utils.setting_logger import Logger
+
+logger = Logger(__name__).get_logger()
+
+
+@dataclass
+class OfferLink:
+    """Link to an offer found on a search results page."""
+    survey_id: str
+    link: str
+
+
+@dataclass
+class CollectedLink:
+    """Link found on a search results page, with its listing card if cards are collected."""
+    link: str
+    card: Optional[Dict[str, Any]] = None
+
+
+@dataclass
+class ScrapedOffer:
+    """Information extracted from an offer page."""
+    record: Dict[str, Any]
+
+
+class OfferSpider(scrapy.Spider):
+    """
+    Spider scraping offers of a survey.
+
+    If the survey has links already, their offer pages are requested directly. Otherwise the search
+    results pages are crawled, found links are saved to survey_links and their offer pages are followed.
+    All found links are recorded in seen_links, with `use_listing_cards` also their listing cards,
+    like in links collection of SurveyCreator.
+
+    Attributes:
+        step (ScrapyScraper): Pipeline step that started the spider, used to save results.
+        links (List[str]): Links of offers to scrape, relative as stored in survey_links.
+        search_pages (List[str]): Urls of search results pages, used if there are no links.
+        known_links (set): Normalized links that are not followed when found on search results pages,
+            unless their listing card changed.
+        followed_links (set): Normalized links followed in this survey.
+    """
+    name = 'otodom_offers'
+
+    def __init__(self, step: "ScrapyScraper", links: List[str], search_pages: List[str], known_links: set,
+                 *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.step = step
+        self.links = links
+        self.search_pages = search_pages
+        self.known_links = known_links
+        self.followed_links: set = set()
+
+    def start_requests(self) -> Iterator[scrapy.Request]:
+        if self.links:
+            for link in self.links:
+                yield self.offer_request(link)
+        else:
+            for url in self.search_pages:
+                yield scrapy.Request(url, callback=self.parse_search_page)
+
+    def offer_request(self, link: str) -> scrapy.Request:
+        """Returns request of the offer page, the link is passed to the callback as stored in the database."""
+        return scrapy.Request(offer_url(link), callback=self.parse_offer, cb_kwargs={'link': link})
+
+    def parse_search_page(self, response: Response) -> Iterator[Union[CollectedLink, OfferLink, scrapy.Request]]:
+        """
+        Collects links from a search results page and follows offers that are not known yet,
+        or known ones whose listing card changed.
+
+        Args:
+            response (Response): Search results page.
+        """
+        if self.step.use_listing_cards:
+            collected = [CollectedLink(card['link'], card) for card in get_cards_from_response(response.text)]
+        else:
+            collected = [CollectedLink(link) for link in get_links_list_from_response(response.text)]
+        for item in collected:
+            yield item
+            link = item.link
+            if normalize_link(link) in self.followed_links:
+                continue
+            if normalize_link(link) in self.known_links and not self.step.card_changed(item.card):
+                continue
+            self.followed_links.add(normalize_link(link))
+            yield OfferLink(survey_id=self.step.survey_id, link=link)
+            yield self.offer_request(link)
+
+    def parse_offer(self, response: Response, link: str) -> Iterator[ScrapedOffer]:
+        """
+        Extracts information from an offer page.
+
+        Args:
+            response (Response): Offer page.
+            link (str): Link of the offer as stored in survey_links.
+        """
+        url = offer_url(link)
+        self.step.archive_html(url, response.text)
+        yield ScrapedOffer(record=extract_info_from_response(response.text, url))
+
+
+class SqliteBulkPipeline:
+    """
+    Item pipeline saving links and offers to the database in batches.
+
+    Attributes:
+        step (ScrapyScraper): Pipeline step saving the results.
+        links (ResultBuffer): Buffer of links found on search results pages that are scraped.
+        collected (ResultBuffer): Buffer of all links found on search results pages, with their cards.
+        offers (ResultBuffer): Buffer of scraped offers.
+
+    Methods:
+        open_spider(spider): Creates buffers of links and offers.
+        process_item(item, spider): Adds the item to its buffer.
+        save_offers(batch): Saves a batch of offers.
+        close_spider(spider): Saves remaining items.
+    """
+    def open_spider(self, spider: OfferSpider):
+        batch_size = config.scrapy.flush_batch_size
+        self.step = spider.step
+        self.links = ResultBuffer(self.step.save_links, batch_size)
+        self.collected = ResultBuffer(self.step.save_collected_links, batch_size)
+        self.offers = ResultBuffer(self.save_offers, batch_size)
+
+    def save_offers(self, batch: List[Dict[str, Any]]) -> None:
+        """Saves a batch of offers, pending links are saved first so that no offer is saved without its link."""
+        self.links.flush()
+        self.step.upload_batch(batch)
+
+    def process_item(self, item: Union[CollectedLink, OfferLink, ScrapedOffer], spider: OfferSpider):
+        if isinstance(item, CollectedLink):
+            self.collected.add(item)
+        elif isinstance(item, OfferLink):
+            self.links.add({'survey_id': item.survey_id, 'link': item.link})
+        else:
+            self.offers.add(item.record)
+        return item
+
+    def close_spider(self, spider: OfferSpider):
+        self.collected.flush()
+        self.links.flush()
+        self.offers.flush()
+        logger.info(f"Spider closed, {self.links.n_flushed} links and {self.offers.n_flushed} offers saved")
+
+
+class ScrapyScraper(BaseScraper):
+    """
+    Scraper running a Scrapy spider, an alternative to the sync and async scrapers.
+
+    Scrapy schedules requests over a pool of persistent connections, AutoThrottle adjusts the delay
+    between requests to the latency of the server, and optional HTTP cache keeps responses on disk for
+    `http_cache_expiration_secs`, so a survey can be scraped again locally. Links and offers are saved
+    in bulk by an item pipeline.
+
+    If the survey has no links yet, they are collected by the spider from search results pages.
+
+    Attributes:
+        settings (Dict[str, Any]): Scrapy settings.
+        search_pages (List[str]): Urls of search results pages of the survey.
+        known_links (set): Normalized links not followed when collecting links, already scraped ones for
+            incremental surveys.
+        use_listing_cards (bool): If listing cards are collected with the links.
+        last_known_cards (Dict[str, str]): Card hash of every link from its most recent previous survey.
+        survey_date (Optional[str]): Date of the survey, recorded in seen_links.
+
+    Methods:
+        load_previous_step_data(): Loads links left to scrape, or prepares search pages if there are none.
+        process(): Runs the spider.
+        save_links(links): Saves links found by the spider to survey_links.
+        save_collected_links(collected): Records links found by the spider in seen_links and listing_cards.
+        card_changed(card): Checks if a listing card differs from the card seen in previous surveys.
+        execute_many(statement, params): Writes rows through the database writer or directly.
+        execute_step(): Orchestrates loading and processing of links.
+    """
+    def __init__(self, db: str, survey_id: str):
+        super().__init__(db, survey_id)
+        self.settings = get_scrapy_settings()
+        self.search_pages: List[str] = []
+        self.known_links: set = set()
+        self.use_listing_cards: bool = config.get('use_listing_cards', False)
+        self.last_known_cards: Dict[str, str] = {}
+        self.survey_date: Optional[str] = None
+        # responses are cached by Scrapy itself
+        self.validator_cache = None
+
+    def load_previous_step_data(self):
+        """
+        Loads links of the survey left to scrape. If the survey has no links yet, prepares the urls
+        of search results pages instead, so that the spider collects the links.
+        """
+        with get_connection(self.db) as conn:
+            n_links = conn.execute("select count(*) from survey_links where survey_id = ?",
+                                   (self.survey_id,)).fetchone()[0]
+        if n_links:
+            super().load_previous_step_data()
+            self.links = self.df['link'].to_list()
+            return
+
+        with get_connection(self.db) as conn:
+            survey_type, n_pages, self.survey_date = conn.execute(
+                "select survey_type, n_pages, survey_date from surveys where survey_id = ?",
+                (self.survey_id,)).fetchone()
+            if survey_type == 'incremental':
+                self.known_links = {row[0] for row in conn.execute("select link from seen_links where scraped = 1")}
+                if self.use_listing_cards:
+                    self.last_known_cards = dict(conn.execute(listing_cards_last_known, self.query_params).fetchall())
+        self.search_pages = get_search_page_urls(config.base_link, n_pages)
+        logger.info(f"Survey {self.survey_id} has no links yet, collecting them from {n_pages} search pages")
+
+    def process(self):
+        """
+        Runs the spider until all offers are scraped. Results are saved to the database by the item pipeline.
+        """
+        process = CrawlerProcess(self.settings, install_root_handler=False)
+        process.crawl(OfferSpider, step=self, links=self.links, search_pages=self.search_pages,
+                      known_links=self.known_links)
+        try:
+            process.start()
+        except KeyboardInterrupt:
+            logger.info("User interrupted the process. Exiting...")
+            raise UserInterruptException
+        finally:
+            logger.info(f"Extraction paths used: {dict(extraction_path_counts)}")
+
+    def save_links(self, links: List[Dict[str, str]]) -> None:
+        """
+        Saves links found by the spider to survey_links, links already in the survey are skipped.
+
+        Args:
+            links (List[Dict[str, str]]): Survey id and link of the offers.
+        """
+        if self.survey_key is None:
+            with get_connection(self.db) as conn:
+                self.survey_key = get_survey_key(conn, self.survey_id)
+        self.execute_many(survey_links_insert, [(link['survey_id'], link['link'], offer_id_from_link(link['link']),
+                                                 self.survey_key) for link in links])
+
+    def save_collected_links(self, collected: List[CollectedLink]) -> None:
+        """
+        Records links found by the spider in seen_links, and their listing cards in listing_cards,
+        so that following incremental surveys can skip known and unchanged offers.
+
+        Args:
+            collected (List[CollectedLink]): Links found on search results pages.
+        """
+        seen_at = self.survey_date or datetime.today().strftime('%Y-%m-%d')
+        self.execute_many(seen_links_collected_upsert,
+                          [{'link': normalize_link(link), 'seen_at': seen_at, 'survey_id': self.survey_id}
+                           for link in {item.link for item in collected}])
+        cards = {item.link: (self.survey_id, item.link, item.card['price'], item.card['area'], item.card['n_rooms'],
+                             item.card['location'], item.card['card_hash'])
+                 for item in collected if item.card is not None}
+        if cards:
+            self.execute_many(listing_cards_insert, list(cards.values()))
+
+    def card_changed(self, card: Optional[Dict[str, Any]]) -> bool:
+        """
+        Checks if a listing card differs from the card of the link seen in the most recent previous survey.
+
+        Args:
+            card (Optional[Dict[str, Any]]): Listing card, None if cards are not collected.
+
+        Returns:
+            bool: True if the link was seen before with a different card.
+        """
+        if card is None or card['card_hash'] is None or card['link'] not in self.last_known_cards:
+            return False
+        return self.last_known_cards[card['link']] != card['card_hash']
+
+    def execute_many(self, statement: str, params: List[Any]) -> None:
+        """
+        Executes a statement for every parameter set, queued for the database writer if it is enabled.
+
+        Args:
+            statement (str): SQL statement.
+            params (List[Any]): Parameters of every execution.
+        """
+        if self.writer is not None:
+            self.writer.execute_many(statement, params)
+            return
+        with get_connection(self.db) as conn:
+            conn.executemany(statement, params)
+
+    def execute_step(self):
+        """
+        Executes the scraping step by loading links and running the spider, results are saved during processing.
+        """
+        self.load_previous_step_data()
+        self.process()
+        self.wait_for_writes()
+
+
+def get_scrapy_settings() -> Dict[str, Any]:
+    """
+    Returns Scrapy settings built from the `scrapy` section of the config.
+
+    Returns:
+        Dict[str, Any]: Scrapy settings.
+    """
+    params = config.scrapy
+    return {
+        'USER_AGENT': config.headers['User-Agent'],
+        'CONCURRENT_REQUESTS': params.concurrent_requests,
+        'CONCURRENT_REQUESTS_PER_DOMAIN': params.concurrent_requests_per_domain,
+        'AUTOTHROTTLE_ENABLED': True,
+        'AUTOTHROTTLE_START_DELAY': params.autothrottle_start_delay,
+        'AUTOTHROTTLE_MAX_DELAY': params.autothrottle_max_delay,
+        'AUTOTHROTTLE_TARGET_CONCURRENCY': params.autothrottle_target_concurrency,
+        'RETRY_TIMES': params.retry_times,
+        'RETRY_HTTP_CODES': [429, 500, 502, 503, 504],
+        'HTTPCACHE_ENABLED': params.http_cache,
+        'HTTPCACHE_DIR': str(Path(params.http_cache_dir).resolve()),
+        'HTTPCACHE_EXPIRATION_SECS': params.http_cache_expiration_secs,
+        'HTTPCACHE_IGNORE_HTTP_CODES': [403, 429, 500, 502, 503, 504],
+        'ITEM_PIPELINES': {f'{SqliteBulkPipeline.__module__}.SqliteBulkPipeline': 300},
+        'REQUEST_FINGERPRINTER_IMPLEMENTATION': '2.7',
+        'TELNETCONSOLE_ENABLED': False,
+        'LOG_LEVEL': 'INFO',
+    }
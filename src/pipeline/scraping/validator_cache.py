@@ -0,0 +1,174 @@
+"""
+Persistent cache of HTTP validators (ETag, Last-Modified) and records extracted from the offers.
+
+Offers are scraped again in every survey, with the validators the server can answer 304 Not Modified
+instead of sending the page, and the record extracted previously is reused without parsing.
+"""
+import json
+from src.db.connection import get_connection
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from src.db.database_writer import DatabaseWriter
+
+from src.db.sql_code import http_cache_upsert
+from src.utils.setting_logger import Logger
+
+logger = Logger(__name__).get_logger()
+
+# max number of urls in a single query, below the default sqlite limit of variables
+LOAD_CHUNK_SIZE = 500
+
+
+class ValidatorCache:
+    """
+    Cache of HTTP validators and extracted records of offers, stored in the http_cache table.
+
+    Entries are loaded into memory before scraping, new entries are kept in memory and written
+    to the database with `flush`, so that no database access happens while fetching.
+    The cache can be shared by multiple threads.
+
+    Attributes:
+        db (str): Path of the database.
+        writer (Optional[DatabaseWriter]): Writer thread of the database new entries are queued for,
+            if None they are written directly.
+        survey_id (Optional[str]): ID of the survey pages are downloaded in, saved with new entries.
+        entries (Dict[str, Tuple[Optional[str], Optional[str], str, Optional[str]]]): ETag, Last-Modified,
+            JSON record and ID of the survey the page was downloaded in by url.
+        hits (int): Number of responses answered with 304 and served from the cache.
+        misses (int): Number of responses downloaded in full.
+
+    Methods:
+        load(urls): Loads cache entries of the urls from the database.
+        conditional_headers(url): Returns headers that make the request conditional.
+        not_modified(url): Returns the cached record of a url answered with 304.
+        downloaded_in(url): Returns ID of the survey the cached page was downloaded in.
+        modified(url, etag, last_modified): Remembers validators of a url downloaded in full.
+        store(url, record): Saves the record extracted from a url downloaded in full.
+        flush(): Writes new entries to the database.
+    """
+    def __init__(self, db: str, writer: Optional[DatabaseWriter] = None, survey_id: Optional[str] = None):
+        self.db = db
+        self.writer = writer
+        self.survey_id = survey_id
+        self.entries: Dict[str, Tuple[Optional[str], Optional[str], str, Optional[str]]] = {}
+        self.hits: int = 0
+        self.misses: int = 0
+        self._validators: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+        self._pending: List[Tuple[str, Optional[str], Optional[str], str, str, Optional[str]]] = []
+        self._lock = threading.Lock()
+
+    def load(self, urls: Iterable[str]) -> None:
+        """
+        Loads cache entries of the urls from the database.
+
+        Args:
+            urls (Iterable[str]): Urls that are going to be fetched.
+        """
+        urls = list(urls)
+        with get_connection(self.db) as conn:
+            for i in range(0, len(urls), LOAD_CHUNK_SIZE):
+                chunk = urls[i:i + LOAD_CHUNK_SIZE]
+                rows = conn.execute(f"select url, etag, last_modified, record, survey_id from http_cache "
+                                    f"where url in ({', '.join('?' * len(chunk))})", chunk).fetchall()
+                for url, etag, last_modified, record, survey_id in rows:
+                    self.entries[url] = (etag, last_modified, record, survey_id)
+        logger.info(f"Loaded {len(self.entries)} cached validators for {len(urls)} links")
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """
+        Returns headers that make the request conditional, empty if the url is not cached.
+
+        Args:
+            url (str): Url to be fetched.
+
+        Returns:
+            Dict[str, str]: If-None-Match and If-Modified-Since headers.
+        """
+        entry = self.entries.get(url)
+        if entry is None:
+            return {}
+        etag, last_modified, _, _ = entry
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def not_modified(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the cached record of a url the server answered with 304 Not Modified.
+
+        Args:
+            url (str): Fetched url.
+
+        Returns:
+            Optional[Dict[str, Any]]: Record extracted from the page previously, None if the url is not cached.
+        """
+        entry = self.entries.get(url)
+        if entry is None:
+            return None
+        with self._lock:
+            self.hits += 1
+        return json.loads(entry[2])
+
+    def downloaded_in(self, url: str) -> Optional[str]:
+        """
+        Returns ID of the survey the cached page was downloaded in, a page answered with 304 Not Modified
+        is the same as the one archived in that survey.
+
+        Args:
+            url (str): Fetched url.
+
+        Returns:
+            Optional[str]: ID of the survey, None if the url is not cached or the entry predates the column.
+        """
+        entry = self.entries.get(url)
+        return entry[3] if entry is not None else None
+
+    def modified(self, url: str, etag: Optional[str], last_modified: Optional[str]) -> None:
+        """
+        Remembers validators of a url downloaded in full, they are saved together with the extracted record.
+
+        Args:
+            url (str): Fetched url.
+            etag (Optional[str]): ETag header of the response.
+            last_modified (Optional[str]): Last-Modified header of the response.
+        """
+        with self._lock:
+            self.misses += 1
+            if etag or last_modified:
+                self._validators[url] = (etag, last_modified)
+
+    def store(self, url: str, record: Optional[Dict[str, Any]]) -> None:
+        """
+        Saves the record extracted from a url downloaded in full, if the response had any validators.
+
+        Args:
+            url (str): Fetched url.
+            record (Optional[Dict[str, Any]]): Information extracted from the page.
+        """
+        with self._lock:
+            validators = self._validators.pop(url, None)
+        if validators is None or record is None:
+            return
+        etag, last_modified = validators
+        record_json = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self.entries[url] = (etag, last_modified, record_json, self.survey_id)
+            self._pending.append((url, etag, last_modified, record_json, datetime.now().isoformat(), self.survey_id))
+
+    def flush(self) -> None:
+        """Writes new entries to the database, or queues them for the database writer."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        if self.writer is not None:
+            self.writer.execute_many(http_cache_upsert, pending)
+        else:
+            with get_connection(self.db) as conn:
+                conn.executemany(http_cache_upsert, pending)
+        logger.info(f"Saved {len(pending)} validators to cache")
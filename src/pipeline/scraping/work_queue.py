@@ -0,0 +1,204 @@
+"""
+Queue of links to scrape shared by many scraper processes, on one or many hosts, through a common database.
+
+Workers claim batches of links with a lease. A worker that dies stops renewing its lease and
+its links are claimed by other workers after the lease expires.
+"""
+import os
+import socket
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Iterator, List
+
+from src.db.connection import connect
+from src.db.offer_keys import fill_offer_keys
+from src.db.sql_code import link_queue_populate, link_queue_requeue, link_queue_claimable
+from src.utils.setting_logger import Logger
+
+logger = Logger(__name__).get_logger()
+
+
+def get_worker_id() -> str:
+    """Returns id of the current process, unique across hosts."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueueABC(ABC):
+    """
+    Abstract queue of links of a survey, drained by many workers.
+
+    Attributes:
+        lease_seconds (float): Time after which links claimed by a worker that stopped renewing the lease
+            can be claimed by other workers.
+
+    Methods:
+        populate(survey_id): Adds links of the survey that are not scraped yet to the queue.
+        claim(survey_id, worker_id, batch_size): Leases a batch of links to the worker.
+        heartbeat(survey_id, worker_id): Renews leases of the worker.
+        mark_done(survey_id, links): Marks links as processed.
+        release(survey_id, worker_id): Returns links leased by the worker to the queue.
+        remaining(survey_id): Returns number of links not processed yet.
+        keep_alive(survey_id, worker_id): Context manager renewing leases in a background thread.
+    """
+    def __init__(self, lease_seconds: float = 300):
+        self.lease_seconds = lease_seconds
+
+    @abstractmethod
+    def populate(self, survey_id: str) -> int:
+        """Adds links of the survey that are not scraped yet to the queue, returns number of links waiting."""
+        pass
+
+    @abstractmethod
+    def claim(self, survey_id: str, worker_id: str, batch_size: int) -> List[str]:
+        """Leases up to batch_size links to the worker, returns empty list if there is nothing left to claim."""
+        pass
+
+    @abstractmethod
+    def heartbeat(self, survey_id: str, worker_id: str) -> None:
+        """Renews leases of all links claimed by the worker."""
+        pass
+
+    @abstractmethod
+    def mark_done(self, survey_id: str, links: List[str]) -> None:
+        """Marks links as processed."""
+        pass
+
+    @abstractmethod
+    def release(self, survey_id: str, worker_id: str) -> None:
+        """Returns links leased by the worker and not processed to the queue."""
+        pass
+
+    @abstractmethod
+    def remaining(self, survey_id: str) -> int:
+        """Returns number of links of the survey that are not processed yet."""
+        pass
+
+    @contextmanager
+    def keep_alive(self, survey_id: str, worker_id: str) -> Iterator[None]:
+        """
+        Renews leases of the worker in a background thread, three times per lease period,
+        for as long as the context is open.
+
+        Args:
+            survey_id (str): ID of the survey.
+            worker_id (str): ID of the worker.
+        """
+        stop = threading.Event()
+
+        def renew():
+            while not stop.wait(self.lease_seconds / 3):
+                try:
+                    self.heartbeat(survey_id, worker_id)
+                except Exception as e:
+                    logger.warning(f"Failed to renew leases of {worker_id}: {e}")
+
+        thread = threading.Thread(target=renew, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+
+class SqliteWorkQueue(WorkQueueABC):
+    """
+    Work queue stored in the link_queue table of the SQLite database.
+
+    The database is switched to WAL mode, so that workers can claim links while others write results.
+    Claims are done in immediate transactions, a link is never leased to two workers at once.
+
+    Attributes:
+        db (str): Path of the database.
+        lease_seconds (float): Lease time of claimed links.
+        timeout (float): Time in seconds a connection waits for a lock held by another worker.
+    """
+    def __init__(self, db: str, lease_seconds: float = 300, timeout: float = 30):
+        super().__init__(lease_seconds)
+        self.db = db
+        self.timeout = timeout
+        conn = connect(self.db, timeout=self.timeout)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Returns a connection that leaves transaction control to the caller."""
+        return connect(self.db, timeout=self.timeout, isolation_level=None)
+
+    def populate(self, survey_id: str) -> int:
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for table in ['survey_links', 'scraped_offers', 'link_queue']:
+                fill_offer_keys(conn, table, survey_id)
+            conn.execute(link_queue_populate, {'survey_id': survey_id})
+            conn.execute(link_queue_requeue, {'survey_id': survey_id})
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        n_remaining = self.remaining(survey_id)
+        logger.info(f"{n_remaining} links of survey {survey_id} waiting in the work queue")
+        return n_remaining
+
+    def claim(self, survey_id: str, worker_id: str, batch_size: int) -> List[str]:
+        conn = self._connect()
+        try:
+            while True:
+                now = time.time()
+                conn.execute("BEGIN IMMEDIATE")
+                rows = conn.execute(link_queue_claimable,
+                                    {'survey_id': survey_id, 'now': now, 'batch_size': batch_size}).fetchall()
+                # links saved by a worker that lost its lease before marking them done
+                scraped = [(rowid,) for rowid, _, is_scraped in rows if is_scraped]
+                claimed = [(rowid, link) for rowid, link, is_scraped in rows if not is_scraped]
+                conn.executemany("UPDATE link_queue SET status = 'done' WHERE rowid = ?", scraped)
+                conn.executemany("UPDATE link_queue SET status = 'leased', worker_id = ?, lease_expires = ?, "
+                                 "attempts = attempts + 1 WHERE rowid = ?",
+                                 [(worker_id, now + self.lease_seconds, rowid) for rowid, _ in claimed])
+                conn.execute("COMMIT")
+                if claimed or not rows:
+                    break
+        finally:
+            conn.close()
+        links = [link for _, link in claimed]
+        if links:
+            logger.info(f"Worker {worker_id} claimed {len(links)} links")
+        return links
+
+    def heartbeat(self, survey_id: str, worker_id: str) -> None:
+        conn = self._connect()
+        try:
+            conn.execute("UPDATE link_queue SET lease_expires = ? "
+                         "WHERE survey_id = ? AND worker_id = ? AND status = 'leased'",
+                         (time.time() + self.lease_seconds, survey_id, worker_id))
+        finally:
+            conn.close()
+
+    def mark_done(self, survey_id: str, links: List[str]) -> None:
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("UPDATE link_queue SET status = 'done', lease_expires = NULL "
+                             "WHERE survey_id = ? AND link = ?", [(survey_id, link) for link in links])
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def release(self, survey_id: str, worker_id: str) -> None:
+        conn = self._connect()
+        try:
+            conn.execute("UPDATE link_queue SET status = 'pending', worker_id = NULL, lease_expires = NULL "
+                         "WHERE survey_id = ? AND worker_id = ? AND status = 'leased'", (survey_id, worker_id))
+        finally:
+            conn.close()
+
+    def remaining(self, survey_id: str) -> int:
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT count(*) FROM link_queue WHERE survey_id = ? AND status != 'done'",
+                                (survey_id,)).fetchone()[0]
+        finally:
+            conn.close()
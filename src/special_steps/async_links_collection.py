@@ -3,20 +3,20 @@ Collecting links for a survey using asyncio
 """
 from src.utils.get_config import config
 from src.utils.setting_logger import Logger
-import aiohttp
 import asyncio
 from scrapy import Selector
-from typing import List, Optional
+from typing import Any, Callable, List, Optional
+from src.pipeline.scraping.http_backends import HttpBackendABC, get_http_backend
 
 logger = Logger(__name__).get_logger()
 
 
-async def fetch(session: aiohttp.ClientSession, url: str) -> str:
+async def fetch(client: HttpBackendABC, url: str) -> str:
     """
-    Asynchronously fetches the HTML content of a given URL using aiohttp.
+    Asynchronously fetches the HTML content of a given URL.
 
     Args:
-        session (aiohttp.ClientSession): The HTTP session to use for the request.
+        client (HttpBackendABC): The HTTP client to use for the request.
         url (str): The URL to fetch.
 
     Returns:
@@ -25,11 +25,11 @@ async def fetch(session: aiohttp.ClientSession, url: str) -> str:
     Raises:
         ValueError: If the request to the URL fails.
     """
-    async with session.get(url) as response:
-        if response.status == 200:
-            return await response.text()
-        else:
-            raise ValueError(f"Failed to fetch {url}: HTTP status {response.status}")
+    response = await client.get(url)
+    if response.status == 200:
+        return response.text
+    else:
+        raise ValueError(f"Failed to fetch {url}: HTTP status {response.status}")
 
 
 def get_links_list_from_response(response: str) -> List[str]:
@@ -48,38 +48,58 @@ def get_links_list_from_response(response: str) -> List[str]:
     return links_list
 
 
-async def scrape_offer_links(session: aiohttp.ClientSession, url: str) -> Optional[List[str]]:
+def get_n_pages_from_response(response: str) -> int:
+    """
+    Reads the number of pages of search results from the pagination of a search results page.
+
+    Args:
+        response (str): The HTML content of a search results page.
+
+    Returns:
+        int: The number of pages, 1 if the page has no pagination.
+    """
+    selector = Selector(text=response)
+    n_pages = selector.xpath("//nav[@data-cy='pagination']/a[3][@aria-label]//text()").get()
+    return int(n_pages) if n_pages is not None else 1
+
+
+async def scrape_offer_links(client: HttpBackendABC, url: str,
+                             parse_page: Callable[[str], List[Any]] = get_links_list_from_response
+                             ) -> Optional[List[Any]]:
     """
     Asynchronously scrapes offer links from a given URL.
 
     Args:
-        session (aiohttp.ClientSession): The HTTP session to use for the request.
+        client (HttpBackendABC): The HTTP client to use for the request.
         url (str): The URL to scrape for offer links.
+        parse_page (Callable[[str], List[Any]]): Function extracting links, or listing cards, from the page.
 
     Returns:
-        Optional[List[str]]: A list of offer links if found, otherwise None.
+        Optional[List[Any]]: A list of offer links if found, otherwise None.
     """
-    html = await fetch(session, url)
+    html = await fetch(client, url)
     if html is None:
         return None
         logger.info('html is none')
-    result = get_links_list_from_response(html)
+    result = parse_page(html)
     return result
 
 
-async def main(urls: List[str]) -> List[str]:
+async def main(urls: List[str],
+               parse_page: Callable[[str], List[Any]] = get_links_list_from_response) -> List[Any]:
     """
     Asynchronously processes a list of URLs to scrape offer links.
 
     Args:
         urls (List[str]): A list of URLs to scrape.
+        parse_page (Callable[[str], List[Any]]): Function extracting links, or listing cards, from a page.
 
     Returns:
         List[str]: A consolidated list of all scraped offer links.
     """
     results = []
-    async with aiohttp.ClientSession(headers=config.headers) as session:
-        tasks = [asyncio.create_task(scrape_offer_links(session, url)) for url in urls]
+    async with get_http_backend() as client:
+        tasks = [asyncio.create_task(scrape_offer_links(client, url, parse_page)) for url in urls]
 
         for task in asyncio.as_completed(tasks):
             try:
@@ -91,16 +111,18 @@ async def main(urls: List[str]) -> List[str]:
     return results
 
 
-def async_collect_links(n_pages: int) -> List[str]:
+def async_collect_links(n_pages: int,
+                        parse_page: Callable[[str], List[Any]] = get_links_list_from_response) -> List[Any]:
     """
     Collects offer links from multiple pages asynchronously.
 
     Args:
         n_pages (int): Number of pages to scrape.
+        parse_page (Callable[[str], List[Any]]): Function extracting links, or listing cards, from a page.
 
     Returns:
         List[str]: A list of all collected offer links.
     """
     urls = map(lambda x: config.base_link.format(x), range(1, n_pages))
-    results = asyncio.run(main(urls))
+    results = asyncio.run(main(urls, parse_page))
     return results
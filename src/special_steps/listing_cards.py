@@ -0,0 +1,93 @@
+"""
+Listing cards of search results pages, summary of every offer shown before opening its page.
+
+Cards are read from the `__NEXT_DATA__` JSON state of the search results page. Comparing them with cards
+from previous surveys tells which offers are new or changed, only those need their pages fetched.
+"""
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+
+from src.pipeline.scraping.payload_extraction import load_next_data
+from src.special_steps.async_links_collection import get_links_list_from_response
+
+CARD_FIELDS = ['price', 'area', 'n_rooms', 'location']
+ROOMS_NUMBERS = {'ONE': 1, 'TWO': 2, 'THREE': 3, 'FOUR': 4, 'FIVE': 5, 'SIX': 6, 'SEVEN': 7, 'EIGHT': 8,
+                 'NINE': 9, 'TEN': 10, 'MORE': 11}
+
+
+def get_cards_from_response(html: str) -> List[Dict[str, Any]]:
+    """
+    Extracts listing cards from a search results page.
+
+    Every link found on the page gets a card, fields of offers missing in the page state are None.
+
+    Args:
+        html (str): The HTML content of a search results page.
+
+    Returns:
+        List[Dict[str, Any]]: Cards with link, price, area, n_rooms, location and card_hash.
+    """
+    items = {f"/pl/oferta/{item['slug']}": item for item in get_search_items(html) if item.get('slug')}
+    cards = []
+    for link in get_links_list_from_response(html):
+        card = {'link': link, **parse_card(items.get(link, {}))}
+        card['card_hash'] = get_card_hash(card)
+        cards.append(card)
+    return cards
+
+
+def get_search_items(html: str) -> List[Dict[str, Any]]:
+    """
+    Returns offers listed in the `__NEXT_DATA__` state of a search results page.
+
+    Args:
+        html (str): The HTML content of a search results page.
+
+    Returns:
+        List[Dict[str, Any]]: Offers of the page, empty if the page has no valid state.
+    """
+    payload = load_next_data(html)
+    if payload is None:
+        return []
+    search_ads = (((payload.get('props') or {}).get('pageProps') or {}).get('data') or {}).get('searchAds') or {}
+    items = search_ads.get('items') or []
+    return [item for item in items if isinstance(item, dict)]
+
+
+def parse_card(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extracts card fields from an offer of the search results page state.
+
+    Args:
+        item (Dict[str, Any]): Offer from the page state.
+
+    Returns:
+        Dict[str, Any]: Price, area, number of rooms and location of the offer, None if missing.
+    """
+    price = (item.get('totalPrice') or {}).get('value')
+    address = (item.get('location') or {}).get('address') or {}
+    location_parts = [(address.get('street') or {}).get('name'), (address.get('city') or {}).get('name')]
+    location = ', '.join(part for part in location_parts if part) or None
+    return {
+        'price': float(price) if price is not None else None,
+        'area': float(item['areaInSquareMeters']) if item.get('areaInSquareMeters') is not None else None,
+        'n_rooms': ROOMS_NUMBERS.get(item.get('roomsNumber')),
+        'location': location,
+    }
+
+
+def get_card_hash(card: Dict[str, Any]) -> Optional[str]:
+    """
+    Returns hash of the card fields, used to detect changed offers.
+
+    Args:
+        card (Dict[str, Any]): Card of an offer.
+
+    Returns:
+        Optional[str]: Hash of the fields, None if the card has no fields, so it can't be compared.
+    """
+    values = [card.get(field) for field in CARD_FIELDS]
+    if all(value is None for value in values):
+        return None
+    return hashlib.sha1(json.dumps(values, ensure_ascii=False).encode('utf-8')).hexdigest()
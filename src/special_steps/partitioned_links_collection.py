@@ -0,0 +1,165 @@
+"""
+Collecting links of a survey split into disjoint price bands.
+
+The portal shows a limited number of search results pages, a city-wide query with more results can't be
+crawled completely. Price bands with results beyond the cap are split until they fit, and bands are crawled
+concurrently instead of walking one long page sequence. Offers without a price are not found by price bands.
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from src.special_steps.async_links_collection import fetch, get_links_list_from_response, get_n_pages_from_response
+from src.pipeline.scraping.http_backends import get_http_backend
+from src.utils.setting_logger import Logger
+
+logger = Logger(__name__).get_logger()
+
+
+@dataclass(frozen=True)
+class PricePartition:
+    """
+    Price band of offers, a sub-query of the survey.
+
+    Attributes:
+        price_min (int): Minimum price of offers in the band.
+        price_max (Optional[int]): Maximum price of offers in the band, None if unbounded.
+    """
+    price_min: int
+    price_max: Optional[int] = None
+
+    @classmethod
+    def from_bands(cls, bands: Sequence[Optional[int]]) -> List["PricePartition"]:
+        """
+        Creates partitions between consecutive band limits.
+
+        Args:
+            bands (Sequence[Optional[int]]): Increasing band limits, the last one can be None for no upper limit.
+
+        Returns:
+            List[PricePartition]: Partitions covering prices from the first to the last limit.
+        """
+        return [cls(price_min, price_max) for price_min, price_max in zip(bands[:-1], bands[1:])]
+
+    def url(self, base_link: str, page_num: int) -> str:
+        """
+        Returns URL of a search results page of the partition.
+
+        Args:
+            base_link (str): The base URL of search results pages, formatted with the page number.
+            page_num (int): Number of the page.
+
+        Returns:
+            str: URL of the page.
+        """
+        url = f"{base_link.format(page_num)}&priceMin={self.price_min}"
+        if self.price_max is not None:
+            url += f"&priceMax={self.price_max}"
+        return url
+
+    def can_split(self, min_band_width: int) -> bool:
+        """
+        Returns True if the band is wider than twice `min_band_width`, bands without upper limit can always be split.
+
+        Args:
+            min_band_width (int): Minimum width of a band.
+
+        Returns:
+            bool: If the band can be split.
+        """
+        return self.price_max is None or self.price_max - self.price_min >= 2 * min_band_width
+
+    def split(self) -> List["PricePartition"]:
+        """
+        Splits the band in halves, a band without upper limit is split at twice its minimum price.
+
+        Returns:
+            List[PricePartition]: Two partitions covering the band.
+        """
+        if self.price_max is None:
+            middle = max(2 * self.price_min, 1)
+        else:
+            middle = (self.price_min + self.price_max) // 2
+        return [PricePartition(self.price_min, middle), PricePartition(middle, self.price_max)]
+
+
+async def crawl_partitions(base_link: str, partitions: List[PricePartition],
+                           on_page: Callable[[str, List[Any]], Any],
+                           parse_page: Callable[[str], List[Any]] = get_links_list_from_response,
+                           max_in_flight: int = 8, page_cap: int = 100,
+                           min_band_width: int = 10000) -> Dict[PricePartition, int]:
+    """
+    Crawls partitions concurrently, partitions with `page_cap` or more pages are split and their halves crawled.
+
+    Args:
+        base_link (str): The base URL of search results pages, formatted with the page number.
+        partitions (List[PricePartition]): Partitions to crawl.
+        on_page (Callable[[str, List[Any]], Any]): Called with the URL and the results of each fetched page.
+        parse_page (Callable[[str], List[Any]]): Function extracting links, or listing cards, from a page.
+        max_in_flight (int): Maximum number of pages fetched at the same time, over all partitions.
+        page_cap (int): Number of pages the portal shows at most for a query.
+        min_band_width (int): Partitions are not split into bands narrower than this.
+
+    Returns:
+        Dict[PricePartition, int]: Number of pages collected in every crawled partition.
+    """
+    crawled: Dict[PricePartition, int] = {}
+    semaphore = asyncio.Semaphore(max_in_flight)
+    async with get_http_backend(max_connections=max_in_flight) as client:
+
+        async def collect_page(url: str, html: Optional[str] = None) -> None:
+            if html is None:
+                async with semaphore:
+                    html = await fetch(client, url)
+            on_page(url, parse_page(html))
+
+        async def crawl(partition: PricePartition) -> None:
+            url = partition.url(base_link, 1)
+            try:
+                async with semaphore:
+                    first_page = await fetch(client, url)
+            except Exception as e:
+                logger.info(f"Error during scraping of {url}: {e}")
+                return
+            n_pages = get_n_pages_from_response(first_page)
+            if n_pages >= page_cap and partition.can_split(min_band_width):
+                logger.info(f"Partition {partition} has {str(n_pages)} pages, splitting")
+                await asyncio.gather(*(crawl(part) for part in partition.split()))
+                return
+            if n_pages >= page_cap:
+                logger.warning(f"Partition {partition} reaches the pagination cap and can't be split, "
+                               f"some offers may be missed")
+            urls = [partition.url(base_link, page_num) for page_num in range(2, n_pages + 1)]
+            results = await asyncio.gather(collect_page(url, first_page), *(collect_page(url) for url in urls),
+                                           return_exceptions=True)
+            for page_url, result in zip([url] + urls, results):
+                if isinstance(result, Exception):
+                    logger.info(f"Error during scraping of {page_url}: {result}")
+            crawled[partition] = sum(not isinstance(result, Exception) for result in results)
+
+        await asyncio.gather(*(crawl(partition) for partition in partitions))
+    return crawled
+
+
+def collect_partitioned_links(base_link: str, partitions: List[PricePartition],
+                              on_page: Callable[[str, List[Any]], Any],
+                              parse_page: Callable[[str], List[Any]] = get_links_list_from_response,
+                              max_in_flight: int = 8, page_cap: int = 100,
+                              min_band_width: int = 10000) -> Dict[PricePartition, int]:
+    """
+    Collects offer links of all partitions, handing over the results page by page.
+
+    Args:
+        base_link (str): The base URL of search results pages, formatted with the page number.
+        partitions (List[PricePartition]): Partitions to crawl.
+        on_page (Callable[[str, List[Any]], Any]): Called with the URL and the results of each fetched page.
+        parse_page (Callable[[str], List[Any]]): Function extracting links, or listing cards, from a page.
+        max_in_flight (int): Maximum number of pages fetched at the same time, over all partitions.
+        page_cap (int): Number of pages the portal shows at most for a query.
+        min_band_width (int): Partitions are not split into bands narrower than this.
+
+    Returns:
+        Dict[PricePartition, int]: Number of pages collected in every crawled partition.
+    """
+    return asyncio.run(crawl_partitions(base_link, partitions, on_page, parse_page, max_in_flight, page_cap,
+                                        min_band_width))
@@ -0,0 +1,167 @@
+"""
+Streaming collection of links for a survey, search results pages are fetched through a bounded window
+and links of every page are handed over as soon as the page arrives.
+
+Links are saved page by page, so an interrupted collection keeps what it collected and scrapers
+(e.g. workers of the work queue) can start on the links before the last page is fetched.
+Incremental surveys sorted newest-first can stop paginating once pages contain only known links.
+"""
+import asyncio
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from src.special_steps.async_links_collection import get_links_list_from_response, scrape_offer_links
+from src.pipeline.scraping.http_backends import get_http_backend
+from src.utils.setting_logger import Logger
+
+logger = Logger(__name__).get_logger()
+
+
+class KnownPagesStopper:
+    """
+    Decides when to stop paginating newest-first results, after `patience` consecutive pages without unseen links.
+    Pages are counted in page order, also when they arrive out of order.
+
+    Attributes:
+        patience (int): Number of consecutive pages without unseen links after which pagination stops.
+        pages (Dict[int, bool]): Pages that arrived ahead of the next page in order, with whether they had unseen links.
+        next_page (int): Number of the next page to be counted.
+        n_known_in_row (int): Number of consecutive pages without unseen links counted so far.
+
+    Methods:
+        record(page_num, has_unseen): Records a fetched page.
+        should_stop(): Returns True if pagination should stop.
+    """
+    def __init__(self, patience: int, first_page_num: int = 1):
+        self.patience = patience
+        self.pages: Dict[int, bool] = {}
+        self.next_page = first_page_num
+        self.n_known_in_row = 0
+
+    def record(self, page_num: int, has_unseen: bool) -> None:
+        """
+        Records a fetched page, pages that failed should be recorded as having unseen links.
+
+        Args:
+            page_num (int): Number of the page.
+            has_unseen (bool): If the page had links not seen before.
+        """
+        self.pages[page_num] = has_unseen
+        while self.next_page in self.pages:
+            self.n_known_in_row = 0 if self.pages.pop(self.next_page) else self.n_known_in_row + 1
+            self.next_page += 1
+
+    def should_stop(self) -> bool:
+        """
+        Returns True if pagination should stop.
+
+        Returns:
+            bool: True after `patience` consecutive pages without unseen links.
+        """
+        return self.n_known_in_row >= self.patience
+
+
+async def cancel_tasks(tasks: Iterable[asyncio.Task]) -> None:
+    """
+    Cancels tasks and waits until they finish.
+
+    Args:
+        tasks (Iterable[asyncio.Task]): Tasks to cancel.
+    """
+    tasks = list(tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def stream_pages(urls: Iterable[str], on_page: Callable[[str, List[Any]], None],
+                       parse_page: Callable[[str], List[Any]] = get_links_list_from_response,
+                       max_in_flight: int = 8, should_stop: Optional[Callable[[], bool]] = None,
+                       on_error: Optional[Callable[[str], None]] = None) -> int:
+    """
+    Fetches search results pages keeping at most `max_in_flight` requests open and calls `on_page`
+    with the results of every page as soon as it arrives.
+
+    Args:
+        urls (Iterable[str]): URLs of the search results pages, consumed lazily.
+        on_page (Callable[[str, List[Any]], None]): Called with the URL and the results of each fetched page,
+            its exceptions cancel pages in flight and are raised.
+        parse_page (Callable[[str], List[Any]]): Function extracting links, or listing cards, from a page.
+        max_in_flight (int): Maximum number of pages fetched at the same time.
+        should_stop (Optional[Callable[[], bool]]): Checked after every page, if it returns True
+            no more pages are requested and pages in flight are cancelled.
+        on_error (Optional[Callable[[str], None]]): Called with the URL of every page that failed to be fetched.
+
+    Returns:
+        int: Number of pages fetched successfully.
+    """
+    urls = iter(urls)
+    n_pages = 0
+    async with get_http_backend(max_connections=max_in_flight) as client:
+        in_flight: Dict[asyncio.Task, str] = {}
+
+        def fill_window() -> None:
+            while len(in_flight) < max_in_flight:
+                url = next(urls, None)
+                if url is None:
+                    return
+                in_flight[asyncio.create_task(scrape_offer_links(client, url, parse_page))] = url
+
+        fill_window()
+        while in_flight:
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                url = in_flight.pop(task)
+                try:
+                    results = task.result()
+                except Exception as e:
+                    logger.info(f"Error during scraping of {url}: {e}")
+                    if on_error is not None:
+                        on_error(url)
+                    continue
+                try:
+                    on_page(url, results)
+                except Exception:
+                    # failed save of collected links stops the collection instead of being counted as a page error
+                    await cancel_tasks(in_flight)
+                    raise
+                n_pages += 1
+            if should_stop is not None and should_stop():
+                logger.info(f"Stopping pagination, cancelling {str(len(in_flight))} pages in flight")
+                await cancel_tasks(in_flight)
+                break
+            fill_window()
+    return n_pages
+
+
+def stream_collect_links(base_link: str, n_pages: int, on_page: Callable[[str, List[Any]], None],
+                         parse_page: Callable[[str], List[Any]] = get_links_list_from_response,
+                         first_page: Optional[str] = None, max_in_flight: int = 8,
+                         should_stop: Optional[Callable[[], bool]] = None,
+                         on_error: Optional[Callable[[str], None]] = None) -> int:
+    """
+    Collects offer links from pages 1 to `n_pages`, handing over the results page by page.
+
+    Args:
+        base_link (str): The base URL of search results pages, formatted with the page number.
+        n_pages (int): Number of pages to scrape.
+        on_page (Callable[[str, List[Any]], None]): Called with the URL and the results of each fetched page.
+        parse_page (Callable[[str], List[Any]]): Function extracting links, or listing cards, from a page.
+        first_page (Optional[str]): HTML of page 1 if already fetched, it is parsed instead of fetched again.
+        max_in_flight (int): Maximum number of pages fetched at the same time.
+        should_stop (Optional[Callable[[], bool]]): Checked after every page, if it returns True pagination stops.
+        on_error (Optional[Callable[[str], None]]): Called with the URL of every page that failed.
+
+    Returns:
+        int: Number of pages collected.
+    """
+    first_page_num = 1
+    n_collected = 0
+    if first_page is not None:
+        on_page(base_link.format(1), parse_page(first_page))
+        first_page_num = 2
+        n_collected = 1
+        if should_stop is not None and should_stop():
+            return n_collected
+    urls = (base_link.format(page_num) for page_num in range(first_page_num, n_pages + 1))
+    n_collected += asyncio.run(stream_pages(urls, on_page, parse_page, max_in_flight, should_stop, on_error))
+    return n_collected
@@ -3,20 +3,56 @@ This module creates Survey - entity that tracks each run of the scraping and pro
 links that will be processed in a given survey, are also determined here.
 """
 import datetime
-import sqlite3
-from typing import Optional
+import json
+from src.db.connection import get_connection
+from src.db.database_writer import DatabaseWriter, get_database_writer
+from typing import Any, Dict, List, Optional, Set
 import requests
-from scrapy import Selector
 import pandas as pd
 from src.utils.setting_logger import Logger
 from src.utils.get_config import config
-from src.special_steps.async_links_collection import async_collect_links
-from src.db.sql_code import survey_table_insert
+from src.special_steps.async_links_collection import (async_collect_links, get_links_list_from_response,
+                                                      get_n_pages_from_response)
+from src.special_steps.listing_cards import get_cards_from_response
+from src.special_steps.streaming_links_collection import KnownPagesStopper, stream_collect_links
+from src.special_steps.partitioned_links_collection import PricePartition, collect_partitioned_links
+from src.db.sql_code import (survey_table_insert, survey_links_insert, listing_cards_insert, listing_cards_last_known,
+                             seen_links_collected_upsert, seen_links_scraped_among)
+from src.db.offer_keys import get_survey_key
+from src.utils.links import normalize_link, offer_id_from_link
 
 logger = Logger(__name__).get_logger()
 
 
-def get_max_page_num(survey_type: str, max_page_num: int, base_link: str) -> int:
+def get_first_page(base_link: str) -> str:
+    """
+    Fetches the first search results page.
+
+    Args:
+        base_link (str): The base URL of search results pages.
+
+    Returns:
+        str: The HTML content of the first page.
+    """
+    response = requests.get(base_link.format(str(1)), headers=config.headers)
+    return response.text
+
+
+def get_search_page_urls(base_link: str, n_pages: int) -> List[str]:
+    """
+    Returns urls of search results pages of a survey, in the order they are collected.
+
+    Args:
+        base_link (str): The base URL of search results pages.
+        n_pages (int): Number of pages of the survey.
+
+    Returns:
+        List[str]: Urls of the pages.
+    """
+    return [base_link.format(str(page_num)) for page_num in range(n_pages)]
+
+
+def get_max_page_num(survey_type: str, max_page_num: int, base_link: str, first_page: Optional[str] = None) -> int:
     """
     Determines the maximum number of pages for a given survey.
 
@@ -27,6 +63,7 @@ def get_max_page_num(survey_type: str, max_page_num: int, base_link: str) -> int
         survey_type (str): The type of the survey, e.g., 'test'.
         max_page_num (int): The maximum number of pages to consider for 'test' survey types.
         base_link (str): The base URL used for fetching the number of pages.
+        first_page (Optional[str]): HTML of the first page if already fetched, it is not fetched again.
 
     Returns:
         int: The maximum number of pages to process in the survey.
@@ -34,11 +71,9 @@ def get_max_page_num(survey_type: str, max_page_num: int, base_link: str) -> int
     if survey_type == 'test' and max_page_num is not None:
         n_pages = max_page_num
     else:
-        url = base_link.format(str(1))
-        response = requests.get(url, headers=config.headers)
-        selector = Selector(response)
-        n_pages = selector.xpath("//nav[@data-cy='pagination']/a[3][@aria-label]//text()").get()
-        n_pages = int(n_pages)
+        if first_page is None:
+            first_page = get_first_page(base_link)
+        n_pages = get_n_pages_from_response(first_page)
     logger.info(f"Found {str(n_pages)} pages")
     return n_pages
 
@@ -60,26 +95,65 @@ class SurveyCreator:
         links (List[str]): List of offer links for the survey.
         df_out (Optional[pd.DataFrame]): DataFrame holding the output data.
         use_async_links_scraping (bool): if asynchronous scraping for link collection should be used.
+        use_listing_cards (bool): if listing cards (price, area, rooms, location) are collected with the links,
+            incremental surveys then also process known offers whose card changed.
+        cards (List[Dict[str, Any]]): Listing cards collected with the links.
+        first_page (Optional[str]): HTML of the first search results page, fetched to read the number of pages.
+        last_known_cards (Dict[str, str]): Card hash of every link from its most recent previous survey.
+        saved_links (Set[str]): Links saved to the database by streamed or partitioned collection.
+        early_stop_patience (Optional[int]): In streamed incremental surveys, results are sorted newest-first and
+            pagination stops after this many consecutive pages without unseen links, None crawls all pages.
+        writer (Optional[DatabaseWriter]): Writer thread of the database, None if links are written directly.
+        survey_key (Optional[int]): Integer key of the survey, created with the survey.
 
     Methods:
         get_survey_number(): Retrieves the survey number based on existing surveys.
         create_survey_in_table(): Creates a new survey record in the database.
         collect_links_list(): Collects links to real estate offers.
         clean_and_save_links_to_db(): Cleans and saves the collected links to the database.
+        stream_links_to_db(): Collects links and saves them to the database page by page.
+        partitioned_links_to_db(): Collects links of price partitions concurrently and saves them page by page.
+        save_page(url, results): Saves links and cards of a search results page.
+        load_previous_surveys(): Loads listing cards of previous surveys.
+        select_links(links, cards): Removes duplicated and, in incremental surveys, unchanged known links.
+        get_scraped_links(links): Returns links already scraped in previous surveys.
+        get_changed_links(cards): Returns links whose card differs from the one seen in previous surveys.
+        save_links_to_db(links): Saves links of the survey to the database.
+        save_seen_links(links): Records links collected in the survey in seen_links.
+        save_cards_to_db(cards): Saves listing cards of the survey to the database.
+        execute_many(statement, params): Writes rows through the database writer or directly.
+        wait_for_writes(): Waits until rows queued for the database writer are written.
     """
     def __init__(self, db: str, survey_type: str, location: str, max_page_num: Optional[int] = None):
         logger.info("Creating new survey")
         self.base_link = config.base_link
+        self.early_stop_patience = None
+        early_stop = config.get('incremental_early_stop')
+        if survey_type == 'incremental' and early_stop and early_stop.enabled:
+            self.early_stop_patience = early_stop.known_pages
+            self.base_link = self.base_link + early_stop.sort_params
         self.db = db
         self.survey_date = datetime.datetime.today().strftime('%Y-%m-%d')
         self.survey_type = survey_type
         self.location = location
-        self.n_pages = get_max_page_num(survey_type, max_page_num, self.base_link)
+        self.first_page = None
+        if survey_type != 'test' or max_page_num is None:
+            self.first_page = get_first_page(self.base_link)
+        self.n_pages = get_max_page_num(survey_type, max_page_num, self.base_link, self.first_page)
         self.survey_number = self.get_survey_number(self.survey_date, self.survey_type, self.location)
         self.survey_id = f"{self.survey_type}_{self.survey_date}_{self.location}_{str(self.survey_number)}"
         self.links = []
         self.df_out = None
         self.use_async_links_scraping = config.use_async_links_scraping
+        self.use_listing_cards = config.get('use_listing_cards', False)
+        self.cards = []
+        self.saved_links = set()
+        self.last_known_cards = {}
+        writer_params = config.get('database_writer')
+        self.writer: Optional[DatabaseWriter] = None
+        if writer_params and writer_params.enabled:
+            self.writer = get_database_writer(db)
+        self.survey_key: Optional[int] = None
         logger.info(f"Survey id generated: {self.survey_id}")
 
     def get_survey_number(self, survey_date: str, survey_type: str, location: str) -> int:
@@ -94,7 +168,7 @@ class SurveyCreator:
         Returns:
             int: survey number.
         """
-        with sqlite3.connect(self.db) as conn:
+        with get_connection(self.db) as conn:
                 try:
                     d = pd.read_sql_query(
                         f"SELECT survey_id FROM surveys where survey_date='{survey_date}' and survey_type='{survey_type}' and location='{location}';",
@@ -112,10 +186,11 @@ class SurveyCreator:
         logger.info(f"Creating survey in database")
         db_entry = (self.survey_id, self.survey_date, self.survey_type, self.location, self.n_pages)
 
-        with sqlite3.connect(self.db) as conn:
+        with get_connection(self.db) as conn:
             cur = conn.cursor()
             # insert records to db
             cur.execute(survey_table_insert, db_entry)
+            self.survey_key = get_survey_key(conn, self.survey_id)
             conn.commit()
         logger.info(f"Survey added successfully")
 
@@ -124,21 +199,22 @@ class SurveyCreator:
         Collects links to real estate offers to be processed in following steps.
         """
         logger.info(f"Collecting links to real estate offers")
+        parse_page = get_cards_from_response if self.use_listing_cards else get_links_list_from_response
         if self.use_async_links_scraping:
             logger.info(f"Using async to collect links from pages")
-            self.links = async_collect_links(self.n_pages)
+            results = async_collect_links(self.n_pages, parse_page)
         else:
-            for page_num in range(self.n_pages):
-                url = self.base_link.format(str(page_num))
+            results = []
+            for page_num, url in enumerate(get_search_page_urls(self.base_link, self.n_pages)):
                 logger.info(f"Visiting page with offers number {str(page_num)}, url: {url}")
 
                 response = requests.get(url, headers=config.headers)
-                selector = Selector(response)
-
-                listings = selector.xpath("//a[@data-cy='listing-item-link']/@href")
-
-                links_list = [listing.get() for listing in listings]
-                self.links.extend(links_list)
+                results.extend(parse_page(response.text))
+        if self.use_listing_cards:
+            self.cards = results
+            self.links = [card['link'] for card in results]
+        else:
+            self.links = results
         logger.info(f"Total number of links collected: {str(len(self.links))}")
 
     def clean_and_save_links_to_db(self):
@@ -146,24 +222,208 @@ class SurveyCreator:
        Removes duplicate and already processed links and saves the unique links to the database.
        """
         logger.info(f"Removing duplicated links")
-        links_unique = list(set(self.links))
         if self.survey_type == 'incremental':
-            logger.info(f"Incremental survey, removing links already present in scraped_offers")
-            with sqlite3.connect(self.db) as conn:
-                d = pd.read_sql_query("select distinct link from scraped_offers", conn)
-            d = d['link'].apply(lambda x: x.replace('https://www.otodom.pl/', ''))
-
-            links_unique = [item for item in links_unique if item not in d.values]
+            logger.info(f"Incremental survey, removing links already scraped")
+            self.load_previous_surveys()
+        links_unique = self.select_links(self.links, self.cards)
         logger.info(f"Number of links after processing: {str(len(links_unique))}")
         self.df_out = pd.DataFrame({'survey_id': [self.survey_id] * len(links_unique), 'link': links_unique})
         logger.info(f"Uploading links to database")
-        with sqlite3.connect(self.db) as conn:
-            self.df_out.to_sql('survey_links', conn, if_exists='append', index=False)
+        self.save_links_to_db(links_unique)
+        self.save_seen_links(self.links)
         logger.info(f"Links uploaded successfully")
+        if self.use_listing_cards:
+            self.save_cards_to_db(self.cards)
+        self.wait_for_writes()
 
+    def stream_links_to_db(self):
+        """
+        Collects links and saves them to the database as soon as each search results page arrives.
+        The first page fetched to read the number of pages is reused, at most `links_collection_window`
+        pages are fetched at the same time. With `early_stop_patience` pagination stops after that many
+        consecutive pages without unseen links.
+        """
+        logger.info(f"Streaming links to real estate offers to database")
+        if self.survey_type == 'incremental':
+            logger.info(f"Incremental survey, skipping links already scraped")
+            self.load_previous_surveys()
+        parse_page = get_cards_from_response if self.use_listing_cards else get_links_list_from_response
+        page_nums = {self.base_link.format(page_num): page_num for page_num in range(1, self.n_pages + 1)}
+        stopper = KnownPagesStopper(self.early_stop_patience) if self.early_stop_patience else None
+
+        def record_failed_page(url: str) -> None:
+            stopper.record(page_nums[url], True)
+
+        def save_page(url: str, results: List[Any]) -> None:
+            unseen = self.save_page(url, results)
+            if stopper is not None:
+                stopper.record(page_nums[url], bool(unseen))
 
+        n_pages = stream_collect_links(self.base_link, self.n_pages, save_page, parse_page, self.first_page,
+                                       config.get('links_collection_window', 8),
+                                       should_stop=stopper.should_stop if stopper else None,
+                                       on_error=record_failed_page if stopper else None)
+        self.wait_for_writes()
+        logger.info(f"Pages collected: {str(n_pages)}, links saved: {str(len(self.saved_links))}")
 
+    def partitioned_links_to_db(self):
+        """
+        Splits the search into price bands from `partitioned_links_collection`, bands with more pages than
+        the pagination cap are split further. Pages of all bands are fetched concurrently, within
+        `links_collection_window` requests, and links are saved to the database as each page arrives.
+        """
+        params = config.partitioned_links_collection
+        logger.info(f"Collecting links to real estate offers in price partitions")
+        if self.survey_type == 'incremental':
+            logger.info(f"Incremental survey, skipping links already scraped")
+            self.load_previous_surveys()
+        parse_page = get_cards_from_response if self.use_listing_cards else get_links_list_from_response
+        partitions = PricePartition.from_bands(params.price_bands)
+        crawled = collect_partitioned_links(self.base_link, partitions, self.save_page, parse_page,
+                                            config.get('links_collection_window', 8), params.page_cap,
+                                            params.min_band_width)
+        self.wait_for_writes()
+        logger.info(f"Partitions collected: {str(len(crawled))}, pages: {str(sum(crawled.values()))}, "
+                    f"links saved: {str(len(self.saved_links))}")
 
+    def save_page(self, url: str, results: List[Any]) -> Set[str]:
+        """
+        Saves links of a search results page that should be processed, and its listing cards.
 
+        Args:
+            url (str): URL of the page.
+            results (List[Any]): Links, or listing cards, extracted from the page.
 
+        Returns:
+            Set[str]: Saved links that were not saved from previous pages.
+        """
+        cards = results if self.use_listing_cards else []
+        links = [card['link'] for card in cards] if self.use_listing_cards else results
+        selected = self.select_links(links, cards)
+        self.save_links_to_db(selected)
+        self.save_seen_links(links)
+        if self.use_listing_cards:
+            self.save_cards_to_db(cards)
+        self.links.extend(links)
+        self.cards.extend(cards)
+        unseen = set(selected) - self.saved_links
+        self.saved_links.update(selected)
+        logger.info(f"Page {url}: {str(len(links))} links collected, {str(len(selected))} saved")
+        return unseen
+
+    def load_previous_surveys(self) -> None:
+        """
+        Loads card hashes of previous surveys, used to find known offers that changed.
+        """
+        if not self.use_listing_cards:
+            return
+        with get_connection(self.db) as conn:
+            self.last_known_cards = dict(conn.execute(listing_cards_last_known,
+                                                      {'survey_id': self.survey_id}).fetchall())
+
+    def select_links(self, links: List[str], cards: List[Dict[str, Any]]) -> List[str]:
+        """
+        Removes duplicated links, in incremental surveys also known links, unless their card changed.
+
+        Args:
+            links (List[str]): Collected links.
+            cards (List[Dict[str, Any]]): Listing cards collected with the links.
+
+        Returns:
+            List[str]: Links to be processed, in order of collection.
+        """
+        links_unique = list(dict.fromkeys(links))
+        if self.survey_type == 'incremental':
+            changed_links = self.get_changed_links(cards) if self.use_listing_cards else set()
+            logger.info(f"Known links with changed listing card: {str(len(changed_links))}")
+            scraped_links = self.get_scraped_links(links_unique)
+            links_unique = [item for item in links_unique if item not in scraped_links or item in changed_links]
+        return links_unique
+
+    def get_scraped_links(self, links: List[str]) -> Set[str]:
+        """
+        Returns links already scraped in previous surveys, looked up by the normalized link in seen_links.
+
+        Args:
+            links (List[str]): Collected links.
+
+        Returns:
+            Set[str]: Links, as given, that were already scraped.
+        """
+        normalized = {link: normalize_link(link) for link in links}
+        with get_connection(self.db) as conn:
+            rows = conn.execute(seen_links_scraped_among, {'links': json.dumps(list(normalized.values()))})
+            scraped = {row[0] for row in rows}
+        return {link for link, key in normalized.items() if key in scraped}
+
+    def get_changed_links(self, cards: List[Dict[str, Any]]) -> Set[str]:
+        """
+        Returns links whose card differs from the card seen in the most recent previous survey.
+        Links never seen before and cards without fields are not included.
+
+        Args:
+            cards (List[Dict[str, Any]]): Listing cards collected in this survey.
+
+        Returns:
+            Set[str]: Links of changed offers.
+        """
+        return {card['link'] for card in cards
+                if card['card_hash'] is not None and card['link'] in self.last_known_cards
+                and self.last_known_cards[card['link']] != card['card_hash']}
+
+    def save_links_to_db(self, links: List[str]) -> None:
+        """
+        Saves links of the survey to the database, links already saved for the survey are ignored.
+
+        Args:
+            links (List[str]): Links to be processed in the survey.
+        """
+        if self.survey_key is None:
+            with get_connection(self.db) as conn:
+                self.survey_key = get_survey_key(conn, self.survey_id)
+        self.execute_many(survey_links_insert, [(self.survey_id, link, offer_id_from_link(link), self.survey_key)
+                                                for link in links])
+
+    def save_seen_links(self, links: List[str]) -> None:
+        """
+        Records links collected in the survey in seen_links, with the survey date and number of surveys
+        each link appeared in.
+
+        Args:
+            links (List[str]): Collected links.
+        """
+        rows = [{'link': normalize_link(link), 'seen_at': self.survey_date, 'survey_id': self.survey_id}
+                for link in set(links)]
+        self.execute_many(seen_links_collected_upsert, rows)
+
+    def save_cards_to_db(self, cards: List[Dict[str, Any]]) -> None:
+        """
+        Saves listing cards of the survey to the database, they are compared with cards of the following surveys.
+
+        Args:
+            cards (List[Dict[str, Any]]): Listing cards collected in this survey.
+        """
+        rows = {card['link']: (self.survey_id, card['link'], card['price'], card['area'], card['n_rooms'],
+                               card['location'], card['card_hash']) for card in cards}
+        self.execute_many(listing_cards_insert, list(rows.values()))
+        logger.info(f"Listing cards uploaded: {str(len(rows))}")
+
+    def execute_many(self, statement: str, params: List[Any]) -> None:
+        """
+        Executes a statement for every parameter set, queued for the database writer if it is enabled,
+        so that survey creation doesn't compete with the writer for the database lock.
+
+        Args:
+            statement (str): SQL statement.
+            params (List[Any]): Parameters of every execution.
+        """
+        if self.writer is not None:
+            self.writer.execute_many(statement, params)
+            return
+        with get_connection(self.db) as conn:
+            conn.executemany(statement, params)
 
+    def wait_for_writes(self) -> None:
+        """Waits until the rows queued for the database writer are written, if the writer is enabled."""
+        if self.writer is not None:
+            self.writer.flush()
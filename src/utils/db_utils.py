@@ -1,4 +1,4 @@
-import sqlite3
+from src.db.connection import get_connection
 import pandas as pd
 
 from src.utils.exceptions import SurveyNotFoundException
@@ -18,7 +18,7 @@ def check_if_survey_exists(survey_id: str, db: str) -> None:
     Raises:
         SurveyNotFoundException: If the survey with the given ID does not exist in the database.
     """
-    with sqlite3.connect(db) as conn:
+    with get_connection(db) as conn:
         d = pd.read_sql_query(f"select count(*) survey from surveys where survey_id = '{survey_id}'", conn)
         if d['survey'].iloc[0] == 0:
             raise SurveyNotFoundException(f"Survey {survey_id} does not exist")
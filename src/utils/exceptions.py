@@ -16,3 +16,7 @@ class EmptySurveyException(Exception):
 
 class SurveyNotFoundException(Exception):
     pass
+
+
+class DatabaseWriterException(Exception):
+    pass
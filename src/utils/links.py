@@ -0,0 +1,60 @@
+"""
+Canonical form of offer links, links are stored as hrefs of search results pages in survey_links
+and as full URLs in scraped_offers, both normalize to the same key and the same integer offer id.
+"""
+import hashlib
+import re
+from urllib.parse import urlsplit
+
+OFFER_URL_PREFIX = 'https://www.otodom.pl/'
+BASE62_ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+OFFER_ID_PATTERN = re.compile(r'-ID([0-9A-Za-z]{1,10})$')
+
+
+def normalize_link(link: str) -> str:
+    """
+    Returns the path of an offer link without domain, leading slashes, query and fragment,
+    e.g. 'pl/oferta/flat-ID4nEKM' for '/pl/oferta/flat-ID4nEKM' and 'https://www.otodom.pl//pl/oferta/flat-ID4nEKM'.
+
+    Args:
+        link (str): Offer link, relative or absolute.
+
+    Returns:
+        str: Normalized link.
+    """
+    return urlsplit(link.strip()).path.lstrip('/')
+
+
+def offer_url(link: str) -> str:
+    """
+    Returns URL of an offer page for a link stored in survey_links.
+
+    Args:
+        link (str): Link as found on search results pages, e.g. '/pl/oferta/flat-ID4nEKM'.
+
+    Returns:
+        str: URL of the offer, as stored in scraped_offers.
+    """
+    return OFFER_URL_PREFIX + link
+
+
+def offer_id_from_link(link: str) -> int:
+    """
+    Returns integer id of an offer, the base62 '-ID...' token at the end of the link decoded to a positive number.
+    Links without the token get a negative id derived from the hash of the normalized link.
+
+    Args:
+        link (str): Offer link, relative or absolute.
+
+    Returns:
+        int: Offer id, the same for every form of the link.
+    """
+    normalized = normalize_link(link)
+    match = OFFER_ID_PATTERN.search(normalized)
+    if match is not None:
+        offer_id = 0
+        for char in match.group(1):
+            offer_id = offer_id * 62 + BASE62_ALPHABET.index(char)
+        return offer_id
+    digest = hashlib.blake2b(normalized.encode('utf-8'), digest_size=8).digest()
+    return -(int.from_bytes(digest, 'big') >> 2) - 1
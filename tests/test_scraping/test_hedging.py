@@ -0,0 +1,80 @@
+import asyncio
+import time
+import pytest
+
+from src.pipeline.scraping.hedging import LatencyTracker, get_with_hedging
+from src.pipeline.scraping.http_backends import HttpResponse
+
+
+class FakeClient:
+    """Client answering requests after the given delays, in the order of requests."""
+    def __init__(self, delays, fail=()):
+        self.delays = list(delays)
+        self.fail = set(fail)
+        self.n_requests = 0
+        self.cancelled = 0
+
+    async def get(self, url, headers=None):
+        number = self.n_requests
+        self.n_requests += 1
+        try:
+            await asyncio.sleep(self.delays[number])
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if number in self.fail:
+            raise ConnectionError(f"request {number} failed")
+        return HttpResponse(200, {}, f"response {number}")
+
+
+def warmed_up_tracker(latency=0.01):
+    tracker = LatencyTracker(quantile=0.95, min_samples=5, min_delay=0.05)
+    for _ in range(5):
+        tracker.record(latency)
+    return tracker
+
+
+class TestLatencyTracker:
+    def test_no_hedging_before_min_samples(self):
+        tracker = LatencyTracker(min_samples=3)
+        tracker.record(1.0)
+        assert tracker.hedge_delay() is None
+
+    def test_quantile(self):
+        tracker = LatencyTracker(quantile=0.9, min_samples=1, min_delay=0)
+        for latency in range(1, 101):
+            tracker.record(latency / 100)
+        assert tracker.hedge_delay() == 0.91
+
+    def test_min_delay(self):
+        assert warmed_up_tracker(0.001).hedge_delay() == 0.05
+
+
+class TestGetWithHedging:
+    def test_fast_response_not_hedged(self):
+        client = FakeClient([0.0])
+        tracker = warmed_up_tracker()
+        response = asyncio.run(get_with_hedging(client, 'url', None, tracker))
+        assert response.text == 'response 0'
+        assert client.n_requests == 1
+        assert tracker.n_hedged == 0
+
+    def test_hedge_wins_over_hung_request(self):
+        client = FakeClient([10.0, 0.0])
+        tracker = warmed_up_tracker()
+        start = time.monotonic()
+        response = asyncio.run(get_with_hedging(client, 'url', None, tracker))
+        assert time.monotonic() - start < 1
+        assert response.text == 'response 1'
+        assert (tracker.n_hedged, tracker.n_hedge_wins) == (1, 1)
+        assert client.cancelled == 1
+
+    def test_failed_request_waits_for_other(self):
+        client = FakeClient([0.1, 0.2], fail={0})
+        response = asyncio.run(get_with_hedging(client, 'url', None, warmed_up_tracker()))
+        assert response.text == 'response 1'
+
+    def test_both_failed(self):
+        client = FakeClient([0.1, 0.0], fail={0, 1})
+        with pytest.raises(ConnectionError):
+            asyncio.run(get_with_hedging(client, 'url', None, warmed_up_tracker()))
@@ -0,0 +1,94 @@
+import sqlite3
+
+import pytest
+from pathlib import Path
+
+from src.db.connection import close_connections
+from src.db.sqlite_creation import create_sqlite_db
+from src.pipeline.scraping.html_archive import HtmlArchive
+from src.pipeline.scraping.replay_scraping import ReplayScraper, replay_offer
+from src.utils.get_config import config
+
+link = 'https://www.otodom.pl/pl/oferta/mieszkanie-ID4abc'
+
+
+@pytest.fixture
+def html_content():
+    html_file_path = Path(__file__).parent / "example_htmls/example_html_1.txt"
+    with open(html_file_path, 'r', encoding='utf-8') as file:
+        return file.read()
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return HtmlArchive(tmp_path / "archive", compression_level=1)
+
+
+class TestHtmlArchive:
+    def test_round_trip(self, archive, html_content):
+        archive.save('survey_1', link, html_content)
+        assert archive.exists('survey_1', link)
+        assert archive.load('survey_1', link) == html_content
+
+    def test_missing_page(self, archive):
+        assert not archive.exists('survey_1', link)
+        assert archive.load('survey_1', link) is None
+
+    def test_pages_separated_by_survey(self, archive):
+        archive.save('survey_1', link, '<html>1</html>')
+        archive.save('survey_2', link, '<html>2</html>')
+        assert archive.load('survey_1', link) == '<html>1</html>'
+        assert archive.load('survey_2', link) == '<html>2</html>'
+
+    def test_overwrite_leaves_no_temp_files(self, archive):
+        archive.save('survey_1', link, '<html>old</html>')
+        archive.save('survey_1', link, '<html>new</html>')
+        path = archive.get_path('survey_1', link)
+        assert archive.load('survey_1', link) == '<html>new</html>'
+        assert [p.name for p in path.parent.iterdir()] == [path.name]
+
+
+    def test_copy_previous(self, archive):
+        assert not archive.copy_previous('survey_2', link, 'survey_1')
+        archive.save('survey_1', link, '<html>1</html>')
+        assert archive.copy_previous('survey_2', link, 'survey_1')
+        assert archive.load('survey_2', link) == '<html>1</html>'
+        assert archive.copy_previous('survey_2', link, 'survey_2')
+        assert not archive.copy_previous('survey_3', link, 'survey_0')
+
+
+class TestReplayOffer:
+    def test_archived_page(self, archive, html_content):
+        archive.save('survey_1', link, html_content)
+        result, path = replay_offer(archive, 'survey_1', link)
+        assert result['link'] == link
+        assert path in ('payload', 'lxml', 'selectors')
+
+    def test_missing_page(self, archive):
+        assert replay_offer(archive, 'survey_1', link) == (None, None)
+
+
+def test_replay_keeps_offers_without_archived_page(tmp_path, monkeypatch, html_content):
+    monkeypatch.setitem(config, 'html_archive_dir', str(tmp_path / "archive"))
+    monkeypatch.setitem(config, 'replay_workers', 0)
+    monkeypatch.setitem(config, 'use_validator_cache', False)
+    monkeypatch.setitem(config.database_writer, 'enabled', False)
+    db = str(tmp_path / 'replay.db')
+    create_sqlite_db(db)
+    not_archived = 'https://www.otodom.pl/pl/oferta/kawalerka-ID4abd'
+    with sqlite3.connect(db) as conn:
+        conn.executemany("INSERT INTO survey_links (survey_id, link) VALUES ('survey_1', ?)",
+                         [('pl/oferta/mieszkanie-ID4abc',), ('pl/oferta/kawalerka-ID4abd',)])
+        conn.executemany("INSERT INTO scraped_offers (survey_id, link, title) VALUES ('survey_1', ?, 'old')",
+                         [(link,), (not_archived,)])
+    HtmlArchive(tmp_path / "archive", compression_level=1).save('survey_1', link, html_content)
+
+    scraper = ReplayScraper(db, 'survey_1')
+    scraper.execute_step()
+    close_connections()
+
+    assert scraper.n_missing == 1
+    with sqlite3.connect(db) as conn:
+        titles = dict(conn.execute("SELECT link, title FROM scraped_offers").fetchall())
+    assert titles[not_archived] == 'old'
+    assert titles[link] != 'old'
@@ -0,0 +1,101 @@
+import asyncio
+import socket
+import pytest
+from aiohttp import web
+
+from src.pipeline.scraping.async_scraping import main
+import time
+from src.pipeline.scraping.http_backends import AiohttpBackend, HttpxBackend, Timeouts, get_http_backend
+from src.utils.get_config import config
+
+
+@pytest.fixture
+def port():
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+async def serve(port, coro):
+    async def offer(request):
+        if request.path.startswith('/slow'):
+            await asyncio.sleep(2)
+        if request.path == '/missing':
+            return web.Response(status=404, text='not found')
+        return web.Response(text=f'<html><h1 data-cy="adPageAdTitle">{request.headers.get("X-Test")}</h1></html>',
+                            content_type='text/html', headers={'ETag': '"abc"'})
+
+    app = web.Application()
+    app.router.add_get('/{name}', offer)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, 'localhost', port).start()
+    try:
+        return await coro
+    finally:
+        await runner.cleanup()
+
+
+async def get_both(backend, port):
+    async with backend as client:
+        ok = await client.get(f'http://localhost:{port}/offer', headers={'X-Test': 'value'})
+        missing = await client.get(f'http://localhost:{port}/missing')
+    return ok, missing
+
+
+class TestHttpBackends:
+    @pytest.mark.parametrize('backend', [AiohttpBackend, HttpxBackend])
+    def test_get(self, port, backend):
+        ok, missing = asyncio.run(serve(port, get_both(backend({'X-Test': 'default'}), port)))
+        assert ok.status == 200
+        assert ok.headers['ETag'] == '"abc"'
+        assert 'value' in ok.text
+        assert missing.status == 404
+        assert missing.text == 'not found'
+
+    @pytest.mark.parametrize('name', ['aiohttp', 'httpx'])
+    def test_scraping_with_backend(self, port, name, monkeypatch):
+        monkeypatch.setitem(config, 'http_backend', name)
+        results = asyncio.run(serve(port, main([f'http://localhost:{port}/offer-{i}' for i in range(5)],
+                                               max_concurrency=2)))
+        assert sorted(result['link'] for result in results) == [f'http://localhost:{port}/offer-{i}'
+                                                                for i in range(5)]
+
+    @pytest.mark.parametrize('backend', [AiohttpBackend, HttpxBackend])
+    @pytest.mark.parametrize('method', ['HEAD', 'GET'])
+    def test_get_status(self, port, backend, method):
+        async def get_statuses():
+            async with backend() as client:
+                return (await client.get_status(f'http://localhost:{port}/offer', method),
+                        await client.get_status(f'http://localhost:{port}/missing', method))
+
+        ok, missing = asyncio.run(serve(port, get_statuses()))
+        assert (ok.status, ok.text, ok.headers['ETag']) == (200, '', '"abc"')
+        assert missing.status == 404
+
+    @pytest.mark.parametrize('backend', [AiohttpBackend, HttpxBackend])
+    def test_read_timeout(self, port, backend):
+        async def get_slow():
+            async with backend(timeouts=Timeouts(connect=1, read=0.2, total=1)) as client:
+                start = time.monotonic()
+                try:
+                    await client.get(f'http://localhost:{port}/slow')
+                except asyncio.TimeoutError:
+                    return time.monotonic() - start
+
+        assert asyncio.run(serve(port, get_slow())) < 1
+
+    def test_time_budget(self, port):
+        async def scrape():
+            urls = [f'http://localhost:{port}/offer-{i}' for i in range(3)] + [f'http://localhost:{port}/slow-1']
+            start = time.monotonic()
+            results = await main(urls, time_budget=0.5)
+            return results, time.monotonic() - start
+
+        results, elapsed = asyncio.run(serve(port, scrape()))
+        assert elapsed < 1
+        assert len(results) == 3
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError):
+            get_http_backend('urllib')
@@ -0,0 +1,167 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.db.sql_code import seen_links_collected_upsert, seen_links_scraped_upsert
+from src.db.sqlite_creation import create_sqlite_db
+from src.pipeline.scraping.liveness_checking import ListingLivenessChecker, check_links, classify_status
+from src.utils.get_config import config
+
+requests_log = []
+
+
+class LivenessHandler(BaseHTTPRequestHandler):
+    """
+    Offers 'live' are online, 'gone' return 404, 'moved' redirect to search results, 'nohead' refuse HEAD,
+    'slow' are online after a delay.
+    """
+    def respond(self, with_body):
+        requests_log.append((self.command, self.path))
+        if 'slow' in self.path:
+            time.sleep(0.5)
+        if 'nohead' in self.path and self.command == 'HEAD':
+            self.send_error(405)
+            return
+        if 'gone' in self.path:
+            self.send_error(404)
+            return
+        if 'moved' in self.path:
+            self.send_response(301)
+            self.send_header('Location', '/pl/wyniki/sprzedaz/mieszkanie/warszawa')
+            self.end_headers()
+            return
+        body = b'<html>' + b'x' * 100000 + b'</html>'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if with_body:
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.respond(with_body=False)
+
+    def do_GET(self):
+        self.respond(with_body=True)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    requests_log.clear()
+    server = ThreadingHTTPServer(('localhost', 0), LivenessHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://localhost:{server.server_address[1]}/'
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = str(tmp_path / "test.db")
+    create_sqlite_db(db)
+    links = ['pl/oferta/live-ID1', 'pl/oferta/gone-ID2', 'pl/oferta/moved-ID3', 'pl/oferta/nohead-ID4']
+    with sqlite3.connect(db) as conn:
+        conn.executemany(seen_links_scraped_upsert, [{'link': link, 'seen_at': '2024-01-01 00:00:00',
+                                                      'survey_id': 'survey_1'} for link in links])
+    return db
+
+
+@pytest.fixture
+def liveness_config(monkeypatch):
+    monkeypatch.setitem(config, 'liveness_check', {'concurrency': 4, 'method': 'HEAD', 'flush_batch_size': 2,
+                                                   'rate_limit': None})
+
+
+def run_checker(db, server, survey_id):
+    checker = ListingLivenessChecker(db, survey_id)
+    checker.load_previous_step_data()
+    checker.links = [server + link.split('otodom.pl/')[1] for link in checker.links]
+    checker.process()
+    checker.upload_results_to_db()
+    return checker
+
+
+def get_statuses(db):
+    with sqlite3.connect(db) as conn:
+        return {row[0]: row[1:] for row in conn.execute(
+            "SELECT link, status, status_code, removed_at IS NOT NULL FROM listing_status")}
+
+
+class TestClassifyStatus:
+    def test_statuses(self):
+        link = 'https://www.otodom.pl/pl/oferta/flat-ID4nEKM'
+        assert classify_status(link, 200) == 'active'
+        assert classify_status(link, 404) == 'removed'
+        assert classify_status(link, 410) == 'removed'
+        assert classify_status(link, 301, '/pl/wyniki/sprzedaz/mieszkanie') == 'removed'
+        assert classify_status(link, 301, 'https://www.otodom.pl/pl/oferta/new-title-ID4nEKM') == 'active'
+        assert classify_status(link, 503) == 'error'
+
+
+class TestCheckLinks:
+    def test_slow_listing_does_not_hold_up_others(self, server):
+        urls = [server + 'pl/oferta/slow-ID1'] + [server + f'pl/oferta/live-ID{i}' for i in range(2, 8)]
+        results = []
+        asyncio.run(check_links(urls, results.append, max_concurrency=2))
+        assert len(results) == 7
+        assert results[-1]['link'] == 'pl/oferta/slow-ID1'
+        assert all(result['status'] == 'active' for result in results)
+
+    def test_results_handed_over_outside_event_loop(self, server):
+        threads = set()
+        asyncio.run(check_links([server + 'pl/oferta/live-ID1'], lambda result: threads.add(threading.get_ident())))
+        assert threads and threading.get_ident() not in threads
+
+
+class TestListingLivenessChecker:
+    def test_statuses_recorded(self, db, server, liveness_config):
+        checker = run_checker(db, server, 'survey_2')
+        assert get_statuses(db) == {'pl/oferta/live-ID1': ('active', 200, 0),
+                                    'pl/oferta/gone-ID2': ('removed', 404, 1),
+                                    'pl/oferta/moved-ID3': ('removed', 301, 1),
+                                    'pl/oferta/nohead-ID4': ('active', 200, 0)}
+        assert checker.status_counts == {'active': 2, 'removed': 2}
+        assert ('GET', '/pl/oferta/nohead-ID4') in requests_log
+        assert all(method == 'HEAD' for method, path in requests_log if 'nohead' not in path)
+
+    def test_removed_listings_not_checked_again(self, db, server, liveness_config):
+        run_checker(db, server, 'survey_2')
+        with sqlite3.connect(db) as conn:
+            first_removed_at = conn.execute("SELECT removed_at FROM listing_status "
+                                            "WHERE link = 'pl/oferta/gone-ID2'").fetchone()[0]
+        requests_log.clear()
+        checker = run_checker(db, server, 'survey_3')
+        assert len(checker.links) == 2
+        assert not any('gone' in path or 'moved' in path for method, path in requests_log)
+        with sqlite3.connect(db) as conn:
+            assert conn.execute("SELECT removed_at FROM listing_status "
+                                "WHERE link = 'pl/oferta/gone-ID2'").fetchone()[0] == first_removed_at
+
+    def test_relisted_listing_becomes_active(self, db, server, liveness_config):
+        with sqlite3.connect(db) as conn:
+            conn.execute("INSERT INTO listing_status (link, status, status_code, checked_at, removed_at) "
+                         "VALUES ('pl/oferta/live-ID1', 'error', 503, '2024-01-01', '2023-12-01')")
+        run_checker(db, server, 'survey_2')
+        assert get_statuses(db)['pl/oferta/live-ID1'] == ('active', 200, 0)
+
+    def test_get_method_aborts_body(self, db, server, liveness_config, monkeypatch):
+        monkeypatch.setitem(config.liveness_check, 'method', 'GET')
+        run_checker(db, server, 'survey_2')
+        assert get_statuses(db)['pl/oferta/live-ID1'] == ('active', 200, 0)
+        assert all(method == 'GET' for method, path in requests_log)
+
+    def test_links_of_current_survey_not_checked(self, db, liveness_config):
+        with sqlite3.connect(db) as conn:
+            conn.execute(seen_links_collected_upsert, {'link': 'pl/oferta/live-ID1', 'seen_at': '2024-01-02',
+                                                       'survey_id': 'survey_2'})
+        checker = ListingLivenessChecker(db, 'survey_2')
+        checker.load_previous_step_data()
+        assert len(checker.links) == 3
+        assert not any('live-ID1' in link for link in checker.links)
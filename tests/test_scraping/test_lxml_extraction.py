@@ -0,0 +1,61 @@
+import pytest
+from pathlib import Path
+
+from src.pipeline.scraping.scraping_funcs import extract_info_from_response, extract_info_with_selectors
+from src.pipeline.scraping.lxml_extraction import extract_info_with_lxml
+from src.utils.get_config import config
+
+example_htmls_directory = Path(__file__).parent / "example_htmls"
+
+synthetic_htmls = [
+    # document without elements
+    '   ',
+    # value given as a tail of a child element
+    '<html><body><div aria-label="Czynsz"><img/><div>x</div><div><div><span>a</span>1 200 zł</div></div></div>'
+    '</body></html>',
+    # only the first value div is read
+    '<html><body><div aria-label="Okna"><div>x</div><div><div><span>a</span></div><div>plastikowe</div></div></div>'
+    '</body></html>',
+    # first matching region without value, second one with value
+    '<html><body><div aria-label="Piętro"><div>x</div></div>'
+    '<div aria-label="Piętro"><div>x</div><div><div>2/4</div></div></div></body></html>',
+    # number of rooms with style inside and description with comments and scripts
+    '<html><body><div aria-label="Liczba pokoi"><div>x</div><div><div class="css-1wi2w6s enb64yk5">'
+    '<style>.a{color:red}</style><a> 3 </a></div></div></div>'
+    '<div class="css-1wekrze e1lbnp621"><p>Nice <b>flat</b></p><!-- comment --><script>var a;</script> end</div>'
+    '</body></html>',
+    # number of rooms region without value and header fields
+    '<html><body><h1 data-cy="adPageAdTitle">Title</h1><strong data-cy="adPageHeaderPrice">500 000 zł</strong>'
+    '<a aria-label="Adres">Mokotów, Warszawa</a><div aria-label="Cena za metr kwadratowy">10 000 zł/m²</div>'
+    '<div aria-label="Liczba pokoi"><div>x</div></div></body></html>',
+]
+
+
+@pytest.fixture(params=sorted(example_htmls_directory.glob("*.txt")), ids=lambda path: path.stem)
+def example_html(request):
+    with open(request.param, 'r', encoding='utf-8') as file:
+        return file.read()
+
+
+class TestLxmlExtractionParity:
+    def test_example_htmls(self, example_html):
+        url = "http://example.com"
+        assert extract_info_with_lxml(example_html, url) == extract_info_with_selectors(example_html, url)
+
+    @pytest.mark.parametrize("html", synthetic_htmls)
+    def test_synthetic_htmls(self, html):
+        url = "http://example.com"
+        assert extract_info_with_lxml(html, url) == extract_info_with_selectors(html, url)
+
+    @pytest.mark.parametrize("html", [None, '', 1])
+    def test_invalid_input(self, html):
+        with pytest.raises(ValueError):
+            extract_info_with_lxml(html, "http://example.com")
+
+    def test_engine_selection(self, example_html, monkeypatch):
+        monkeypatch.setitem(config, 'use_payload_extraction', False)
+        url = "http://example.com"
+        assert (extract_info_from_response(example_html, url, engine='lxml')
+                == extract_info_from_response(example_html, url, engine='selectors'))
+        with pytest.raises(ValueError):
+            extract_info_from_response(example_html, url, engine='unknown')
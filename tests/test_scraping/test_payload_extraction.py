@@ -0,0 +1,85 @@
+import pytest
+from pathlib import Path
+
+from src.pipeline.scraping.payload_extraction import extract_info_from_payload, load_next_data
+from src.pipeline.scraping.lxml_extraction import extract_info_with_lxml
+from src.pipeline.scraping.scraping_funcs import extract_info_with_path, extraction_path_counts, \
+    extract_info_from_response
+from src.utils.data_cleaning_funcs import convert_col_to_num
+from src.utils.get_config import config
+
+numeric_keys = ['price', 'sq_m_price', 'area', 'rent', 'n_rooms']
+
+
+@pytest.fixture
+def html_content():
+    html_file_path = Path(__file__).parent / "example_htmls/example_html_1.txt"
+    with open(html_file_path, 'r', encoding='utf-8') as file:
+        return file.read()
+
+
+@pytest.fixture
+def invalid_html_content():
+    html_file_path = Path(__file__).parent / "example_htmls/invalid_html_1.txt"
+    with open(html_file_path, 'r', encoding='utf-8') as file:
+        return file.read()
+
+
+@pytest.fixture
+def payload_extraction(monkeypatch):
+    monkeypatch.setitem(config, 'use_payload_extraction', True)
+
+
+class TestExtractInfoFromPayload:
+    def test_same_keys_as_html(self, html_content):
+        url = "http://example.com"
+        assert extract_info_from_payload(html_content, url).keys() == extract_info_with_lxml(html_content, url).keys()
+
+    def test_values_match_html(self, html_content):
+        url = "http://example.com"
+        from_payload = extract_info_from_payload(html_content, url)
+        from_html = extract_info_with_lxml(html_content, url)
+        for key in from_html:
+            if key in numeric_keys:
+                assert convert_col_to_num(from_payload[key]) == pytest.approx(convert_col_to_num(from_html[key]))
+            else:
+                assert from_payload[key] == from_html[key], key
+
+    def test_numbers_are_typed(self, html_content):
+        result = extract_info_from_payload(html_content, "http://example.com")
+        assert result['price'] == pytest.approx(1999999)
+        assert result['area'] == pytest.approx(97.43)
+        assert result['n_rooms'] == 4
+
+    def test_inactive_advert(self, invalid_html_content):
+        assert extract_info_from_payload(invalid_html_content, "http://example.com") is None
+
+    def test_missing_payload(self):
+        assert extract_info_from_payload("<html><body><h1>no payload</h1></body></html>", "http://example.com") is None
+
+    def test_malformed_payload(self):
+        html = '<html><script id="__NEXT_DATA__" type="application/json">{"props": </script></html>'
+        assert extract_info_from_payload(html, "http://example.com") is None
+
+    def test_load_next_data(self):
+        html = '<html><script id="__NEXT_DATA__" type="application/json">{"props": {}}</script></html>'
+        assert load_next_data(html) == {'props': {}}
+        assert load_next_data('<html></html>') is None
+
+
+class TestExtractionPath:
+    def test_payload_path(self, html_content, payload_extraction):
+        _, path = extract_info_with_path(html_content, "http://example.com")
+        assert path == 'payload'
+
+    def test_fallback_to_html(self, invalid_html_content, payload_extraction):
+        result, path = extract_info_with_path(invalid_html_content, "http://example.com", engine='lxml')
+        assert path == 'lxml'
+        assert result['title'] is None
+
+    def test_paths_counted(self, html_content, invalid_html_content, payload_extraction):
+        counts_before = extraction_path_counts.copy()
+        extract_info_from_response(html_content, "http://example.com")
+        extract_info_from_response(invalid_html_content, "http://example.com", engine='lxml')
+        assert extraction_path_counts['payload'] == counts_before['payload'] + 1
+        assert extraction_path_counts['lxml'] == counts_before['lxml'] + 1
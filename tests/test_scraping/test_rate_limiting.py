@@ -0,0 +1,69 @@
+import asyncio
+import time
+import pytest
+
+from src.pipeline.scraping.rate_limiting import AdaptiveRateLimiter, TokenBucket
+
+url = "https://www.otodom.pl/pl/oferta/example"
+
+
+@pytest.fixture
+def rate_limiter():
+    return AdaptiveRateLimiter(rate=2.0, burst=2.0, min_rate=0.5, max_rate=3.0,
+                               backoff_factor=0.5, recovery_step=0.5, cooldown=0.0)
+
+
+class TestTokenBucket:
+    def test_burst_is_not_delayed(self):
+        async def acquire_burst():
+            bucket = TokenBucket(rate=1.0, capacity=3.0)
+            start = time.monotonic()
+            for _ in range(3):
+                await bucket.acquire()
+            return time.monotonic() - start
+
+        assert asyncio.run(acquire_burst()) < 0.1
+
+    def test_rate_is_respected_after_burst(self):
+        async def acquire_over_burst():
+            bucket = TokenBucket(rate=20.0, capacity=1.0)
+            start = time.monotonic()
+            for _ in range(3):
+                await bucket.acquire()
+            return time.monotonic() - start
+
+        assert asyncio.run(acquire_over_burst()) >= 0.09
+
+
+class TestAdaptiveRateLimiter:
+    def test_bucket_per_host(self, rate_limiter):
+        rate_limiter.report(url, 200)
+        rate_limiter.report("https://example.com/page", 200)
+        assert set(rate_limiter.buckets.keys()) == {"www.otodom.pl", "example.com"}
+
+    @pytest.mark.parametrize("status", [403, 429, 500, 503])
+    def test_backoff(self, rate_limiter, status):
+        rate_limiter.report(url, status)
+        assert rate_limiter.buckets["www.otodom.pl"].rate == pytest.approx(1.0)
+        assert rate_limiter.n_backoffs == 1
+
+    def test_backoff_bounded_by_min_rate(self, rate_limiter):
+        for _ in range(5):
+            rate_limiter.report(url, 429)
+        assert rate_limiter.buckets["www.otodom.pl"].rate == pytest.approx(0.5)
+
+    def test_recovery_bounded_by_max_rate(self, rate_limiter):
+        rate_limiter.report(url, 429)
+        rate_limiter.report(url, 200)
+        assert rate_limiter.buckets["www.otodom.pl"].rate == pytest.approx(1.5)
+        for _ in range(5):
+            rate_limiter.report(url, 200)
+        assert rate_limiter.buckets["www.otodom.pl"].rate == pytest.approx(3.0)
+
+    def test_not_found_does_not_change_rate(self, rate_limiter):
+        rate_limiter.report(url, 404)
+        assert rate_limiter.buckets["www.otodom.pl"].rate == pytest.approx(2.0)
+
+    def test_retry_after_extends_cooldown(self, rate_limiter):
+        rate_limiter.report(url, 429, retry_after='30')
+        assert rate_limiter.buckets["www.otodom.pl"].blocked_until > time.monotonic() + 25
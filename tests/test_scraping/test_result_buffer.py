@@ -0,0 +1,41 @@
+import pytest
+
+from src.pipeline.scraping.result_buffer import ResultBuffer
+
+
+class TestResultBuffer:
+    def test_flush_on_full_batch(self):
+        batches = []
+        buffer = ResultBuffer(batches.append, batch_size=2)
+        for i in range(5):
+            buffer.add({'link': str(i)})
+        assert [len(batch) for batch in batches] == [2, 2]
+        buffer.flush()
+        assert [len(batch) for batch in batches] == [2, 2, 1]
+        assert buffer.n_flushed == 5
+
+    def test_failed_flush_keeps_results(self):
+        batches = []
+
+        def flush_fn(batch):
+            if not batches:
+                batches.append(None)
+                raise RuntimeError("database is locked")
+            batches.append(batch)
+
+        buffer = ResultBuffer(flush_fn, batch_size=10)
+        buffer.add({'link': '0'})
+        with pytest.raises(RuntimeError):
+            buffer.flush()
+        buffer.add({'link': '1'})
+        buffer.flush()
+        assert batches[1] == [{'link': '0'}, {'link': '1'}]
+        assert buffer.n_flushed == 2
+
+    def test_empty_results_skipped(self):
+        batches = []
+        buffer = ResultBuffer(batches.append, batch_size=1)
+        buffer.add(None)
+        buffer.flush()
+        assert batches == []
+        assert buffer.n_flushed == 0
@@ -0,0 +1,47 @@
+from src.pipeline.scraping.retry_queue import RetryQueue
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRetryQueue:
+    def test_delay_grows_exponentially(self):
+        queue = RetryQueue(base_delay=1, max_delay=10, jitter=0)
+        assert [queue.get_delay(attempt) for attempt in range(1, 6)] == [1, 2, 4, 8, 10]
+
+    def test_jitter_bounds(self):
+        queue = RetryQueue(base_delay=4, max_delay=60, jitter=0.5)
+        delays = [queue.get_delay(1) for _ in range(200)]
+        assert all(2 <= delay <= 6 for delay in delays)
+        assert len(set(delays)) > 1
+
+    def test_not_ready_before_delay(self):
+        clock = FakeClock()
+        queue = RetryQueue(base_delay=5, jitter=0, clock=clock)
+        assert queue.push('a', 1)
+        assert queue.pop_ready() is None
+        assert queue.time_to_next() == 5
+        clock.now = 5
+        assert queue.pop_ready() == ('a', 2)
+        assert len(queue) == 0
+        assert queue.time_to_next() is None
+
+    def test_ready_in_order(self):
+        clock = FakeClock()
+        queue = RetryQueue(base_delay=1, max_delay=100, jitter=0, clock=clock)
+        queue.push('slow', 3)
+        queue.push('fast', 1)
+        clock.now = 100
+        assert queue.pop_ready() == ('fast', 2)
+        assert queue.pop_ready() == ('slow', 4)
+
+    def test_attempts_exhausted(self):
+        queue = RetryQueue(max_attempts=3)
+        assert queue.push('a', 2)
+        assert not queue.push('a', 3)
+        assert len(queue) == 1
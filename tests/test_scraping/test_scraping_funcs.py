@@ -2,6 +2,13 @@ import pytest
 from pathlib import Path
 
 from src.pipeline.scraping.scraping_funcs import extract_info_from_response
+from src.utils.get_config import config
+
+
+@pytest.fixture
+def html_extraction(monkeypatch):
+    monkeypatch.setitem(config, 'use_payload_extraction', False)
+
 
 @pytest.fixture
 def html_content():
@@ -18,7 +25,7 @@ def invalid_html_content():
 
 
 class TestExtractInfoFromResponse:
-    def test_valid_html_content(self, html_content):
+    def test_valid_html_content(self, html_content, html_extraction):
         url = "http://example.com"
         result = extract_info_from_response(html_content, url)
 
@@ -52,7 +59,7 @@ class TestExtractInfoFromResponse:
         assert result['building_material'] == 'beton'
         assert type(result['description']) == str and len(result['description']) > 0
 
-    def test_invalid_html_content(self, invalid_html_content):
+    def test_invalid_html_content(self, invalid_html_content, html_extraction):
         url = "http://example.com"
         result = extract_info_from_response(invalid_html_content, url)
 
@@ -0,0 +1,125 @@
+import sqlite3
+import pytest
+from pathlib import Path
+from scrapy.http import HtmlResponse, Request
+
+from src.db.sqlite_creation import create_sqlite_db
+from src.pipeline.scraping.scrapy_scraping import (CollectedLink, OfferLink, OfferSpider, ScrapedOffer,
+                                                   ScrapyScraper, SqliteBulkPipeline, get_scrapy_settings)
+from src.utils.get_config import config
+
+search_page = """<html><body>
+<a data-cy="listing-item-link" href="/pl/oferta/new-ID1">1</a>
+<a data-cy="listing-item-link" href="/pl/oferta/known-ID2">2</a>
+<a data-cy="listing-item-link" href="/pl/oferta/new-ID1">1</a>
+</body></html>"""
+
+
+@pytest.fixture
+def html_content():
+    html_file_path = Path(__file__).parent / "example_htmls/example_html_1.txt"
+    with open(html_file_path, 'r', encoding='utf-8') as file:
+        return file.read()
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = str(tmp_path / "test.db")
+    create_sqlite_db(db)
+    with sqlite3.connect(db) as conn:
+        conn.execute("insert into surveys values ('survey_1', '2026-10-18', 'incremental', 'warsaw', 2)")
+        conn.execute("insert into scraped_offers (survey_id, link) "
+                     "values ('survey_0', 'https://www.otodom.pl//pl/oferta/known-ID2')")
+    # seen_links is filled from scraped_offers of existing databases
+    create_sqlite_db(db)
+    return db
+
+
+@pytest.fixture
+def scraper(db, monkeypatch):
+    monkeypatch.setitem(config, 'archive_html', False)
+    monkeypatch.setitem(config['scrapy'], 'flush_batch_size', 2)
+    return ScrapyScraper(db, 'survey_1')
+
+
+def make_response(url, html, **cb_kwargs):
+    return HtmlResponse(url=url, body=html.encode('utf-8'), encoding='utf-8',
+                        request=Request(url, cb_kwargs=cb_kwargs))
+
+
+class TestOfferSpider:
+    def test_search_pages_without_links(self, scraper):
+        scraper.load_previous_step_data()
+        assert scraper.links == []
+        assert scraper.search_pages == [config.base_link.format(0), config.base_link.format(1)]
+        assert scraper.known_links == {'pl/oferta/known-ID2'}
+
+    def test_links_of_survey(self, scraper, db):
+        with sqlite3.connect(db) as conn:
+            conn.execute("insert into survey_links (survey_id, link) values ('survey_1', '/pl/oferta/new-ID1')")
+        scraper.load_previous_step_data()
+        spider = OfferSpider(scraper, scraper.links, scraper.search_pages, scraper.known_links)
+        requests = list(spider.start_requests())
+        assert [request.url for request in requests] == ['https://www.otodom.pl//pl/oferta/new-ID1']
+        assert requests[0].cb_kwargs == {'link': '/pl/oferta/new-ID1'}
+
+    def test_search_page_follows_new_links(self, scraper):
+        scraper.use_listing_cards = False
+        spider = OfferSpider(scraper, [], [], {'pl/oferta/known-ID2'})
+        output = list(spider.parse_search_page(make_response(config.base_link.format(1), search_page)))
+        assert [item for item in output if isinstance(item, CollectedLink)] == [
+            CollectedLink('/pl/oferta/new-ID1'), CollectedLink('/pl/oferta/known-ID2'),
+            CollectedLink('/pl/oferta/new-ID1')]
+        followed = [item for item in output if not isinstance(item, CollectedLink)]
+        assert followed[0] == OfferLink(survey_id='survey_1', link='/pl/oferta/new-ID1')
+        assert followed[1].url == 'https://www.otodom.pl//pl/oferta/new-ID1'
+        assert len(followed) == 2
+
+    def test_card_changed(self, scraper):
+        scraper.last_known_cards = {'/pl/oferta/known-ID2': 'old_hash'}
+        card = {'link': '/pl/oferta/known-ID2', 'price': 1.0, 'area': 1.0, 'n_rooms': 1, 'location': None,
+                'card_hash': 'new_hash'}
+        assert scraper.card_changed(card)
+        assert not scraper.card_changed({**card, 'card_hash': 'old_hash'})
+        assert not scraper.card_changed(None)
+
+    def test_offer_parsed(self, scraper, html_content):
+        spider = OfferSpider(scraper, [], [], set())
+        url = 'https://www.otodom.pl//pl/oferta/new-ID1'
+        [item] = spider.parse_offer(make_response(url, html_content), link='/pl/oferta/new-ID1')
+        assert item.record['link'] == url
+        assert item.record['title'] is not None
+
+
+class TestSqliteBulkPipeline:
+    def test_items_saved(self, scraper, db):
+        spider = OfferSpider(scraper, [], [], set())
+        pipeline = SqliteBulkPipeline()
+        pipeline.open_spider(spider)
+        for i in range(3):
+            pipeline.process_item(OfferLink('survey_1', f'/pl/oferta/offer-ID{i}'), spider)
+            pipeline.process_item(ScrapedOffer({'link': f'https://www.otodom.pl//pl/oferta/offer-ID{i}',
+                                                'title': str(i)}), spider)
+            pipeline.process_item(CollectedLink(f'/pl/oferta/offer-ID{i}'), spider)
+        pipeline.process_item(CollectedLink('/pl/oferta/known-ID2'), spider)
+        pipeline.close_spider(spider)
+        with sqlite3.connect(db) as conn:
+            assert conn.execute("select count(*) from survey_links where survey_id = 'survey_1'").fetchone()[0] == 3
+            assert conn.execute("select count(*) from seen_links where last_survey_id = 'survey_1'").fetchone()[0] == 4
+            assert conn.execute("select count(*) from scraped_offers where survey_id = 'survey_1'").fetchone()[0] == 3
+
+    def test_settings(self):
+        settings = get_scrapy_settings()
+        assert settings['AUTOTHROTTLE_ENABLED']
+        assert settings['HTTPCACHE_EXPIRATION_SECS'] > 0
+        assert settings['ITEM_PIPELINES'] == {'src.pipeline.scraping.scrapy_scraping.SqliteBulkPipeline': 300}
+
+
+def test_cards_of_collected_links_saved(scraper, db):
+    scraper.use_listing_cards = True
+    card = {'link': '/pl/oferta/new-ID1', 'price': 500000.0, 'area': 48.5, 'n_rooms': 2, 'location': 'Warszawa',
+            'card_hash': 'hash'}
+    scraper.save_collected_links([CollectedLink(card['link'], card), CollectedLink(card['link'], card)])
+    with sqlite3.connect(db) as conn:
+        assert conn.execute("select link, card_hash from listing_cards").fetchall() == [('/pl/oferta/new-ID1', 'hash')]
+        assert conn.execute("select n_surveys from seen_links where link = 'pl/oferta/new-ID1'").fetchone() == (1,)
@@ -0,0 +1,100 @@
+import sqlite3
+import threading
+import pandas as pd
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.db.sqlite_creation import create_sqlite_db
+from src.pipeline.scraping.result_buffer import ResultBuffer
+from src.pipeline.scraping.scraping import Scraper, get_session
+from src.utils.get_config import config
+
+n_links = 20
+
+
+class OfferHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if 'broken' in self.path:
+            self.send_error(404)
+            return
+        body = f'<html><h1 data-cy="adPageAdTitle">{self.path}</h1></html>'.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('localhost', 0), OfferHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://localhost:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = str(tmp_path / "test.db")
+    create_sqlite_db(db)
+    with sqlite3.connect(db) as conn:
+        pd.DataFrame({'survey_id': 'survey_1', 'link': [f'pl/oferta/offer-ID{i}' for i in range(n_links)]}) \
+            .to_sql('survey_links', conn, if_exists='append', index=False)
+        conn.execute("insert into survey_links (survey_id, link) values ('survey_1', 'pl/oferta/broken-ID99')")
+    return db
+
+
+@pytest.fixture
+def threaded_config(monkeypatch):
+    monkeypatch.setitem(config, 'sync_scraping_threads', 4)
+    monkeypatch.setitem(config, 'sync_flush_batch_size', 3)
+    monkeypatch.setitem(config, 'archive_html', False)
+    monkeypatch.setitem(config, 'use_validator_cache', False)
+    monkeypatch.setitem(config, 'retry_queue', {'max_attempts': 3, 'base_delay': 0.01, 'max_delay': 0.05,
+                                                'jitter': 0.5})
+
+
+class TestSessions:
+    def test_session_reused_in_thread(self):
+        assert get_session() is get_session()
+
+    def test_session_per_thread(self):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            barrier = threading.Barrier(2)
+
+            def session_id():
+                barrier.wait()
+                return id(get_session())
+            sessions = list(executor.map(lambda _: session_id(), range(2)))
+        assert len(set(sessions)) == 2
+
+
+class TestThreadedScraper:
+    def test_buffer_shared_by_threads(self):
+        batches = []
+        buffer = ResultBuffer(batches.append, batch_size=7)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda i: buffer.add({'link': str(i)}), range(1000)))
+        buffer.flush()
+        assert sorted(int(r['link']) for batch in batches for r in batch) == list(range(1000))
+        assert buffer.n_flushed == 1000
+
+    @pytest.mark.parametrize('threads', [1, 4])
+    def test_all_links_saved(self, server, db, threaded_config, monkeypatch, threads):
+        monkeypatch.setitem(config, 'sync_scraping_threads', threads)
+        scraper = Scraper(db, 'survey_1')
+        scraper.load_previous_step_data()
+        scraper.links = [link.replace('https://www.otodom.pl', server) for link in scraper.links]
+        scraper.process()
+        with sqlite3.connect(db) as conn:
+            titles = [row[0] for row in conn.execute("select title from scraped_offers where survey_id = 'survey_1'")]
+            failed = conn.execute("select link, status_code, attempts from failed_links").fetchall()
+            seen = [row[0] for row in conn.execute("select link from seen_links where scraped = 1")]
+        assert sorted(titles) == sorted(f'/pl/oferta/offer-ID{i}' for i in range(n_links))
+        assert sorted(seen) == sorted(f'pl/oferta/offer-ID{i}' for i in range(n_links))
+        assert failed == [(f'{server}/pl/oferta/broken-ID99', 404, 3)]
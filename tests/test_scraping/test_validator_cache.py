@@ -0,0 +1,158 @@
+import asyncio
+import socket
+import threading
+import pytest
+from aiohttp import web
+
+from src.db.connection import close_connections
+from src.db.database_writer import DatabaseWriter
+from src.db.sqlite_creation import create_sqlite_db
+from src.pipeline.scraping.async_scraping import main
+from src.pipeline.scraping.validator_cache import ValidatorCache
+
+url = 'https://www.otodom.pl/pl/oferta/mieszkanie-ID4abc'
+record = {'link': url, 'title': 'Mieszkanie, 2 pokoje', 'price': 750000.0, 'n_rooms': 2}
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = str(tmp_path / "test.db")
+    create_sqlite_db(db)
+    return db
+
+
+@pytest.fixture
+def port():
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+class TestValidatorCache:
+    def test_round_trip(self, db):
+        cache = ValidatorCache(db)
+        cache.modified(url, '"abc"', 'Sat, 17 Oct 2026 10:00:00 GMT')
+        cache.store(url, record)
+        cache.flush()
+
+        cache = ValidatorCache(db)
+        cache.load([url, 'https://www.otodom.pl/other'])
+        assert cache.conditional_headers(url) == {'If-None-Match': '"abc"',
+                                                  'If-Modified-Since': 'Sat, 17 Oct 2026 10:00:00 GMT'}
+        assert cache.not_modified(url) == record
+        assert cache.hits == 1
+        assert cache.downloaded_in(url) is None
+
+    def test_survey_of_download(self, db):
+        cache = ValidatorCache(db, survey_id='survey_1')
+        cache.modified(url, '"abc"', None)
+        cache.store(url, record)
+        cache.flush()
+
+        cache = ValidatorCache(db, survey_id='survey_2')
+        cache.load([url])
+        assert cache.downloaded_in(url) == 'survey_1'
+        assert cache.downloaded_in('https://www.otodom.pl/other') is None
+
+    def test_uncached_url(self, db):
+        cache = ValidatorCache(db)
+        cache.load([url])
+        assert cache.conditional_headers(url) == {}
+        assert cache.not_modified(url) is None
+        assert cache.hits == 0
+
+    def test_response_without_validators_not_stored(self, db):
+        cache = ValidatorCache(db)
+        cache.modified(url, None, None)
+        cache.store(url, record)
+        cache.flush()
+        assert cache.misses == 1
+        cache = ValidatorCache(db)
+        cache.load([url])
+        assert url not in cache.entries
+
+    def test_flush_through_writer(self, db):
+        writer = DatabaseWriter(db)
+        cache = ValidatorCache(db, writer)
+        cache.modified(url, '"abc"', None)
+        cache.store(url, record)
+        cache.flush()
+        writer.flush()
+        assert writer.stats()['n_batches'] == 1
+        cache = ValidatorCache(db)
+        cache.load([url])
+        assert cache.not_modified(url) == record
+        writer.close()
+        close_connections()
+
+    def test_record_updated(self, db):
+        cache = ValidatorCache(db)
+        for etag, price in [('"v1"', 1.0), ('"v2"', 2.0)]:
+            cache.modified(url, etag, None)
+            cache.store(url, {**record, 'price': price})
+            cache.flush()
+        cache = ValidatorCache(db)
+        cache.load([url])
+        assert cache.conditional_headers(url) == {'If-None-Match': '"v2"'}
+        assert cache.not_modified(url)['price'] == 2.0
+
+
+async def serve_and_scrape(port, urls, validator_cache, on_not_modified=None, on_result=None):
+    n_downloads = 0
+
+    async def offer(request):
+        nonlocal n_downloads
+        if request.headers.get('If-None-Match') == '"abc"':
+            return web.Response(status=304)
+        n_downloads += 1
+        return web.Response(text='<html><h1 data-cy="adPageAdTitle">Mieszkanie</h1></html>',
+                            content_type='text/html', headers={'ETag': '"abc"'})
+
+    app = web.Application()
+    app.router.add_get('/{name}', offer)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, 'localhost', port).start()
+    try:
+        results = await main([f'http://localhost:{port}/{name}' for name in urls], validator_cache=validator_cache,
+                             on_not_modified=on_not_modified, on_result=on_result)
+    finally:
+        await runner.cleanup()
+    return results, n_downloads
+
+
+class TestConditionalRequests:
+    def test_not_modified_served_from_cache(self, db, port):
+        cache = ValidatorCache(db)
+        results, n_downloads = asyncio.run(serve_and_scrape(port, ['a', 'b'], cache))
+        assert n_downloads == 2
+        assert cache.misses == 2
+        cache.flush()
+
+        cache = ValidatorCache(db)
+        cache.load([result['link'] for result in results])
+        cached_results, n_downloads = asyncio.run(serve_and_scrape(port, ['a', 'b'], cache))
+        assert n_downloads == 0
+        assert cache.hits == 2
+        assert sorted(cached_results, key=lambda r: r['link']) == sorted(results, key=lambda r: r['link'])
+
+    def test_not_modified_downloaded_again_without_archived_copy(self, db, port):
+        cache = ValidatorCache(db)
+        results, _ = asyncio.run(serve_and_scrape(port, ['a', 'b'], cache))
+        cache.flush()
+
+        cache = ValidatorCache(db)
+        cache.load([result['link'] for result in results])
+        archived = {f'http://localhost:{port}/a'}
+        cached_results, n_downloads = asyncio.run(serve_and_scrape(port, ['a', 'b'], cache,
+                                                                   on_not_modified=lambda url: url in archived))
+        assert n_downloads == 1
+        assert cache.hits == 1
+        assert len(cached_results) == 2
+
+    def test_results_handed_over_outside_event_loop(self, db, port):
+        threads = []
+        asyncio.run(serve_and_scrape(port, ['a', 'b'], ValidatorCache(db),
+                                     on_result=lambda result: threads.append(threading.get_ident())))
+        assert len(threads) == 2
+        assert threading.get_ident() not in threads
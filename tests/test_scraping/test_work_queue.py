@@ -0,0 +1,133 @@
+import sqlite3
+import time
+import pandas as pd
+import pytest
+from concurrent.futures import ProcessPoolExecutor
+
+from src.db.offer_keys import get_survey_key
+from src.db.sqlite_creation import create_sqlite_db
+from src.pipeline.scraping.base_scraper import BaseScraper
+from src.pipeline.scraping.work_queue import SqliteWorkQueue
+from src.utils.get_config import config
+from src.utils.links import offer_id_from_link
+
+survey_id = 'survey_1'
+n_links = 50
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = str(tmp_path / "test.db")
+    create_sqlite_db(db)
+    with sqlite3.connect(db) as conn:
+        pd.DataFrame({'survey_id': survey_id, 'link': [f'pl/oferta/offer-ID{i}' for i in range(n_links)]}) \
+            .to_sql('survey_links', conn, if_exists='append', index=False)
+        conn.execute("insert into scraped_offers (survey_id, link) values (?, ?)",
+                     (survey_id, 'https://www.otodom.pl/pl/oferta/offer-ID0'))
+    return db
+
+
+def drain(db: str, worker_id: str):
+    queue = SqliteWorkQueue(db)
+    links = []
+    while True:
+        claimed = queue.claim(survey_id, worker_id, 3)
+        if not claimed:
+            return links
+        links.extend(claimed)
+        queue.mark_done(survey_id, claimed)
+
+
+class TestSqliteWorkQueue:
+    def test_wal_mode(self, db):
+        SqliteWorkQueue(db)
+        with sqlite3.connect(db) as conn:
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+
+    def test_populate_skips_scraped(self, db):
+        queue = SqliteWorkQueue(db)
+        assert queue.populate(survey_id) == n_links - 1
+        assert queue.populate(survey_id) == n_links - 1
+
+    def test_claimed_links_not_claimed_again(self, db):
+        queue = SqliteWorkQueue(db)
+        queue.populate(survey_id)
+        first = queue.claim(survey_id, 'worker_1', 10)
+        second = queue.claim(survey_id, 'worker_2', 100)
+        assert len(first) == 10
+        assert len(second) == n_links - 11
+        assert not set(first) & set(second)
+        assert queue.claim(survey_id, 'worker_3', 10) == []
+
+    def test_expired_lease_reclaimed(self, db):
+        queue = SqliteWorkQueue(db, lease_seconds=0.2)
+        queue.populate(survey_id)
+        claimed = queue.claim(survey_id, 'worker_1', 5)
+        time.sleep(0.3)
+        assert queue.claim(survey_id, 'worker_2', 5) == claimed
+
+    def test_heartbeat_extends_lease(self, db):
+        queue = SqliteWorkQueue(db, lease_seconds=0.3)
+        queue.populate(survey_id)
+        claimed = queue.claim(survey_id, 'worker_1', 5)
+        with queue.keep_alive(survey_id, 'worker_1'):
+            time.sleep(0.5)
+            assert not set(queue.claim(survey_id, 'worker_2', n_links)) & set(claimed)
+
+    def test_mark_done_and_release(self, db):
+        queue = SqliteWorkQueue(db)
+        queue.populate(survey_id)
+        claimed = queue.claim(survey_id, 'worker_1', 10)
+        queue.mark_done(survey_id, claimed[:4])
+        queue.release(survey_id, 'worker_1')
+        assert queue.remaining(survey_id) == n_links - 5
+        assert queue.claim(survey_id, 'worker_2', 6) == claimed[4:]
+
+    def test_saved_links_of_expired_lease_skipped(self, db):
+        queue = SqliteWorkQueue(db, lease_seconds=0.1)
+        queue.populate(survey_id)
+        claimed = queue.claim(survey_id, 'worker_1', 2)
+        with sqlite3.connect(db) as conn:
+            conn.execute("insert into scraped_offers (survey_id, link, offer_id, survey_key) values (?, ?, ?, ?)",
+                         (survey_id, f'https://www.otodom.pl/{claimed[0]}', offer_id_from_link(claimed[0]),
+                          get_survey_key(conn, survey_id)))
+        time.sleep(0.2)
+        assert queue.claim(survey_id, 'worker_2', 1) == claimed[1:]
+
+    def test_failed_links_requeued(self, db):
+        queue = SqliteWorkQueue(db)
+        queue.populate(survey_id)
+        queue.mark_done(survey_id, queue.claim(survey_id, 'worker_1', n_links))
+        assert queue.remaining(survey_id) == 0
+        assert queue.populate(survey_id) == n_links - 1
+
+    def test_workers_in_processes(self, db):
+        SqliteWorkQueue(db).populate(survey_id)
+        with ProcessPoolExecutor(max_workers=3) as executor:
+            results = list(executor.map(drain, [db] * 3, ['worker_1', 'worker_2', 'worker_3']))
+        links = [link for worker_links in results for link in worker_links]
+        assert len(links) == len(set(links)) == n_links - 1
+
+
+class FailingScraper(BaseScraper):
+    """Saves offers of claimed links, except of links with an odd id."""
+    def __init__(self, db):
+        super().__init__(db, survey_id)
+        self.processed = []
+
+    def process(self):
+        self.processed.extend(self.links)
+        self.upload_batch([{'link': link} for link in self.links if int(link.rsplit('ID', 1)[1]) % 2 == 0])
+
+
+def test_drain_marks_done_only_saved_links(db, monkeypatch):
+    monkeypatch.setitem(config, 'archive_html', False)
+    monkeypatch.setitem(config, 'use_validator_cache', False)
+    monkeypatch.setitem(config.work_queue, 'batch_size', 10)
+    scraper = FailingScraper(db)
+    scraper.drain_work_queue()
+    assert len(scraper.processed) == len(set(scraper.processed)) == n_links - 1
+    queue = SqliteWorkQueue(db)
+    assert queue.remaining(survey_id) == n_links // 2
+    assert sorted(queue.claim(survey_id, 'worker_2', n_links)) == sorted(
+        f'pl/oferta/offer-ID{i}' for i in range(1, n_links, 2))
@@ -0,0 +1,96 @@
+import json
+import sqlite3
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+from box import Box
+
+from src.db.connection import close_connections
+from src.db.database_writer import close_database_writers
+from src.db.sql_code import seen_links_scraped_upsert
+from src.db.sqlite_creation import create_sqlite_db
+from src.special_steps.listing_cards import get_card_hash, get_cards_from_response
+from src.special_steps.survey_creation import SurveyCreator
+from src.utils.links import normalize_link
+
+
+def search_page(items, links):
+    payload = {'props': {'pageProps': {'data': {'searchAds': {'items': items}}}}}
+    anchors = ''.join(f'<a data-cy="listing-item-link" href="{link}">offer</a>' for link in links)
+    return (f'<html><body>{anchors}<script id="__NEXT_DATA__" type="application/json">'
+            f'{json.dumps(payload)}</script></body></html>')
+
+
+def item(slug, price):
+    return {'slug': slug, 'totalPrice': {'value': price, 'currency': 'PLN'}, 'areaInSquareMeters': 48.5,
+            'roomsNumber': 'TWO', 'location': {'address': {'street': {'name': 'ul. Prosta'},
+                                                           'city': {'name': 'Warszawa'}}}}
+
+
+def card(link, price):
+    result = {'link': link, 'price': price, 'area': 48.5, 'n_rooms': 2, 'location': 'ul. Prosta, Warszawa'}
+    result['card_hash'] = get_card_hash(result)
+    return result
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / 'cards.db')
+    create_sqlite_db(path)
+    return path
+
+
+def make_creator(db, survey_type='incremental', writer_enabled=False):
+    test_config = Box({'base_link': 'http://localhost/{}', 'use_async_links_scraping': False,
+                       'use_listing_cards': True, 'database_writer': {'enabled': writer_enabled}})
+    with patch('src.special_steps.survey_creation.config', test_config), \
+            patch('src.special_steps.survey_creation.get_first_page', return_value=''), \
+            patch('src.special_steps.survey_creation.get_max_page_num', return_value=1):
+        creator = SurveyCreator(db, survey_type, 'warsaw')
+    creator.create_survey_in_table()
+    return creator
+
+
+class TestGetCardsFromResponse:
+    def test_cards(self):
+        html = search_page([item('flat-ID1', 500000)], ['/pl/oferta/flat-ID1'])
+        assert get_cards_from_response(html) == [card('/pl/oferta/flat-ID1', 500000.0)]
+
+    def test_link_without_payload_item(self):
+        html = search_page([], ['/pl/oferta/flat-ID2'])
+        [result] = get_cards_from_response(html)
+        assert result['link'] == '/pl/oferta/flat-ID2'
+        assert result['price'] is None
+        assert result['card_hash'] is None
+
+    def test_page_without_payload(self):
+        html = '<a data-cy="listing-item-link" href="/pl/oferta/flat-ID3">offer</a>'
+        assert [result['link'] for result in get_cards_from_response(html)] == ['/pl/oferta/flat-ID3']
+
+
+class TestIncrementalSurveyWithCards:
+    @pytest.mark.parametrize('writer_enabled', [False, True])
+    def test_only_new_and_changed_links_saved(self, db, writer_enabled):
+        first = make_creator(db, 'full', writer_enabled)
+        first.cards = [card('/pl/oferta/a', 100.0), card('/pl/oferta/b', 200.0)]
+        first.links = [c['link'] for c in first.cards]
+        first.clean_and_save_links_to_db()
+        with sqlite3.connect(db) as conn:
+            conn.executemany(seen_links_scraped_upsert, [{'link': normalize_link(link), 'seen_at': first.survey_date}
+                                                         for link in first.links])
+
+        second = make_creator(db, writer_enabled=writer_enabled)
+        second.cards = [card('/pl/oferta/a', 100.0), card('/pl/oferta/b', 190.0), card('/pl/oferta/c', 300.0)]
+        second.links = [c['link'] for c in second.cards]
+        second.clean_and_save_links_to_db()
+
+        with sqlite3.connect(db) as conn:
+            links = pd.read_sql_query("SELECT link FROM survey_links WHERE survey_id = ?", conn,
+                                      params=(second.survey_id,))
+            n_cards = conn.execute("SELECT COUNT(*) FROM listing_cards WHERE survey_id = ?",
+                                   (second.survey_id,)).fetchone()[0]
+        assert sorted(links['link']) == ['/pl/oferta/b', '/pl/oferta/c']
+        assert n_cards == 3
+        close_database_writers()
+        close_connections()
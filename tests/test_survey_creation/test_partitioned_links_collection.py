@@ -0,0 +1,98 @@
+import sqlite3
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from unittest.mock import patch
+
+import pytest
+from box import Box
+
+from src.db.sqlite_creation import create_sqlite_db
+from src.special_steps.partitioned_links_collection import PricePartition, collect_partitioned_links
+from src.special_steps.survey_creation import SurveyCreator
+
+prices = list(range(0, 1000, 10))
+page_size = 5
+page_cap = 4
+
+
+class CappedSearchHandler(BaseHTTPRequestHandler):
+    """Search results of offers with `prices`, only `page_cap` pages of a query are shown."""
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        price_min = int(query.get('priceMin', [0])[0])
+        price_max = int(query.get('priceMax', [10 ** 9])[0])
+        page_num = int(query['page'][0])
+        offers = [price for price in prices if price_min <= price <= price_max]
+        n_pages = min(page_cap, -(-len(offers) // page_size))
+        anchors = ''.join(f'<a data-cy="listing-item-link" href="/pl/oferta/offer-{price}">offer</a>'
+                          for price in offers[(page_num - 1) * page_size:page_num * page_size]
+                          if page_num <= page_cap)
+        pagination = (f'<nav data-cy="pagination"><a>1</a><a>2</a><a aria-label="last">{n_pages}</a></nav>'
+                      if n_pages > 1 else '')
+        body = f'<html><body>{pagination}{anchors}</body></html>'.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def base_link():
+    server = ThreadingHTTPServer(('localhost', 0), CappedSearchHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://localhost:{server.server_address[1]}/search?page={{}}'
+    server.shutdown()
+    server.server_close()
+
+
+class TestPricePartition:
+    def test_from_bands(self):
+        assert PricePartition.from_bands([0, 100, None]) == [PricePartition(0, 100), PricePartition(100, None)]
+
+    def test_split(self):
+        assert PricePartition(0, 100).split() == [PricePartition(0, 50), PricePartition(50, 100)]
+        assert PricePartition(100).split() == [PricePartition(100, 200), PricePartition(200, None)]
+
+    def test_can_split(self):
+        assert PricePartition(0, 100).can_split(50)
+        assert not PricePartition(0, 99).can_split(50)
+        assert PricePartition(10 ** 6).can_split(50)
+
+    def test_url(self):
+        assert PricePartition(10, 20).url('http://host/?page={}', 3) == 'http://host/?page=3&priceMin=10&priceMax=20'
+
+
+class TestCollectPartitionedLinks:
+    def test_all_offers_collected_past_cap(self, base_link):
+        links = []
+        crawled = collect_partitioned_links(base_link, PricePartition.from_bands([0, 500, None]),
+                                            lambda url, page_links: links.extend(page_links),
+                                            max_in_flight=4, page_cap=page_cap, min_band_width=10)
+        assert set(links) == {f'/pl/oferta/offer-{price}' for price in prices}
+        assert len(crawled) > 2
+        assert all(n_pages < page_cap for n_pages in crawled.values())
+
+    def test_survey_links_deduplicated(self, base_link, tmp_path):
+        db = str(tmp_path / 'links.db')
+        create_sqlite_db(db)
+        test_config = Box({'base_link': base_link, 'use_async_links_scraping': True, 'use_listing_cards': False,
+                           'links_collection_window': 4,
+                           'partitioned_links_collection': {'enabled': True, 'price_bands': [0, 500, None],
+                                                            'page_cap': page_cap, 'min_band_width': 10}})
+        with patch('src.special_steps.survey_creation.config', test_config), \
+                patch('src.special_steps.survey_creation.get_max_page_num', return_value=page_cap), \
+                patch('src.special_steps.survey_creation.get_first_page', return_value=''):
+            creator = SurveyCreator(db, 'full', 'warsaw')
+            creator.create_survey_in_table()
+            creator.partitioned_links_to_db()
+
+        with sqlite3.connect(db) as conn:
+            links = [row[0] for row in conn.execute("SELECT link FROM survey_links WHERE survey_id = ?",
+                                                    (creator.survey_id,))]
+        assert len(links) == len(prices)
+        assert len(creator.links) > len(prices)
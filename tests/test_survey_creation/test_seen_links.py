@@ -0,0 +1,36 @@
+import sqlite3
+
+import pytest
+
+from src.db.sql_code import seen_links_collected_upsert, seen_links_scraped_upsert
+from src.db.sqlite_creation import create_sqlite_db
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / 'seen.db')
+    create_sqlite_db(path)
+    return path
+
+
+def seen(db):
+    with sqlite3.connect(db) as conn:
+        return conn.execute("SELECT link, first_seen, last_seen, n_surveys, scraped FROM seen_links").fetchall()
+
+
+class TestSeenLinks:
+    def test_surveys_counted_once(self, db):
+        with sqlite3.connect(db) as conn:
+            for survey_id, seen_at in [('s1', '2026-01-01'), ('s1', '2026-01-01'), ('s2', '2026-01-02')]:
+                conn.execute(seen_links_collected_upsert, {'link': 'pl/oferta/a', 'seen_at': seen_at,
+                                                           'survey_id': survey_id})
+            conn.execute(seen_links_scraped_upsert, {'link': 'pl/oferta/a', 'seen_at': '2026-01-02'})
+        assert seen(db) == [('pl/oferta/a', '2026-01-01', '2026-01-02', 2, 1)]
+
+    def test_backfill_from_scraped_offers(self, db):
+        with sqlite3.connect(db) as conn:
+            conn.execute("INSERT INTO surveys VALUES ('s1', '2026-01-01', 'full', 'warsaw', 1)")
+            conn.execute("INSERT INTO scraped_offers (survey_id, link) "
+                         "VALUES ('s1', 'https://www.otodom.pl//pl/oferta/a')")
+        create_sqlite_db(db)
+        assert seen(db) == [('pl/oferta/a', '2026-01-01', '2026-01-01', 1, 1)]
@@ -0,0 +1,151 @@
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from unittest.mock import patch
+
+import pytest
+from box import Box
+
+from src.db.sql_code import seen_links_scraped_upsert
+from src.db.sqlite_creation import create_sqlite_db
+from src.special_steps.streaming_links_collection import KnownPagesStopper, stream_collect_links
+from src.special_steps.survey_creation import SurveyCreator
+
+n_pages = 6
+links_per_page = 3
+
+
+def search_page(page_num):
+    anchors = ''.join(f'<a data-cy="listing-item-link" href="/pl/oferta/offer-{page_num}-{i}">offer</a>'
+                      for i in range(links_per_page))
+    # the last link of every page is also shown on the next one
+    anchors += f'<a data-cy="listing-item-link" href="/pl/oferta/offer-{page_num + 1}-0">offer</a>'
+    pagination = f'<nav data-cy="pagination"><a>1</a><a>2</a><a aria-label="last">{n_pages}</a></nav>'
+    return f'<html><body>{pagination}{anchors}</body></html>'
+
+
+class SearchHandler(BaseHTTPRequestHandler):
+    lock = threading.Lock()
+    requested = []
+    in_flight = 0
+    max_in_flight = 0
+
+    def do_GET(self):
+        page_num = int(parse_qs(urlparse(self.path).query)['page'][0])
+        with self.lock:
+            SearchHandler.requested.append(page_num)
+            SearchHandler.in_flight += 1
+            SearchHandler.max_in_flight = max(SearchHandler.max_in_flight, SearchHandler.in_flight)
+        time.sleep(0.05)
+        with self.lock:
+            SearchHandler.in_flight -= 1
+        if page_num == 4:
+            self.send_error(500)
+            return
+        body = search_page(page_num).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def base_link():
+    SearchHandler.requested = []
+    SearchHandler.max_in_flight = 0
+    server = ThreadingHTTPServer(('localhost', 0), SearchHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://localhost:{server.server_address[1]}/search?page={{}}'
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / 'links.db')
+    create_sqlite_db(path)
+    return path
+
+
+class TestStreamCollectLinks:
+    def test_first_page_reused_and_window_bounded(self, base_link):
+        pages = {}
+        n_collected = stream_collect_links(base_link, n_pages, lambda url, links: pages.update({url: links}),
+                                           first_page=search_page(1), max_in_flight=2)
+        assert n_collected == n_pages - 1
+        assert sorted(SearchHandler.requested) == list(range(2, n_pages + 1))
+        assert SearchHandler.max_in_flight <= 2
+        assert base_link.format(4) not in pages
+        assert pages[base_link.format(1)][0] == '/pl/oferta/offer-1-0'
+
+    def test_failed_save_raised(self, base_link):
+        def on_page(url, links):
+            if url == base_link.format(3):
+                raise sqlite3.OperationalError('database is locked')
+
+        with pytest.raises(sqlite3.OperationalError):
+            stream_collect_links(base_link, n_pages, on_page, max_in_flight=2)
+
+
+class TestKnownPagesStopper:
+    def test_stops_after_consecutive_known_pages(self):
+        stopper = KnownPagesStopper(2)
+        for page_num, has_unseen in [(1, True), (2, False), (3, True), (4, False)]:
+            stopper.record(page_num, has_unseen)
+            assert not stopper.should_stop()
+        stopper.record(5, False)
+        assert stopper.should_stop()
+
+    def test_pages_counted_in_order(self):
+        stopper = KnownPagesStopper(2)
+        stopper.record(2, False)
+        stopper.record(3, False)
+        assert not stopper.should_stop()
+        stopper.record(1, True)
+        assert stopper.should_stop()
+
+
+class TestStreamLinksToDb:
+    def test_links_saved_page_by_page(self, base_link, db):
+        test_config = Box({'base_link': base_link, 'use_async_links_scraping': True, 'use_listing_cards': False,
+                           'links_collection_window': 3})
+        with patch('src.special_steps.survey_creation.config', test_config), \
+                patch('src.special_steps.survey_creation.get_first_page', return_value=search_page(1)):
+            creator = SurveyCreator(db, 'full', 'warsaw')
+            creator.create_survey_in_table()
+            creator.stream_links_to_db()
+
+        with sqlite3.connect(db) as conn:
+            links = [row[0] for row in conn.execute("SELECT link FROM survey_links WHERE survey_id = ?",
+                                                    (creator.survey_id,))]
+        assert creator.n_pages == n_pages
+        assert 1 not in SearchHandler.requested
+        assert len(links) == len(set(links))
+        expected = {f'/pl/oferta/offer-{page}-{i}' for page in [1, 2, 3, 5, 6] for i in range(links_per_page)}
+        assert expected <= set(links)
+
+    def test_incremental_early_stop(self, base_link, db):
+        with sqlite3.connect(db) as conn:
+            conn.executemany(seen_links_scraped_upsert, [{'link': f'pl/oferta/offer-{page}-{i}', 'seen_at': '2026-01-01'}
+                                                         for page in range(2, n_pages + 2) for i in range(links_per_page)])
+        test_config = Box({'base_link': base_link, 'use_async_links_scraping': True, 'use_listing_cards': False,
+                           'links_collection_window': 1,
+                           'incremental_early_stop': {'enabled': True, 'known_pages': 2,
+                                                      'sort_params': '&by=LATEST&direction=DESC'}})
+        with patch('src.special_steps.survey_creation.config', test_config), \
+                patch('src.special_steps.survey_creation.get_first_page', return_value=search_page(1)):
+            creator = SurveyCreator(db, 'incremental', 'warsaw')
+            creator.create_survey_in_table()
+            creator.stream_links_to_db()
+
+        with sqlite3.connect(db) as conn:
+            links = {row[0] for row in conn.execute("SELECT link FROM survey_links WHERE survey_id = ?",
+                                                    (creator.survey_id,))}
+        assert SearchHandler.requested == [2, 3]
+        assert links == {f'/pl/oferta/offer-1-{i}' for i in range(links_per_page)}
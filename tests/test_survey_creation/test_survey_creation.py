@@ -3,7 +3,7 @@ from unittest.mock import patch
 from box import Box
 from src.special_steps.survey_creation import SurveyCreator
 
-from src.db.sql_code import survey_links_tab_creation, survey_tab_creation
+from src.db.sqlite_creation import create_sqlite_db
 
 from pathlib import Path
 import pandas as pd
@@ -15,11 +15,7 @@ db = Path(__file__).parent / 'scraping_test.db'
 
 
 def test_survey_creation_async():
-    with sqlite3.connect(db) as conn:
-        cur = conn.cursor()
-        cur.execute(survey_tab_creation)
-        cur.execute(survey_links_tab_creation)
-        conn.commit()
+    create_sqlite_db(db)
 
     my_test_config = Box({'survey_type': 'test',
                           'location': 'warsaw',
@@ -45,11 +41,7 @@ def test_survey_creation_async():
 
 
 def test_survey_creation_non_async():
-    with sqlite3.connect(db) as conn:
-        cur = conn.cursor()
-        cur.execute(survey_tab_creation)
-        cur.execute(survey_links_tab_creation)
-        conn.commit()
+    create_sqlite_db(db)
 
     my_test_config = Box({'survey_type': 'test',
                           'location': 'warsaw',
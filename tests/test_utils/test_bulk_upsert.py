@@ -0,0 +1,68 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.db.bulk_upsert import build_upsert, bulk_upsert
+from src.utils.links import offer_id_from_link
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE features (survey_id TEXT, link TEXT, offer_id INT, survey_key INT, area REAL, "
+                 "n_rooms INT, scraped_at TIMESTAMP, UNIQUE(survey_key, offer_id))")
+    yield conn
+    conn.close()
+
+
+def make_df(links, area):
+    return pd.DataFrame({'survey_id': 's1', 'link': links, 'offer_id': [offer_id_from_link(link) for link in links],
+                         'survey_key': 1, 'area': area, 'n_rooms': np.arange(len(links)),
+                         'scraped_at': pd.Timestamp('2024-01-01 12:00:00')})
+
+
+class TestBuildUpsert:
+    def test_update(self):
+        assert build_upsert('t', ['survey_id', 'link', 'area'], ['survey_id', 'link']) == \
+            "INSERT INTO t (survey_id, link, area) VALUES (?, ?, ?) " \
+            "ON CONFLICT (survey_id, link) DO UPDATE SET area = excluded.area"
+
+    def test_nothing(self):
+        assert build_upsert('t', ['survey_id', 'link', 'area'], ['survey_id', 'link'], 'nothing').endswith(
+            "DO NOTHING")
+
+    def test_unknown_action(self):
+        with pytest.raises(ValueError):
+            build_upsert('t', ['link'], ['link'], 'replace')
+
+
+class TestBulkUpsert:
+    def test_rerun_updates(self, conn):
+        report = bulk_upsert(conn, 'features', make_df(['a', 'b', 'c'], [10.0, np.nan, 30.0]), chunk_size=2)
+        assert (report.n_inserted, report.n_updated, report.n_ignored) == (3, 0, 0)
+
+        report = bulk_upsert(conn, 'features', make_df(['b', 'c', 'd'], [20.0, 31.0, 40.0]), chunk_size=2)
+        assert (report.n_inserted, report.n_updated, report.n_ignored) == (1, 2, 0)
+        assert conn.execute("SELECT link, area, n_rooms, scraped_at FROM features ORDER BY link").fetchall() == [
+            ('a', 10.0, 0, '2024-01-01 12:00:00'), ('b', 20.0, 0, '2024-01-01 12:00:00'),
+            ('c', 31.0, 1, '2024-01-01 12:00:00'), ('d', 40.0, 2, '2024-01-01 12:00:00')]
+
+    def test_rerun_keeps_rows(self, conn):
+        bulk_upsert(conn, 'features', make_df(['a', 'b'], [10.0, 20.0]))
+        report = bulk_upsert(conn, 'features', make_df(['b', 'c'], [21.0, 30.0]), on_conflict='nothing')
+        assert (report.n_inserted, report.n_updated, report.n_ignored) == (1, 0, 1)
+        assert conn.execute("SELECT area FROM features WHERE link = 'b'").fetchone()[0] == 20.0
+
+    def test_missing_values_stored_as_null(self, conn):
+        df = make_df(['a'], [np.nan])
+        df['scraped_at'] = pd.NaT
+        bulk_upsert(conn, 'features', df)
+        assert conn.execute("SELECT area, scraped_at FROM features").fetchone() == (None, None)
+
+    def test_failed_chunk_rolls_back(self, conn):
+        df = make_df(['a', 'b', 'c'], [10.0, 20.0, {'not': 'supported'}])
+        with pytest.raises(sqlite3.ProgrammingError):
+            bulk_upsert(conn, 'features', df, chunk_size=2)
+        assert conn.execute("SELECT COUNT(*) FROM features").fetchone()[0] == 0
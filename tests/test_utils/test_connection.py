@@ -0,0 +1,50 @@
+import os
+import sqlite3
+import threading
+
+import pytest
+
+from src.db.connection import close_connections, get_connection
+
+
+@pytest.fixture
+def db(tmp_path):
+    yield str(tmp_path / 'test.db')
+    close_connections()
+
+
+class TestGetConnection:
+    def test_reused_in_thread(self, db):
+        assert get_connection(db) is get_connection(db)
+
+    def test_own_connection_per_thread(self, db):
+        other = []
+        thread = threading.Thread(target=lambda: other.append(get_connection(db)))
+        thread.start()
+        thread.join()
+        assert other[0] is not get_connection(db)
+
+    def test_pragmas_applied(self, db):
+        conn = get_connection(db)
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+        assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2
+        assert conn.execute("PRAGMA cache_size").fetchone()[0] == -65536
+
+    def test_reopened_when_file_replaced(self, db):
+        conn = get_connection(db)
+        conn.execute("CREATE TABLE t (x INT)")
+        for path in [db, f'{db}-wal', f'{db}-shm']:
+            if os.path.exists(path):
+                os.remove(path)
+        sqlite3.connect(db).close()
+        new_conn = get_connection(db)
+        assert new_conn is not conn
+        assert new_conn.execute("SELECT name FROM sqlite_master").fetchall() == []
+
+    def test_commits_as_context_manager(self, db):
+        with get_connection(db) as conn:
+            conn.execute("CREATE TABLE t (x INT)")
+            conn.execute("INSERT INTO t VALUES (1)")
+        with sqlite3.connect(db) as other:
+            assert other.execute("SELECT x FROM t").fetchall() == [(1,)]
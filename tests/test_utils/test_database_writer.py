@@ -0,0 +1,148 @@
+import sqlite3
+import threading
+
+import pandas as pd
+import pytest
+
+from src.db.connection import close_connections
+from src.db.database_writer import DatabaseWriter, close_database_writers
+from src.db.sqlite_creation import create_sqlite_db
+from src.pipeline.pipeline_step_abc import PipelineStepABC
+from src.utils.exceptions import DatabaseWriterException
+from src.utils.get_config import config
+from src.utils.links import offer_id_from_link
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = str(tmp_path / 'test.db')
+    with sqlite3.connect(db) as conn:
+        conn.execute("CREATE TABLE features (survey_id TEXT, link TEXT, offer_id INT, survey_key INT, area REAL, "
+                     "UNIQUE(survey_key, offer_id))")
+        conn.execute("CREATE TABLE events (name TEXT)")
+    yield db
+    close_connections()
+
+
+def make_df(links, area=1.0):
+    return pd.DataFrame({'survey_id': 's1', 'link': links, 'offer_id': [offer_id_from_link(link) for link in links],
+                         'survey_key': 1, 'area': area})
+
+
+def count_rows(db, table):
+    with sqlite3.connect(db) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+class TestDatabaseWriter:
+    def test_concurrent_producers(self, db):
+        writer = DatabaseWriter(db, max_queue_batches=4)
+
+        def produce(producer):
+            for i in range(20):
+                writer.write('features', make_df([f'{producer}-{i}-{j}' for j in range(5)]))
+                writer.execute_many("INSERT INTO events VALUES (?)", [(f'{producer}-{i}',)])
+
+        threads = [threading.Thread(target=produce, args=(producer,)) for producer in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        writer.flush()
+        assert count_rows(db, 'features') == 8 * 20 * 5
+        assert count_rows(db, 'events') == 8 * 20
+        stats = writer.stats()
+        assert stats['n_batches'] == 2 * 8 * 20
+        assert stats['n_inserted'] == 8 * 20 * 5
+        assert stats['n_transactions'] <= stats['n_batches']
+        assert stats['commit_ms_p50'] <= stats['commit_ms_p95'] <= stats['commit_ms_max']
+        writer.close()
+
+    def test_batches_coalesced_while_locked(self, db):
+        writer = DatabaseWriter(db)
+        blocker = sqlite3.connect(db)
+        blocker.execute("BEGIN EXCLUSIVE")
+        for i in range(10):
+            writer.write('features', make_df([f'link-{i}']))
+        blocker.rollback()
+        blocker.close()
+        writer.flush()
+        assert count_rows(db, 'features') == 10
+        assert writer.stats()['n_transactions'] <= 2
+        writer.close()
+
+    def test_backpressure(self, db):
+        writer = DatabaseWriter(db, max_queue_batches=1)
+        blocker = sqlite3.connect(db)
+        blocker.execute("BEGIN EXCLUSIVE")
+        producer = threading.Thread(target=lambda: [writer.write('features', make_df([f'link-{i}']))
+                                                    for i in range(5)])
+        producer.start()
+        producer.join(timeout=0.5)
+        assert producer.is_alive()
+        blocker.rollback()
+        blocker.close()
+        producer.join(timeout=10)
+        writer.flush()
+        assert count_rows(db, 'features') == 5
+        writer.close()
+
+    def test_queue_order_kept(self, db):
+        writer = DatabaseWriter(db)
+        blocker = sqlite3.connect(db)
+        blocker.execute("BEGIN EXCLUSIVE")
+        for name in ['x', 'y']:
+            writer.execute_many("DELETE FROM events WHERE name = ?", [(name,)])
+            writer.execute_many("INSERT INTO events VALUES (?)", [(name,)])
+        writer.execute_many("DELETE FROM events WHERE name = ?", [('y',)])
+        blocker.rollback()
+        blocker.close()
+        writer.flush()
+        with sqlite3.connect(db) as conn:
+            assert conn.execute("SELECT name FROM events").fetchall() == [('x',)]
+        writer.close()
+
+    def test_rerun_updates(self, db):
+        writer = DatabaseWriter(db)
+        writer.write('features', make_df(['a', 'b']))
+        writer.flush()
+        writer.write('features', make_df(['b', 'c'], area=2.0))
+        writer.flush()
+        assert (writer.report.n_inserted, writer.report.n_updated) == (3, 1)
+        writer.close()
+
+    def test_error_raised_to_producer(self, db):
+        writer = DatabaseWriter(db)
+        writer.write('missing_table', make_df(['a']))
+        with pytest.raises(DatabaseWriterException):
+            writer.flush()
+        writer.write('features', make_df(['a']))
+        writer.flush()
+        assert count_rows(db, 'features') == 1
+        writer.close()
+
+
+class FeatureStep(PipelineStepABC):
+    def __init__(self, db, survey_id):
+        super().__init__(db, survey_id)
+        self.output_table = 'numeric_features'
+
+    def load_previous_step_data(self):
+        pass
+
+    def process(self):
+        self.df_out = pd.DataFrame({'link': ['/pl/oferta/a-ID1', '/pl/oferta/b-ID2'], 'area': [50.0, 60.0]})
+
+
+def test_step_writes_through_writer(tmp_path, monkeypatch):
+    db = str(tmp_path / 'pipeline.db')
+    create_sqlite_db(db)
+    monkeypatch.setitem(config.database_writer, 'enabled', True)
+    step = FeatureStep(db, 'survey_1')
+    step.execute_step()
+    assert step.writer is not None
+    with sqlite3.connect(db) as conn:
+        assert conn.execute("SELECT link, area, offer_id FROM numeric_features ORDER BY link").fetchall() == [
+            ('/pl/oferta/a-ID1', 50.0, 1), ('/pl/oferta/b-ID2', 60.0, 2)]
+    close_database_writers()
+    close_connections()
@@ -0,0 +1,24 @@
+import pytest
+
+from src.utils.links import normalize_link, offer_id_from_link
+
+
+class TestNormalizeLink:
+    @pytest.mark.parametrize('link', ['/pl/oferta/flat-ID4nEKM', 'pl/oferta/flat-ID4nEKM',
+                                      'https://www.otodom.pl//pl/oferta/flat-ID4nEKM',
+                                      'https://www.otodom.pl/pl/oferta/flat-ID4nEKM?utm=1#map'])
+    def test_same_key(self, link):
+        assert normalize_link(link) == 'pl/oferta/flat-ID4nEKM'
+
+
+class TestOfferIdFromLink:
+    def test_base62_token(self):
+        assert offer_id_from_link('/pl/oferta/flat-ID1a') == 1 * 62 + 36
+        assert offer_id_from_link('https://www.otodom.pl//pl/oferta/flat-ID4nEKM') == \
+            offer_id_from_link('pl/oferta/other-slug-ID4nEKM')
+
+    def test_fallback_hash(self):
+        offer_id = offer_id_from_link('/pl/oferta/without-token')
+        assert offer_id < 0
+        assert offer_id == offer_id_from_link('https://www.otodom.pl//pl/oferta/without-token')
+        assert offer_id.bit_length() < 64
@@ -0,0 +1,46 @@
+import sqlite3
+
+from src.db.offer_keys import get_survey_key, has_offer_key_constraint, migrate_offer_keys
+from src.db.sqlite_creation import create_sqlite_db
+from src.utils.links import offer_id_from_link
+
+
+def test_migration_of_old_tables(tmp_path):
+    db = str(tmp_path / 'old.db')
+    with sqlite3.connect(db) as conn:
+        conn.execute("CREATE TABLE survey_links (survey_id TEXT, link TEXT, UNIQUE(survey_id, link))")
+        conn.execute("INSERT INTO survey_links VALUES ('s1', '/pl/oferta/flat-ID4nEKM')")
+    create_sqlite_db(db)
+
+    with sqlite3.connect(db) as conn:
+        row = conn.execute("SELECT offer_id, survey_key FROM survey_links").fetchone()
+        assert row == (offer_id_from_link('/pl/oferta/flat-ID4nEKM'), get_survey_key(conn, 's1'))
+        assert has_offer_key_constraint(conn, 'survey_links')
+        indexes = [index[1] for index in conn.execute("PRAGMA index_list(survey_links)")]
+        assert 'survey_links_survey_idx' in indexes
+        migrate_offer_keys(conn)
+
+
+def test_migration_of_survey_id_link_key(tmp_path):
+    db = str(tmp_path / 'old.db')
+    with sqlite3.connect(db) as conn:
+        conn.execute("CREATE TABLE scraped_offers (survey_id TEXT, link TEXT, title TEXT, offer_id INTEGER, "
+                     "survey_key INTEGER, UNIQUE(survey_id, link))")
+        conn.executemany("INSERT INTO scraped_offers (survey_id, link, title) VALUES ('s1', ?, ?)",
+                         [('https://www.otodom.pl/pl/oferta/flat-ID4nEKM', 'first'),
+                          ('https://www.otodom.pl//pl/oferta/flat-ID4nEKM', 'same offer'),
+                          ('https://www.otodom.pl/pl/oferta/other-ID4nEKN', 'other')])
+    create_sqlite_db(db)
+
+    with sqlite3.connect(db) as conn:
+        assert has_offer_key_constraint(conn, 'scraped_offers')
+        assert conn.execute("SELECT title, offer_id FROM scraped_offers ORDER BY rowid").fetchall() == [
+            ('first', offer_id_from_link('/pl/oferta/flat-ID4nEKM')),
+            ('other', offer_id_from_link('/pl/oferta/other-ID4nEKN'))]
+
+
+def test_survey_key_stable(tmp_path):
+    with sqlite3.connect(str(tmp_path / 'keys.db')) as conn:
+        first, second = get_survey_key(conn, 's1'), get_survey_key(conn, 's2')
+        assert first != second
+        assert get_survey_key(conn, 's1') == first
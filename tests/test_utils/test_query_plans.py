@@ -0,0 +1,58 @@
+import sqlite3
+
+import pytest
+
+from src.db import sql_code
+from src.db.sqlite_creation import create_sqlite_db
+from src.modeling.dataset_prep import get_dataset_query
+
+survey_params = {'survey_id': 'survey_1'}
+
+
+@pytest.fixture(scope='module')
+def conn(tmp_path_factory):
+    db = str(tmp_path_factory.mktemp('plans') / 'plans.db')
+    create_sqlite_db(db)
+    conn = sqlite3.connect(db)
+    yield conn
+    conn.close()
+
+
+def get_plan(conn, query, params):
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+
+
+def assert_tables_searched_by_index(plan, aliases):
+    for alias in aliases:
+        steps = [step for step in plan if step.startswith(f'SEARCH {alias} ') or step.startswith(f'SCAN {alias}')]
+        assert steps, f"{alias} not in plan {plan}"
+        assert all(step.startswith('SEARCH') and 'INDEX' in step for step in steps), plan
+
+
+class TestQueryPlans:
+    def test_pending_links_anti_join(self, conn):
+        plan = get_plan(conn, sql_code.pending_links_select, survey_params)
+        assert_tables_searched_by_index(plan, ['l', 's'])
+        assert any('autoindex_scraped_offers_1 (survey_key=? AND offer_id=?)' in step for step in plan)
+
+    @pytest.mark.parametrize('query, table', [(sql_code.survey_links_count, 'survey_links'),
+                                              (sql_code.geocoded_adr_select, 'geocoded_adr'),
+                                              (sql_code.geo_features_dummy_select, 'geo_features')])
+    def test_survey_loads(self, conn, query, table):
+        assert_tables_searched_by_index(get_plan(conn, query, survey_params), [table])
+
+    def test_dataset_join(self, conn):
+        plan = get_plan(conn, get_dataset_query('fe1', 2), ['survey_1', 'survey_2'])
+        assert_tables_searched_by_index(plan, ['s', 'n', 'cf', 'l', 'g', 'gd'])
+
+    def test_dataset_join_sparse_storage(self, conn):
+        plan = get_plan(conn, get_dataset_query('fe1', 2, sparse_storage=True), ['survey_1', 'survey_2'])
+        assert_tables_searched_by_index(plan, ['s', 'n', 'g'])
+
+    def test_sparse_features_lookup(self, conn):
+        plan = get_plan(conn, sql_code.sparse_features_select, {'survey_keys': '[1]', 'feature_ids': '[1, 2]'})
+        assert any(step.startswith('SEARCH f USING PRIMARY KEY (survey_key=?') for step in plan), plan
+
+    def test_seen_links_lookup(self, conn):
+        plan = get_plan(conn, sql_code.seen_links_scraped_among, {'links': '[]'})
+        assert any('seen_links' in step and 'INDEX' in step for step in plan), plan
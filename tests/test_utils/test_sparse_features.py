@@ -0,0 +1,103 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+from box import Box
+
+from src.db.connection import close_connections, get_connection
+from src.db.sparse_features import get_feature_ids, read_sparse_features
+from src.db.sql_code import sparse_features_insert
+from src.db.sqlite_creation import create_sqlite_db
+from src.modeling.dataset_prep import prepare_dataset, prepare_sparse_dataset
+from src.pipeline.pipeline_step_abc import PipelineStepABC
+from src.utils.get_config import config, feature_set_definitions
+
+links = ['/pl/oferta/a-ID1', '/pl/oferta/b-ID2', '/pl/oferta/c-ID3']
+
+
+class CategoricalStep(PipelineStepABC):
+    def __init__(self, db, survey_id, df_out):
+        super().__init__(db, survey_id)
+        self.output_table = 'categorical_features'
+        self.df_out = df_out
+
+    def load_previous_step_data(self):
+        pass
+
+    def process(self):
+        pass
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    db = str(tmp_path / 'sparse.db')
+    create_sqlite_db(db)
+    monkeypatch.setitem(config, 'sparse_feature_storage', True)
+    monkeypatch.setitem(config, 'sqlite_db', db)
+    yield db
+    close_connections()
+
+
+def upload(db, df, survey_id='survey_1'):
+    CategoricalStep(db, survey_id, df.copy()).upload_results_to_db()
+
+
+def read_long(db):
+    with sqlite3.connect(db) as conn:
+        return conn.execute("""SELECT d.feature_name, s.offer_id, s.value FROM sparse_features s
+                               JOIN feature_dictionary d ON d.feature_id = s.feature_id
+                               ORDER BY d.feature_name, s.offer_id""").fetchall()
+
+
+class TestSparseFeatures:
+    def test_only_non_zero_values_stored(self, db):
+        upload(db, pd.DataFrame({'link': links, 'market_wtorny': [1, 0, 1], 'elevator_tak': [0, 0, None]}))
+        assert read_long(db) == [('market_wtorny', 1, 1.0), ('market_wtorny', 3, 1.0)]
+
+    def test_rerun_replaces_values_and_adds_new_category(self, db):
+        upload(db, pd.DataFrame({'link': links, 'market_wtorny': [1, 0, 1]}))
+        upload(db, pd.DataFrame({'link': links[:2], 'market_wtorny': [0, 1], 'market_nowa_kategoria': [1, 0]}))
+        assert read_long(db) == [('market_nowa_kategoria', 1, 1.0), ('market_wtorny', 2, 1.0),
+                                 ('market_wtorny', 3, 1.0)]
+
+    def test_read_sparse_features(self, db):
+        upload(db, pd.DataFrame({'link': links, 'market_wtorny': [1, 0, 1], 'elevator_tak': [0, 1, 0]}))
+        keys = pd.DataFrame({'survey_key': 1, 'offer_id': [3, 2, 4]})
+        with get_connection(db) as conn:
+            matrix, columns = read_sparse_features(
+                conn, keys, {'categorical_features': ['elevator_tak', 'market_wtorny', 'missing']})
+        assert columns == ['elevator_tak', 'market_wtorny', 'missing']
+        assert matrix.toarray().tolist() == [[0, 1, 0], [1, 0, 0], [0, 0, 0]]
+
+    def test_same_feature_name_in_two_tables(self, db):
+        upload(db, pd.DataFrame({'link': links, 'market_wtorny': [1, 0, 0]}))
+        with get_connection(db) as conn:
+            feature_ids = get_feature_ids(conn, 'label_features', ['market_wtorny'])
+            conn.executemany(sparse_features_insert, [(1, 2, feature_ids['market_wtorny'], 1.0)])
+            matrix, columns = read_sparse_features(
+                conn, pd.DataFrame({'survey_key': 1, 'offer_id': [1, 2]}),
+                {'categorical_features': ['market_wtorny'], 'label_features': ['market_wtorny']})
+        assert columns == ['market_wtorny', 'market_wtorny']
+        assert matrix.toarray().tolist() == [[1, 0], [0, 1]]
+
+
+def test_prepare_dataset_pivots_sparse_features(db, monkeypatch):
+    monkeypatch.setitem(feature_set_definitions, 'sparse_fs', Box({
+        'num_cols_to_use': ['area'], 'geo_cols_to_use': ['center_dist'],
+        'cat_cols_to_use': ['market_wtorny', 'elevator_tak'], 'lab_cols_to_use': [], 'geo_dum_cols_to_use': []}))
+    with sqlite3.connect(db) as conn:
+        conn.execute("INSERT INTO surveys (survey_id, survey_type) VALUES ('survey_1', 'full')")
+        conn.executemany("INSERT INTO numeric_features (survey_id, link, offer_id, survey_key, sq_m_price, area) "
+                         "VALUES ('survey_1', ?, ?, 1, 15000, ?)", [(link, i + 1, 40 + i) for i, link in enumerate(links)])
+        conn.executemany("INSERT INTO geo_features (survey_id, link, offer_id, survey_key, in_warsaw, center_dist) "
+                         "VALUES ('survey_1', ?, ?, 1, 1, 5)", [(link, i + 1) for i, link in enumerate(links)])
+    upload(db, pd.DataFrame({'link': links, 'market_wtorny': [1, 0, 1], 'elevator_tak': [0, 1, 0]}))
+
+    df = prepare_dataset('sparse_fs', ['survey_1'])
+    assert list(df.columns) == ['sq_m_price', 'area', 'center_dist', 'market_wtorny', 'elevator_tak']
+    assert df.loc[('survey_1', links[1]), ['market_wtorny', 'elevator_tak']].tolist() == [0, 1]
+
+    dense, matrix, columns = prepare_sparse_dataset('sparse_fs', ['survey_1'])
+    assert list(dense.columns) == ['sq_m_price', 'area', 'center_dist']
+    assert columns == ['market_wtorny', 'elevator_tak']
+    assert (matrix.toarray() == df[columns].to_numpy()).all()